@@ -0,0 +1,2 @@
+from mimic.test.dummy import ExampleDomainAPI
+dummy_domain_plugin = ExampleDomainAPI()
@@ -66,6 +66,37 @@ def impersonator_user_role(id, name):
     }
 
 
+def format_catalog_entry(entry, prefix_for_endpoint):
+    """
+    Format a service catalog entry as it appears in the response to an
+    authentication request.
+
+    :param mimic.catalog.Entry entry: the entry to format.
+    :param prefix_for_endpoint: A callable which takes an endpoint of the
+        entry and returns the URI prefix for that endpoint.
+
+    :return: a JSON-serializable dictionary.
+    """
+    return {
+        "name": entry.name,
+        "type": entry.type,
+        "endpoints": [
+            {
+                "region": endpoint.region,
+                "tenantId": endpoint.tenant_id,
+                "internalURL": endpoint.url_with_prefix(
+                    prefix_for_endpoint(endpoint),
+                    internal_url=True
+                ),
+                "publicURL": endpoint.url_with_prefix(
+                    prefix_for_endpoint(endpoint)
+                ),
+            }
+            for endpoint in entry.endpoints
+        ]
+    }
+
+
 def get_token(tenant_id,
               entry_generator=None,
               prefix_for_endpoint=None,
@@ -87,27 +118,6 @@ def get_token(tenant_id,
     :return: a JSON-serializable dictionary matching the format of the JSON
              response for the identity ``/v2/tokens`` request.
     """
-    def entry_json():
-        for entry in entry_generator(tenant_id):
-            def endpoint_json():
-                for endpoint in entry.endpoints:
-                    yield {
-                        "region": endpoint.region,
-                        "tenantId": endpoint.tenant_id,
-                        "internalURL": endpoint.url_with_prefix(
-                            prefix_for_endpoint(endpoint),
-                            internal_url=True
-                        ),
-                        "publicURL": endpoint.url_with_prefix(
-                            prefix_for_endpoint(endpoint)
-                        ),
-                    }
-            yield {
-                "name": entry.name,
-                "type": entry.type,
-                "endpoints": list(endpoint_json())
-            }
-
     response = {
         "access": {
             "token": {
@@ -129,7 +139,10 @@ def get_token(tenant_id,
     }
 
     if entry_generator is not None and prefix_for_endpoint is not None:
-        response["access"]["serviceCatalog"] = list(entry_json())
+        response["access"]["serviceCatalog"] = [
+            format_catalog_entry(entry, prefix_for_endpoint)
+            for entry in entry_generator(tenant_id)
+        ]
     return response
 
 
@@ -6,17 +6,23 @@ Service catalog hub and integration for Mimic application objects.
 
 from __future__ import absolute_import, division, unicode_literals
 
+import json
+
+from collections import OrderedDict
+from copy import deepcopy
+
 from twisted.python.urlpath import URLPath
 from twisted.plugin import getPlugins
 from mimic import plugins
 
+from mimic.canned_responses.auth import format_catalog_entry
 from mimic.imimic import (
     IAPIMock,
     IAPIDomainMock,
     IExternalAPIMock
 )
 from mimic.session import SessionStore
-from mimic.util.helper import random_hex_generator
+from mimic.util.helper import discard_callbacks, random_hex_generator
 from mimic.model.mailgun_objects import MessageStore
 from mimic.model.customer_objects import ContactsStore
 from mimic.model.ironic_objects import IronicNodeStore
@@ -78,6 +84,28 @@ class ServiceHasTemplates(ServiceStateError):
     """
 
 
+class _TenantCatalog(object):
+    """
+    The service catalog entries of the internal APIs for one tenant.
+
+    :ivar list entries: the :obj:`mimic.catalog.Entry` objects.
+    :ivar dict prefix_map: a mapping of each of the entries' endpoints to its
+        URI prefix.
+    :ivar json: the JSON-encoded entries, as they appear in the service
+        catalog returned by authentication requests, separated by commas but
+        not enclosed in a list; ``None`` until :obj:`MimicCore.catalog_json`
+        first encodes them.
+    """
+    def __init__(self, entries, prefix_map):
+        """
+        :param list entries: the catalog entries.
+        :param dict prefix_map: the URI prefixes for the entries' endpoints.
+        """
+        self.entries = entries
+        self.prefix_map = prefix_map
+        self.json = None
+
+
 class MimicCore(object):
     """
     A MimicCore contains a mapping from URI prefixes to particular service
@@ -87,7 +115,17 @@ class MimicCore(object):
         that will show up in the Service Catalog
     :attr _uuid_to_api_external: dictionary of the hosted external APIs
         that will show up in the Service Catalog
+    :attr _resource_cache: dictionary mapping ``(service_id, region,
+        base_uri)`` to the resource previously built for that service, so
+        that each request does not rebuild the plugin's Klein resource tree
+    :attr _catalog_cache: ordered dictionary mapping ``(tenant_id,
+        base_uri)`` to the :obj:`_TenantCatalog` of the internal APIs for
+        that tenant, so that each authentication request does not rebuild
+        it, and so that its endpoint IDs stay the same
+    :attr catalog_cache_size: the number of tenants whose catalogs are
+        cached; the least recently cached catalogs are forgotten first
     """
+    catalog_cache_size = 1000
 
     def __init__(self, clock, apis, domains=()):
         """
@@ -106,6 +144,8 @@ class MimicCore(object):
         """
         self._uuid_to_api_internal = {}
         self._uuid_to_api_external = {}
+        self._resource_cache = {}
+        self._catalog_cache = OrderedDict()
         self.sessions = SessionStore(clock)
         self.message_store = MessageStore()
         self.contacts_store = ContactsStore()
@@ -167,6 +207,8 @@ class MimicCore(object):
                 api.__class__.__name__ +
                 " does not implement IAPIMock or IExternalAPIMock"
             )
+        self.invalidate_resources()
+        self._catalog_cache.clear()
 
     def remove_external_api(self, api_id):
         """
@@ -180,6 +222,8 @@ class MimicCore(object):
 
             if len(api.list_templates()) == 0:
                 del self._uuid_to_api_external[api_id]
+                self.invalidate_resources()
+                self._catalog_cache.clear()
             else:
                 raise ServiceHasTemplates("API still has endpoint templates")
         else:
@@ -215,6 +259,77 @@ class MimicCore(object):
                 "Unable to locate an API  the id" + str(api_id)
             )
 
+    _snapshot_attributes = (
+        "sessions",
+        "message_store",
+        "contacts_store",
+        "ironic_node_store",
+        "glance_admin_image_store",
+        "valkyrie_store",
+    )
+
+    def _snapshot_memo(self):
+        """
+        Create a :obj:`copy.deepcopy` memo which maps the objects that are
+        shared rather than owned by the core's state - the clock, the API
+        mocks, and the core itself - to themselves, so they are not copied.
+        """
+        shared = ([self, self.sessions.clock] + self.domains +
+                  list(self._uuid_to_api_internal.values()) +
+                  list(self._uuid_to_api_external.values()))
+        return {id(obj): obj for obj in shared}
+
+    def snapshot(self):
+        """
+        Take a snapshot of all the state held by this core: sessions, along
+        with all the per-tenant data belonging to each API, and all the
+        global stores.
+
+        Timed transitions which have already been scheduled with the clock
+        are not part of the snapshot, nor is the state of external APIs.
+
+        :return: an opaque object that can be passed to :obj:`restore` and
+            :obj:`discard`.
+        """
+        memo = self._snapshot_memo()
+        state = deepcopy(
+            {name: getattr(self, name) for name in self._snapshot_attributes},
+            memo)
+        return (state, discard_callbacks(memo))
+
+    def restore(self, snapshot):
+        """
+        Replace all the state held by this core with a copy of the state in
+        the given snapshot.  The snapshot is not modified, so it may be
+        restored again later.
+
+        :param snapshot: an object returned by :obj:`snapshot`.
+        """
+        (state, _) = snapshot
+        state = deepcopy(state, self._snapshot_memo())
+        for name in self._snapshot_attributes:
+            setattr(self, name, state[name])
+        self.invalidate_resources()
+
+    def discard(self, snapshot):
+        """
+        Give back whatever only the given snapshot was holding on to, such as
+        the contents of Swift objects that have since been deleted.  The
+        snapshot must not be restored afterwards.
+
+        :param snapshot: an object returned by :obj:`snapshot`.
+        """
+        (_, callbacks) = snapshot
+        for callback in callbacks:
+            callback()
+
+    def invalidate_resources(self):
+        """
+        Forget all the resources cached by :obj:`service_with_region`, so that
+        the next request for each service builds a new one.
+        """
+        self._resource_cache.clear()
+
     def service_with_region(self, region_name, service_id, base_uri):
         """
         Given the name of a region and a mimic internal service ID, get a
@@ -227,16 +342,25 @@ class MimicCore(object):
         :param str base_uri: the base uri to use instead of the default -
             most likely comes from a request URI
 
+        The resource is built once for each combination of arguments and
+        reused for subsequent requests until :obj:`invalidate_resources` is
+        called.
+
         :return: A resource.
         :rtype: :obj:`twisted.web.iweb.IResource`
         """
+        key = (service_id, region_name, base_uri)
+        if key in self._resource_cache:
+            return self._resource_cache[key]
         if service_id in self._uuid_to_api_internal:
             api = self._uuid_to_api_internal[service_id]
-            return api.resource_for_region(
+            resource = api.resource_for_region(
                 region_name,
                 self.uri_for_service(region_name, service_id, base_uri),
                 self.sessions,
             )
+            self._resource_cache[key] = resource
+            return resource
 
     def uri_for_service(self, region, service_id, base_uri):
         """
@@ -264,12 +388,59 @@ class MimicCore(object):
                    .child(b"mimicking").child(service_id.encode("utf-8"))
                    .child(region.encode("utf-8")).child(b""))
 
+    def _external_entries(self, tenant_id, prefix_map):
+        """
+        Get the :obj:`mimic.catalog.Entry` objects of the external APIs for
+        the given tenant ID.  These are never cached, since their endpoint
+        templates may change at any time.
+
+        :param unicode tenant_id: A fictional tenant ID.
+        :param dict prefix_map: a mapping of entries to uris, to populate
+        """
+        for service_id, api in self._uuid_to_api_external.items():
+            for entry in api.catalog_entries(tenant_id):
+                for endpoint in entry.endpoints:
+                    prefix_map[endpoint] = api.uri_for_service(
+                        endpoint.region, service_id
+                    )
+                yield entry
+
+    def _internal_catalog(self, tenant_id, base_uri):
+        """
+        Get the :obj:`_TenantCatalog` of the internal APIs for the given
+        tenant ID, building it if it is not cached.
+
+        :param unicode tenant_id: A fictional tenant ID.
+        :param str base_uri: the base uri to use instead of the default - most
+            likely comes from a request URI
+        """
+        key = (tenant_id, base_uri)
+        catalog = self._catalog_cache.get(key)
+        if catalog is None:
+            entries = []
+            prefix_map = {}
+            for service_id, api in self._uuid_to_api_internal.items():
+                for entry in api.catalog_entries(tenant_id):
+                    for endpoint in entry.endpoints:
+                        prefix_map[endpoint] = self.uri_for_service(
+                            endpoint.region, service_id, base_uri
+                        )
+                    entries.append(entry)
+            catalog = self._catalog_cache[key] = _TenantCatalog(
+                entries, prefix_map)
+            while len(self._catalog_cache) > self.catalog_cache_size:
+                self._catalog_cache.popitem(last=False)
+        return catalog
+
     def entries_for_tenant(self, tenant_id, prefix_map, base_uri):
         """
         Get all the :obj:`mimic.catalog.Entry` objects for the given tenant ID,
         populating a mapping of :obj:`mimic.catalog.Entry` to URI prefixes (as
         described by :pyobj:`MimicCore.uri_for_service`) for that entry.
 
+        The entries of the internal APIs are cached for each tenant and base
+        URI, so their endpoint IDs are the same each time.
+
         :param unicode tenant_id: A fictional tenant ID.
         :param dict prefix_map: a mapping of entries to uris
         :param str base_uri: the base uri to use instead of the default - most
@@ -278,19 +449,39 @@ class MimicCore(object):
         :return: The full URI locating the service for that region
         """
         # Return all the external APIs
-        for service_id, api in self._uuid_to_api_external.items():
-            for entry in api.catalog_entries(tenant_id):
-                for endpoint in entry.endpoints:
-                    prefix_map[endpoint] = api.uri_for_service(
-                        endpoint.region, service_id
-                    )
-                yield entry
+        for entry in self._external_entries(tenant_id, prefix_map):
+            yield entry
 
         # Return all the internal APIs
-        for service_id, api in self._uuid_to_api_internal.items():
-            for entry in api.catalog_entries(tenant_id):
-                for endpoint in entry.endpoints:
-                    prefix_map[endpoint] = self.uri_for_service(
-                        endpoint.region, service_id, base_uri
-                    )
-                yield entry
+        catalog = self._internal_catalog(tenant_id, base_uri)
+        prefix_map.update(catalog.prefix_map)
+        for entry in catalog.entries:
+            yield entry
+
+    def catalog_json(self, tenant_id, base_uri):
+        """
+        Get the JSON-encoded service catalog for the given tenant ID, as it
+        appears in the response to an authentication request.
+
+        The encoded entries of the internal APIs are cached along with the
+        entries themselves, so only the external APIs are encoded each time.
+
+        :param unicode tenant_id: A fictional tenant ID.
+        :param str base_uri: the base uri to use instead of the default - most
+            likely comes from a request URI
+
+        :return: a JSON-encoded list of catalog entries.
+        :rtype: ``str``
+        """
+        prefix_map = {}
+        encoded = [json.dumps(format_catalog_entry(entry, prefix_map.get))
+                   for entry in self._external_entries(tenant_id, prefix_map)]
+        catalog = self._internal_catalog(tenant_id, base_uri)
+        if catalog.json is None:
+            catalog.json = ", ".join(
+                json.dumps(format_catalog_entry(entry,
+                                                catalog.prefix_map.get))
+                for entry in catalog.entries)
+        if catalog.entries:
+            encoded.append(catalog.json)
+        return "[" + ", ".join(encoded) + "]"
@@ -184,6 +184,16 @@ def not_found_xml(item):
         '<message>{0} not found</message></itemNotFound>').format(item), 404
 
 
+def bad_request_xml(message):
+    """
+    Return XML representation of a CLB bad request error.
+    """
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<badRequest xmlns="http://docs.openstack.org/loadbalancers/api/v1.0" code="400">'
+        '<message>{0}</message></badRequest>').format(message), 400
+
+
 def lb_deleted_xml():
     """
     Return XML representation of CLB marked as DELETED
@@ -7,8 +7,11 @@ Balancer API docs
 
 from __future__ import absolute_import, division, unicode_literals
 
+from collections import deque
 from copy import deepcopy
+from itertools import islice
 from random import randrange
+from xml.sax.saxutils import escape, quoteattr
 
 import attr
 
@@ -19,6 +22,7 @@ from twisted.python import log
 
 from mimic.canned_responses.loadbalancer import load_balancer_example
 from mimic.model.clb_errors import (
+    bad_request_xml,
     batch_delete_limit_error,
     considered_immutable_error,
     invalid_json_schema,
@@ -34,8 +38,11 @@ from mimic.util.helper import (EMPTY_RESPONSE,
                                invalid_resource,
                                not_found_response,
                                one_of_validator,
-                               seconds_to_timestamp,
-                               set_resource_status)
+                               seconds_to_timestamp)
+
+
+FEED_EVENTS_LIMIT = 1000
+DEFAULT_FEED_LIMIT = 100
 
 
 @attr.s
@@ -53,7 +60,11 @@ class Node(object):
     :ivar str condition: One of (ENABLED, DISABLED, DRAINING).  Defaults to
         ENABLED.
     :ivar str status: One of "ONLINE" or "OFFLINE". Defaults to ONLINE
-    :ivar list feed_events: List of (xml text, updated seconds since epoch) tuple
+    :ivar feed_events: the most recent :obj:`FEED_EVENTS_LIMIT` events in the
+        node's feed, oldest first, as a :obj:`deque` of 3-tuples of the
+        event's marker, its summary and the time it happened as a timestamp.
+    :ivar int last_feed_marker: the marker of the latest event in the feed,
+        which is the number of events there have been.
     """
     address = attr.ib(validator=attr.validators.instance_of(text_type))
     port = attr.ib(validator=attr.validators.instance_of(int))
@@ -67,7 +78,9 @@ class Node(object):
                  default=attr.Factory(lambda: randrange(999999)))
     status = attr.ib(validator=one_of_validator("ONLINE", "OFFLINE"),
                      default="ONLINE")
-    feed_events = attr.ib(default=attr.Factory(list))
+    feed_events = attr.ib(
+        default=attr.Factory(lambda: deque(maxlen=FEED_EVENTS_LIMIT)))
+    last_feed_marker = attr.ib(default=0)
 
     @classmethod
     def from_json(cls, json_blob):
@@ -91,7 +104,43 @@ class Node(object):
         """
         :return: a JSON dictionary representing the node.
         """
-        return attr.asdict(self, filter=lambda aa, _: aa.name != "feed_events")
+        return {"address": self.address, "port": self.port, "type": self.type,
+                "weight": self.weight, "condition": self.condition,
+                "id": self.id, "status": self.status}
+
+    def add_feed_event(self, summary, updated):
+        """
+        Add an event to the node's feed, forgetting the oldest event if there
+        are already :obj:`FEED_EVENTS_LIMIT` of them.
+
+        :param str summary: what happened.
+        :param str updated: the timestamp of when it happened.
+        """
+        self.last_feed_marker += 1
+        self.feed_events.append((self.last_feed_marker, summary, updated))
+
+    def feed_page(self, marker=None, limit=DEFAULT_FEED_LIMIT):
+        """
+        Get a page of events from the node's feed.  Pages run oldest first,
+        as the whole feed used to, so the first page holds the oldest events
+        still kept and the newest events are on the last page.
+
+        :param int marker: the marker of the event before the page, or `None`
+            to start from the oldest event still in the feed.
+        :param int limit: the most events to include in the page, at least 1.
+
+        :return: a 2-tuple of a list of events, as described for
+            :obj:`feed_events`, and the marker to get the next page with, or
+            `None` if there are no more events.
+        """
+        start = 0
+        if marker is not None and self.feed_events:
+            start = max(0, marker + 1 - self.feed_events[0][0])
+        events = list(islice(self.feed_events, start, start + limit))
+        next_marker = None
+        if events and events[-1][0] < self.last_feed_marker:
+            next_marker = events[-1][0]
+        return events, next_marker
 
     def same_as(self, other):
         """
@@ -108,10 +157,92 @@ class CLB(object):
     as an attribute, and provides __getitem__ and __setitem__ to access it.
 
     These should be moved to real attributes as soon as possible.
+
+    :ivar list nodes: the :obj:`Node` objects on this load balancer, in the
+        order they were added.  They are also indexed by ID and by address and
+        port, so add and remove them with :obj:`add_nodes` and
+        :obj:`delete_nodes`, or call :obj:`reindex_nodes` after changing the
+        list directly.
+    :ivar transition: the status change this load balancer is waiting for, as
+        a 3-tuple of the time it is due in seconds since the epoch, the
+        current status and the next status (or `None` if the load balancer
+        will be removed), or `None` if it is not waiting for one.
     """
     _json = attr.ib()
     nodes = attr.ib(default=attr.Factory(list))
     health_monitor = attr.ib(default=attr.Factory(dict))
+    transition = attr.ib(default=None)
+    _nodes_by_id = attr.ib(default=attr.Factory(dict), repr=False)
+    _nodes_by_address = attr.ib(default=attr.Factory(dict), repr=False)
+
+    def __attrs_post_init__(self):
+        """
+        Index the nodes the load balancer is created with, as newly added
+        nodes.
+        """
+        self._index_nodes(self.nodes)
+
+    def reindex_nodes(self):
+        """
+        Rebuild the indexes of :obj:`nodes` after the list has been changed
+        directly.  Nodes keep the IDs they have.
+        """
+        self._nodes_by_id = {}
+        self._nodes_by_address = {}
+        for node in self.nodes:
+            self._nodes_by_id[node.id] = node
+            self._nodes_by_address[(node.address, node.port)] = node
+
+    def _index_nodes(self, nodes):
+        """
+        Add newly added nodes to the indexes, giving any node whose random ID
+        is already taken a new one.
+        """
+        for node in nodes:
+            while node.id in self._nodes_by_id:
+                node.id = randrange(999999)
+            self._nodes_by_id[node.id] = node
+            self._nodes_by_address[(node.address, node.port)] = node
+
+    def node_by_id(self, node_id):
+        """
+        :return: the :obj:`Node` with the given ID, or `None` if there is no
+            such node on this load balancer.
+        """
+        return self._nodes_by_id.get(node_id)
+
+    def node_by_address(self, address, port):
+        """
+        :return: the :obj:`Node` with the given IP address and port, or `None`
+            if there is no such node on this load balancer.
+        """
+        return self._nodes_by_address.get((address, port))
+
+    def add_nodes(self, nodes):
+        """
+        Add nodes to the end of this load balancer's nodes.
+
+        :param list nodes: the :obj:`Node` objects to add.
+        """
+        self.nodes.extend(nodes)
+        self._index_nodes(nodes)
+
+    def delete_nodes(self, node_ids):
+        """
+        Delete nodes from this load balancer, in a single pass over its nodes.
+
+        :param node_ids: the IDs of the nodes to delete.
+        :return: the number of nodes deleted.
+        """
+        by_id, by_address = self._nodes_by_id, self._nodes_by_address
+        deleted = [by_id.pop(node_id) for node_id in set(node_ids)
+                   if node_id in by_id]
+        if deleted:
+            for node in deleted:
+                if by_address.get((node.address, node.port)) is node:
+                    del by_address[(node.address, node.port)]
+            self.nodes[:] = [node for node in self.nodes if node.id in by_id]
+        return len(deleted)
 
     def __getitem__(self, key):
         """
@@ -194,16 +325,64 @@ class BadValueError(Exception):
                 'code': self.code}
 
 
-def node_feed_xml(events):
+def node_feed_xml(events, next_href=None):
     """
-    Return feed of node events
+    Generate the Atom feed of node events a piece at a time, so that it can be
+    written out without building the whole document in memory.
+
+    :param events: the events to include, as described for
+        :obj:`Node.feed_events`.
+    :param str next_href: the URL of the next page of the feed, if there is
+        one.
+
+    :return: an iterator of text.
     """
-    feed = '<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
-    entry = ('<entry><summary>{summary}</summary>'
-             '<updated>{updated}</updated></entry>')
-    entries = [entry.format(summary=summary, updated=updated)
-               for summary, updated in events]
-    return feed.format(entries=''.join(entries))
+    yield '<feed xmlns="http://www.w3.org/2005/Atom">'
+    if next_href is not None:
+        yield '<link rel="next" href={0}/>'.format(quoteattr(next_href))
+    for _, summary, updated in events:
+        yield ('<entry><summary>{0}</summary><updated>{1}</updated></entry>'
+               .format(escape(summary), updated))
+    yield '</feed>'
+
+
+class _TransitionTimers(object):
+    """
+    The delayed calls which carry out the status transitions of the load
+    balancers in a :obj:`RegionalCLBCollection`.
+
+    :ivar bool scheduled: whether the transitions of the collection's load
+        balancers have been scheduled with the clock.
+    """
+    def __init__(self, scheduled=True):
+        """
+        :param bool scheduled: see :obj:`scheduled`.
+        """
+        self.scheduled = scheduled
+        self._calls = {}
+
+    def __deepcopy__(self, memo):
+        """
+        The calls belong to the original collection, so a copy's transitions
+        have to be scheduled again.
+        """
+        return _TransitionTimers(scheduled=False)
+
+    def schedule(self, clock, lb_id, delay, f, *args):
+        """
+        Schedule a load balancer's next transition, replacing any it was
+        already waiting for.
+        """
+        self.cancel(lb_id)
+        self._calls[lb_id] = clock.callLater(delay, f, *args)
+
+    def cancel(self, lb_id):
+        """
+        Cancel a load balancer's next transition, if it has one.
+        """
+        call = self._calls.pop(lb_id, None)
+        if call is not None and call.active():
+            call.cancel()
 
 
 @attr.s
@@ -218,13 +397,20 @@ class RegionalCLBCollection(object):
     :ivar int batch_delete_limit: Maximum number of nodes that can be deleted
         in single bulk-delete call. Currently 10 as per
         https://developer.rackspace.com/docs/cloud-load-balancers/v1/api-reference/nodes/#bulk-delete-nodes
+
+    Load balancers move through their statuses on their own (from BUILD to
+    ACTIVE, from PENDING-UPDATE to ACTIVE, and from PENDING-DELETE to DELETED
+    and then away), as scheduled with the clock when they enter each status,
+    so reading them never has to work out what their status should be.
     """
     clock = attr.ib(validator=attr.validators.provides(IReactorTime))
     node_limit = attr.ib(default=25,
                          validator=attr.validators.instance_of(int))
     lbs = attr.ib(default=attr.Factory(dict))
     meta = attr.ib(default=attr.Factory(dict))
+    _timers = attr.ib(default=attr.Factory(_TransitionTimers), repr=False)
     batch_delete_limit = 10
+    deleted_retention = 3600
 
     def lb_in_region(self, clb_id):
         """
@@ -260,60 +446,104 @@ class RegionalCLBCollection(object):
                                                     current_timestring),
                               nodes=[Node.from_json(blob)
                                      for blob in lb_info.get("nodes", [])])
+        self._schedule_transition(lb_id)
 
         return {'loadBalancer': self.lbs[lb_id].full_json()}, 202
 
-    def _verify_and_update_lb_state(self, lb_id, set_state=True,
-                                    current_timestamp=None):
-        """
-        Based on the current state, the metadata on the lb and the time since the LB has
-        been in that state, set the appropriate state in self.lbs
-        Note: Reconsider if update metadata is implemented
-        """
-        current_timestring = seconds_to_timestamp(current_timestamp)
-        if self.lbs[lb_id]["status"] == "BUILD":
-            self.meta[lb_id]["lb_building"] = self.meta[lb_id]["lb_building"] or 10
-            self.lbs[lb_id]["status"] = set_resource_status(
-                self.lbs[lb_id]["updated"]["time"],
-                self.meta[lb_id]["lb_building"],
-                current_timestamp=current_timestamp
-            ) or "BUILD"
-
-        elif self.lbs[lb_id]["status"] == "ACTIVE" and set_state:
-            if "lb_pending_update" in self.meta[lb_id]:
-                self.lbs[lb_id]["status"] = "PENDING-UPDATE"
-                log.msg(self.lbs[lb_id]["status"])
-            if "lb_pending_delete" in self.meta[lb_id]:
-                self.lbs[lb_id]["status"] = "PENDING-DELETE"
-            if "lb_error_state" in self.meta[lb_id]:
-                self.lbs[lb_id]["status"] = "ERROR"
-            self.lbs[lb_id]["updated"]["time"] = current_timestring
-
-        elif self.lbs[lb_id]["status"] == "PENDING-UPDATE":
-            if "lb_pending_update" in self.meta[lb_id]:
-                self.lbs[lb_id]["status"] = set_resource_status(
-                    self.lbs[lb_id]["updated"]["time"],
-                    self.meta[lb_id]["lb_pending_update"],
-                    current_timestamp=current_timestamp
-                ) or "PENDING-UPDATE"
-
-        elif self.lbs[lb_id]["status"] == "PENDING-DELETE":
-            self.meta[lb_id]["lb_pending_delete"] = self.meta[lb_id]["lb_pending_delete"] or 10
-            self.lbs[lb_id]["status"] = set_resource_status(
-                self.lbs[lb_id]["updated"]["time"],
-                self.meta[lb_id]["lb_pending_delete"], "DELETED",
-                current_timestamp=current_timestamp
-            ) or "PENDING-DELETE"
-            self.lbs[lb_id]["updated"]["time"] = current_timestring
-
-        elif self.lbs[lb_id]["status"] == "DELETED":
-            # see del_load_balancer above for an explanation of this state change.
-            self.lbs[lb_id]["status"] = set_resource_status(
-                self.lbs[lb_id]["updated"]["time"], 3600, "DELETING-NOW",
-                current_timestamp=current_timestamp
-            ) or "DELETED"
-            if self.lbs[lb_id]["status"] == "DELETING-NOW":
-                del self.lbs[lb_id]
+    def _set_status(self, lb_id, status):
+        """
+        Put a load balancer into a new status, and schedule its transition
+        out of that status.
+        """
+        self.lbs[lb_id]["status"] = status
+        self.lbs[lb_id]["updated"]["time"] = seconds_to_timestamp(
+            self.clock.seconds())
+        self._schedule_transition(lb_id)
+
+    def _schedule_transition(self, lb_id):
+        """
+        Schedule a load balancer's transition out of its current status, if
+        it will make one on its own.  Metadata on the load balancer says how
+        many seconds it stays in each status.
+        """
+        meta = self.meta[lb_id]
+        status = self.lbs[lb_id]["status"]
+        if status == "BUILD":
+            delay, next_status = meta["lb_building"] or 10, "ACTIVE"
+        elif status == "PENDING-UPDATE" and "lb_pending_update" in meta:
+            delay, next_status = meta["lb_pending_update"], "ACTIVE"
+        elif status == "PENDING-DELETE":
+            delay, next_status = meta.get("lb_pending_delete") or 10, "DELETED"
+        elif status == "DELETED":
+            delay, next_status = self.deleted_retention, None
+        else:
+            self.lbs[lb_id].transition = None
+            self._timers.cancel(lb_id)
+            return
+        delay = int(delay)
+        self.lbs[lb_id].transition = (self.clock.seconds() + delay, status,
+                                      next_status)
+        self._timers.schedule(self.clock, lb_id, delay, self._transition, lb_id)
+
+    def _transition(self, lb_id):
+        """
+        Carry out a load balancer's scheduled transition, unless its status
+        has been changed some other way in the meantime.
+        """
+        clb = self.lbs.get(lb_id)
+        if clb is None or clb.transition is None:
+            return
+        _, status, next_status = clb.transition
+        clb.transition = None
+        if clb["status"] != status:
+            return
+        if next_status is None:
+            self._remove_load_balancer(lb_id)
+        else:
+            self._set_status(lb_id, next_status)
+
+    def _remove_load_balancer(self, lb_id):
+        """
+        Remove a load balancer, along with its scheduled transition.
+        """
+        self._timers.cancel(lb_id)
+        del self.lbs[lb_id]
+
+    def resume_transitions(self):
+        """
+        Schedule the transitions of load balancers in a collection copied
+        from a snapshot, carrying out straight away any that are overdue.
+        Does nothing if they have already been scheduled.
+        """
+        if self._timers.scheduled:
+            return
+        self._timers.scheduled = True
+        now = self.clock.seconds()
+        for lb_id in list(self.lbs):
+            transition = self.lbs[lb_id].transition
+            if transition is None:
+                continue
+            if transition[0] <= now:
+                self._transition(lb_id)
+            else:
+                self._timers.schedule(self.clock, lb_id, transition[0] - now,
+                                      self._transition, lb_id)
+
+    def _lb_changed(self, lb_id):
+        """
+        Record that an ACTIVE load balancer has been changed, which, if its
+        metadata says so, puts it into PENDING-UPDATE, PENDING-DELETE or ERROR
+        status.
+        """
+        if self.lbs[lb_id]["status"] != "ACTIVE":
+            return
+        status = "ACTIVE"
+        for key, meta_status in [("lb_pending_update", "PENDING-UPDATE"),
+                                 ("lb_pending_delete", "PENDING-DELETE"),
+                                 ("lb_error_state", "ERROR")]:
+            if key in self.meta[lb_id]:
+                status = meta_status
+        self._set_status(lb_id, status)
 
     def set_attributes(self, lb_id, kvpairs):
         """
@@ -339,6 +569,8 @@ class RegionalCLBCollection(object):
                 )
 
         self.lbs[lb_id].update(kvpairs)
+        if "status" in kvpairs:
+            self._schedule_transition(lb_id)
 
     def get_load_balancers(self, lb_id):
         """
@@ -346,8 +578,6 @@ class RegionalCLBCollection(object):
         code 200. If no load balancers are found returns 404.
         """
         if lb_id in self.lbs:
-            self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
-            log.msg(self.lbs[lb_id]["status"])
             return {'loadBalancer': self.lbs[lb_id].full_json()}, 200
         return not_found_response("loadbalancer"), 404
 
@@ -358,7 +588,6 @@ class RegionalCLBCollection(object):
         if lb_id not in self.lbs:
             return not_found_response("loadbalancer"), 404
 
-        self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
         return {"healthMonitor": self.lbs[lb_id].health_monitor}, 200
 
     def update_health_monitor(self, lb_id, health_monitor):
@@ -386,7 +615,6 @@ class RegionalCLBCollection(object):
         Returns the node on the load balancer
         """
         if lb_id in self.lbs:
-            self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
 
             if self.lbs[lb_id]["status"] == "DELETED":
                 return (
@@ -394,29 +622,48 @@ class RegionalCLBCollection(object):
                         "The loadbalancer is marked as deleted.", 410),
                     410)
 
-            for each in self.lbs[lb_id].nodes:
-                if node_id == each.id:
-                    return {"node": each.as_json()}, 200
+            node = self.lbs[lb_id].node_by_id(node_id)
+            if node is not None:
+                return {"node": node.as_json()}, 200
 
             return not_found_response("node"), 404
 
         return not_found_response("loadbalancer"), 404
 
-    def get_node_feed(self, lb_id, node_id):
+    def get_node_feed(self, lb_id, node_id, feed_url, marker=None,
+                      limit=DEFAULT_FEED_LIMIT):
         """
-        Return load balancer's node's atom feed
+        Return a page of load balancer's node's atom feed, oldest events
+        first (see :obj:`Node.feed_page`).
+
+        :param str feed_url: the URL of the feed, without a query, used to
+            link to the next page.
+        :param int marker: the marker of the event before the page.
+        :param int limit: the most events to include, from 1 to
+            :obj:`FEED_EVENTS_LIMIT`.
+
+        :return: a 2-tuple of either an iterator of the feed's text, if the
+            response code is 200 (see :obj:`node_feed_xml`), or else the text
+            of the error, and the response code.
         """
+        if not 1 <= limit <= FEED_EVENTS_LIMIT:
+            return bad_request_xml(
+                "Limit must be from 1 to {0}".format(FEED_EVENTS_LIMIT))
+
         if lb_id not in self.lbs:
             return not_found_xml("Load balancer")
 
-        self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
-
         if self.lbs[lb_id]["status"] == "DELETED":
             return lb_deleted_xml()
 
-        for node in self.lbs[lb_id].nodes:
-            if node_id == node.id:
-                return node_feed_xml(node.feed_events), 200
+        node = self.lbs[lb_id].node_by_id(node_id)
+        if node is not None:
+            events, next_marker = node.feed_page(marker, limit)
+            next_href = None
+            if next_marker is not None:
+                next_href = "{0}?marker={1}&limit={2}".format(
+                    feed_url, next_marker, limit)
+            return node_feed_xml(events, next_href), 200
 
         return not_found_xml("Node")
 
@@ -427,9 +674,6 @@ class RegionalCLBCollection(object):
 
         :return: A 2-tuple, containing the HTTP response and code, in that order.
         """
-        for lb_id in self.lbs:
-            self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
-            log.msg(self.lbs[lb_id]["status"])
         return (
             {'loadBalancers': [lb.short_json() for lb in self.lbs.values()]},
             200)
@@ -439,10 +683,6 @@ class RegionalCLBCollection(object):
         Returns the list of nodes remaining on the load balancer
         """
         if lb_id in self.lbs:
-            self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
-            if lb_id not in self.lbs:
-                return not_found_response("loadbalancer"), 404
-
             if self.lbs[lb_id]["status"] == "DELETED":
                 return invalid_resource("The loadbalancer is marked as deleted.", 410), 410
 
@@ -453,37 +693,21 @@ class RegionalCLBCollection(object):
         else:
             return not_found_response("loadbalancer"), 404
 
-    def _delete_node(self, lb_id, node_id):
-        """
-        Deletes a node by ID.
-        """
-        if self.lbs[lb_id].nodes:
-            previous_size = len(self.lbs[lb_id].nodes)
-            self.lbs[lb_id].nodes[:] = [node
-                                        for node in self.lbs[lb_id].nodes
-                                        if node.id != node_id]
-            return len(self.lbs[lb_id].nodes) < previous_size
-        return False
-
     def delete_node(self, lb_id, node_id):
         """
         Determines whether the node to be deleted exists in the session store,
         deletes the node, and returns the response code.
         """
-        current_timestamp = self.clock.seconds()
         if lb_id in self.lbs:
 
-            self._verify_and_update_lb_state(lb_id, False, current_timestamp)
-
             if self.lbs[lb_id]["status"] != "ACTIVE":
                 # Error message verified as of 2015-04-22
                 return considered_immutable_error(
                     self.lbs[lb_id]["status"], lb_id)
 
-            self._verify_and_update_lb_state(
-                lb_id, current_timestamp=current_timestamp)
+            self._lb_changed(lb_id)
 
-            if self._delete_node(lb_id, node_id):
+            if self.lbs[lb_id].delete_nodes([node_id]):
                 return None, 202
             else:
                 return not_found_response("node"), 404
@@ -503,9 +727,6 @@ class RegionalCLBCollection(object):
         if lb_id not in self.lbs:
             return not_found_response("loadbalancer"), 404
 
-        current_timestamp = self.clock.seconds()
-        self._verify_and_update_lb_state(lb_id, False, current_timestamp)
-
         if self.lbs[lb_id]["status"] != "ACTIVE":
             # Error message verified as of 2015-04-22
             resp = {"message": "LoadBalancer is not ACTIVE",
@@ -514,8 +735,8 @@ class RegionalCLBCollection(object):
 
         # We need to verify all the deletions up front, and only allow it through
         # if all of them are valid.
-        all_ids = [node.id for node in self.lbs[lb_id].nodes]
-        non_nodes = set(node_ids).difference(all_ids)
+        non_nodes = set(node_id for node_id in node_ids
+                        if self.lbs[lb_id].node_by_id(node_id) is None)
         if non_nodes:
             return validation_errors([invalid_node_ids_error(non_nodes)])
 
@@ -524,13 +745,9 @@ class RegionalCLBCollection(object):
             err = batch_delete_limit_error(len(node_ids), self.batch_delete_limit)
             return validation_errors([err])
 
-        for node_id in node_ids:
-            # It should not be possible for this to fail, since we've already
-            # checked that they all exist.
-            assert self._delete_node(lb_id, node_id) is True
+        self.lbs[lb_id].delete_nodes(node_ids)
 
-        self._verify_and_update_lb_state(
-            lb_id, current_timestamp=current_timestamp)
+        self._lb_changed(lb_id)
         return EMPTY_RESPONSE, 202
 
     def add_node(self, node_list, lb_id):
@@ -546,8 +763,6 @@ class RegionalCLBCollection(object):
         :return: a `tuple` of (json response as a dict, http status code)
         """
         if lb_id in self.lbs:
-            current_timestamp = self.clock.seconds()
-            self._verify_and_update_lb_state(lb_id, False, current_timestamp)
 
             if self.lbs[lb_id]["status"] != "ACTIVE":
                 return considered_immutable_error(
@@ -555,18 +770,18 @@ class RegionalCLBCollection(object):
 
             nodes = [Node.from_json(blob) for blob in node_list]
 
-            for existing_node in self.lbs[lb_id].nodes:
-                for new_node in nodes:
-                    if existing_node.same_as(new_node):
-                        resource = invalid_resource(
-                            "Duplicate nodes detected. One or more nodes "
-                            "already configured on load balancer.", 413)
-                        return (resource, 413)
+            for new_node in nodes:
+                if self.lbs[lb_id].node_by_address(
+                        new_node.address, new_node.port) is not None:
+                    resource = invalid_resource(
+                        "Duplicate nodes detected. One or more nodes "
+                        "already configured on load balancer.", 413)
+                    return (resource, 413)
 
             # If there were no duplicates
             new_nodeCount = len(self.lbs[lb_id].nodes) + len(nodes)
             if new_nodeCount <= self.node_limit:
-                self.lbs[lb_id].nodes = self.lbs[lb_id].nodes + nodes
+                self.lbs[lb_id].add_nodes(nodes)
             else:
                 resource = invalid_resource(
                     "Nodes must not exceed {0} "
@@ -581,8 +796,7 @@ class RegionalCLBCollection(object):
 
             self._add_node_created_feeds(nodes)
 
-            self._verify_and_update_lb_state(
-                lb_id, current_timestamp=current_timestamp)
+            self._lb_changed(lb_id)
             return {"nodes": [node.as_json() for node in nodes]}, 202
 
         return not_found_response("loadbalancer"), 404
@@ -599,10 +813,9 @@ class RegionalCLBCollection(object):
         created_feed = (
             "Node successfully created with address: '{address}', port: '{port}', "
             "condition: '{condition}', weight: '{weight}'")
+        updated = seconds_to_timestamp(self.clock.seconds())
         for node in nodes:
-            node.feed_events.append(
-                (created_feed.format(**node.as_json()),
-                 seconds_to_timestamp(self.clock.seconds())))
+            node.add_feed_event(created_feed.format(**node.as_json()), updated)
 
     def update_node(self, lb_id, node_id, node_updates):
         """
@@ -616,7 +829,6 @@ class RegionalCLBCollection(object):
         :param str node_id: the node ID to update
         :param dict node_updates: The JSON dictionary containing node
             attributes to update
-        :param current_timestamp: What the current time is
 
         :return: a `tuple` of (json response as a dict, http status code)
         """
@@ -643,21 +855,27 @@ class RegionalCLBCollection(object):
 
         # Now, finally, check if the LB exists and node exists
         if lb_id in self.lbs:
-            self._verify_and_update_lb_state(lb_id, False, self.clock.seconds())
 
             if self.lbs[lb_id]["status"] != "ACTIVE":
                 return considered_immutable_error(
                     self.lbs[lb_id]["status"], lb_id)
 
-            for i, node in enumerate(self.lbs[lb_id].nodes):
-                if node.id == node_id:
-                    params = attr.asdict(node)
-                    params.update(node_updates)
-                    self.lbs[lb_id].nodes[i] = Node(**params)
-                    self.lbs[lb_id].nodes[i].feed_events.append(
-                        (feed_summary.format(**params),
-                         seconds_to_timestamp(self.clock.seconds())))
-                    return ("", 202)
+            node = self.lbs[lb_id].node_by_id(node_id)
+            if node is not None:
+                # leave the feed out of asdict, which would deep-copy it,
+                # and give the updated node the existing feed instead
+                params = attr.asdict(
+                    node, filter=lambda attribute, value: attribute.name not in
+                    ("feed_events", "last_feed_marker"))
+                params.update(node_updates)
+                params.update(feed_events=node.feed_events,
+                              last_feed_marker=node.last_feed_marker)
+                updated = Node(**params)
+                for key in node_updates:
+                    setattr(node, key, getattr(updated, key))
+                node.add_feed_event(feed_summary.format(**params),
+                                    seconds_to_timestamp(self.clock.seconds()))
+                return ("", 202)
 
             return node_not_found()
 
@@ -672,7 +890,6 @@ class RegionalCLBCollection(object):
         status until a nightly job(maybe?)
         """
         if lb_id in self.lbs:
-            current_timestamp = self.clock.seconds()
 
             if self.lbs[lb_id]["status"] == "PENDING-DELETE":
                 msg = ("Must provide valid load balancers: {0} are immutable and "
@@ -680,20 +897,18 @@ class RegionalCLBCollection(object):
                 # Dont doubt this to be 422, it is 400!
                 return invalid_resource(msg, 400), 400
 
-            self._verify_and_update_lb_state(lb_id, True, current_timestamp)
+            self._lb_changed(lb_id)
 
             if any([self.lbs[lb_id]["status"] == "ACTIVE",
                     self.lbs[lb_id]["status"] == "ERROR",
                     self.lbs[lb_id]["status"] == "PENDING-UPDATE"]):
-                del self.lbs[lb_id]
+                self._remove_load_balancer(lb_id)
                 return EMPTY_RESPONSE, 202
 
             if self.lbs[lb_id]["status"] == "PENDING-DELETE":
                 return EMPTY_RESPONSE, 202
 
             if self.lbs[lb_id]["status"] == "DELETED":
-                self._verify_and_update_lb_state(
-                    lb_id, current_timestamp=current_timestamp)
                 msg = "Must provide valid load balancers: {0} could not be found.".format(lb_id)
                 # Dont doubt this to be 422, it is 400!
                 return invalid_resource(msg, 400), 400
@@ -721,4 +936,6 @@ class GlobalCLBCollections(object):
             self.regional_collections[region_name] = (
                 RegionalCLBCollection(self.clock)
             )
-        return self.regional_collections[region_name]
+        collection = self.regional_collections[region_name]
+        collection.resume_transitions()
+        return collection
@@ -5,8 +5,13 @@ MaaS API data model
 from __future__ import absolute_import, division, unicode_literals
 
 import collections
+import json
+from array import array
 import random
 import string
+import zlib
+from bisect import bisect_left, bisect_right
+from copy import deepcopy
 from uuid import uuid4
 
 import attr
@@ -20,6 +25,9 @@ METRIC_TYPE_INTEGER = 'i'
 METRIC_TYPE_NUMBER = 'n'
 METRIC_TYPE_STRING = 's'
 
+ALARM_STATE_HISTORY_LIMIT = 10000
+AUDIT_LOG_LIMIT = 10000
+
 
 @attr.s
 class Entity(object):
@@ -331,6 +339,112 @@ class AlarmState(object):
         return details
 
 
+class MetricSeries(object):
+    """
+    Recorded values of a numeric metric, kept compactly in two arrays of
+    doubles, of timestamps (in milliseconds since the epoch) in ascending
+    order and of the values at those timestamps.
+    """
+    def __init__(self):
+        """
+        Creates an empty series.
+        """
+        self.timestamps = array('d')
+        self.values = array('d')
+
+    def __len__(self):
+        """
+        The number of recorded values.
+        """
+        return len(self.timestamps)
+
+    def add(self, datapoints):
+        """
+        Records values.  A value at the same timestamp as a value that was
+        already recorded replaces it.
+
+        :param datapoints: an iterable of 2-tuples of a timestamp and a value.
+        :raises TypeError: or :obj:`ValueError` if a timestamp or value is
+            not a number, in which case nothing is recorded.
+        """
+        datapoints = sorted([(float(timestamp), float(value))
+                             for timestamp, value in datapoints],
+                            key=lambda datapoint: datapoint[0])
+        if not datapoints:
+            return
+        if not self.timestamps or datapoints[0][0] > self.timestamps[-1]:
+            merged = datapoints
+        else:
+            merged = dict(zip(self.timestamps, self.values))
+            merged.update(datapoints)
+            merged = sorted(merged.items())
+            self.timestamps = array('d')
+            self.values = array('d')
+        for timestamp, value in merged:
+            if self.timestamps and self.timestamps[-1] == timestamp:
+                self.values[-1] = value
+            else:
+                self.timestamps.append(timestamp)
+                self.values.append(value)
+
+    def window(self, start, end):
+        """
+        Gets the positions of the values recorded from ``start`` to ``end``
+        inclusive.
+
+        :return: a 2-tuple of the position of the first of them, and the
+            position after the last of them.
+        """
+        return (bisect_left(self.timestamps, start),
+                bisect_right(self.timestamps, end))
+
+    def downsample(self, start, end, points):
+        """
+        Averages the values recorded around each of ``points`` timestamps
+        spaced evenly from ``start`` to ``end``, which are the timestamps the
+        multiplot API generates values at. Each value is counted at the
+        timestamp nearest to it.
+
+        :return: a list of dicts of each timestamp with any values recorded
+            around it, the number of values and their average, as returned by
+            the multiplot API. Timestamps with no values around them are left
+            out, so there may be fewer than ``points`` of them.
+        """
+        if points < 1:
+            return []
+        interval = (end - start) / (points - 1) if points > 1 else 0
+        data = []
+        first, last = self.window(start, end)
+        for i in range(points):
+            if i == points - 1:
+                upper = last
+            else:
+                upper = bisect_left(self.timestamps,
+                                    start + (i + 0.5) * interval,
+                                    first, last)
+            if upper > first:
+                values = self.values[first:upper]
+                data.append({'numPoints': len(values),
+                             'timestamp': int(start + i * interval),
+                             'average': sum(values) / len(values)})
+            first = upper
+        return data
+
+
+_HASH_MASK = (1 << 64) - 1
+
+
+def _mix_hash(value):
+    """
+    Scrambles an integer into a 64-bit hash (the SplitMix64 finalizer), so
+    that nearby inputs give unrelated outputs.
+    """
+    value = (value + 0x9E3779B97F4A7C15) & _HASH_MASK
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & _HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & _HASH_MASK
+    return value ^ (value >> 31)
+
+
 @attr.s
 class Metric(object):
     """
@@ -344,6 +458,8 @@ class Metric(object):
     unit = attr.ib(validator=instance_of(text_type), default='other')
     _overrides = attr.ib(validator=instance_of(dict),
                          default=attr.Factory(dict))
+    _series = attr.ib(validator=instance_of(dict),
+                      default=attr.Factory(dict))
 
     def set_override(self, **kwargs):
         """
@@ -356,9 +472,39 @@ class Metric(object):
 
     def clear_overrides(self):
         """
-        Clears the override metric values.
+        Clears the override metric values and recorded values.
         """
         self._overrides = {}
+        self._series = {}
+
+    def record_values(self, datapoints, **kwargs):
+        """
+        Records values of a numeric metric for a given entity and check,
+        which the multiplot API returns instead of random data.
+
+        :param datapoints: an iterable of 2-tuples of a timestamp (in
+            milliseconds since the epoch) and a value.
+        :raises ValueError: if the metric is not numeric.
+        """
+        if self.type == METRIC_TYPE_STRING:
+            raise ValueError('Cannot record values of string metric {0}'.format(self.name))
+        override_key = self._override_key(**kwargs)
+        if override_key not in self._series:
+            self._series[override_key] = MetricSeries()
+        self._series[override_key].add(datapoints)
+
+    def clear_recorded_values(self, **kwargs):
+        """
+        Clears the recorded values for a given entity and check.
+        """
+        self._series.pop(self._override_key(**kwargs), None)
+
+    def get_recorded_values(self, **kwargs):
+        """
+        Gets the :obj:`MetricSeries` of recorded values for a given entity
+        and check, or `None` if no values have been recorded.
+        """
+        return self._series.get(self._override_key(**kwargs))
 
     def _get_default_data(self):
         """
@@ -389,6 +535,44 @@ class Metric(object):
             return self._overrides[override_key](timestamp)
         return self._get_default_data()
 
+    def _get_default_values(self, seed, timestamps):
+        """
+        Gets the default data points at each of the ``timestamps``, each of
+        which depends only on ``seed`` and its own timestamp.
+        """
+        hashes = [_mix_hash(seed ^ int(timestamp)) for timestamp in timestamps]
+        if self.type == METRIC_TYPE_INTEGER:
+            return [int(h % 100001) for h in hashes]
+        elif self.type == METRIC_TYPE_NUMBER:
+            scale = 100 if self.unit == 'percent' else 100000
+            return [(h >> 11) / (1 << 53) * scale for h in hashes]
+        elif self.type == METRIC_TYPE_STRING:
+            selectable = string.ascii_letters + string.digits
+            values = []
+            for h in hashes:
+                rng = random.Random(h)
+                values.append(''.join(rng.choice(selectable)
+                                      for _ in range(rng.randint(12, 30))))
+            return values
+        raise ValueError('No default data getter for type {0}!'.format(self.type))
+
+    def get_values(self, timestamps, **kwargs):
+        """
+        Gets the values of the metric at each of the specified timestamps,
+        which is much faster than calling :obj:`get_value` for each of them.
+
+        Overrides will be applied as necessary.  Otherwise, the values are
+        random, but the value at each timestamp is the same every time it is
+        requested for the same metric and keyword arguments, whichever other
+        timestamps are requested with it.
+        """
+        override_key = self._override_key(**kwargs)
+        if override_key in self._overrides:
+            override_fn = self._overrides[override_key]
+            return [override_fn(timestamp) for timestamp in timestamps]
+        seed = zlib.crc32(json.dumps([self.name, override_key]).encode('utf-8'))
+        return self._get_default_values(seed & 0xFFFFFFFF, timestamps)
+
     def get_value_for_test_check(self, **kwargs):
         """
         Gets the metric data object as returned from the test-check API.
@@ -448,9 +632,13 @@ def _multi_host_info_metric(**kwargs):
 class CheckType(object):
     """
     Data model for a MaaS check type (e.g., remote.ping).
+
+    The check types in the shared :obj:`MaasCatalog` have no clock, so they
+    are given the time of a test check; a tenant's own copy of one, from
+    :obj:`MaasStore.check_type_for_update`, has the tenant's clock.
     """
     metrics = attr.ib(validator=instance_of(list))
-    _clock = attr.ib(validator=provides(IReactorTime))
+    _clock = attr.ib(validator=optional(provides(IReactorTime)), default=None)
     test_check_available = attr.ib(validator=instance_of(dict),
                                    default=attr.Factory(dict))
     test_check_status = attr.ib(validator=instance_of(dict),
@@ -483,14 +671,18 @@ class CheckType(object):
 
     def get_test_check_response(self, **kwargs):
         """
-        Gets the response as would have been returned by the test-check API.
+        Gets the response as would have been returned by the test-check API,
+        at the ``timestamp`` given in milliseconds since the epoch, or else
+        the current time of the check type's clock.
         """
         entity_id = kwargs['entity_id']
         check_id = kwargs.get('check_id', '__test_check')
         monitoring_zones = kwargs.get('monitoring_zones') or ['__AGENT__']
 
         ench_key = (entity_id, check_id)
-        timestamp = int(1000 * self._clock.seconds())
+        timestamp = kwargs.get('timestamp')
+        if timestamp is None:
+            timestamp = int(1000 * self._clock.seconds())
 
         return (self.test_check_response_code.get(ench_key, 200),
                 [{'timestamp': timestamp,
@@ -626,202 +818,465 @@ class AgentConnection(object):
         return attr.asdict(self)
 
 
+class AuditLog(object):
+    """
+    The most recent :obj:`AUDIT_LOG_LIMIT` audit records of a tenant, in a
+    ring buffer indexed by record ID, so that a page of records can be found
+    from its marker without searching for it.
+
+    Records can be any objects with an ``id`` attribute.
+    """
+    def __init__(self, limit=AUDIT_LOG_LIMIT):
+        """
+        :param int limit: the number of records to keep.
+        """
+        self.limit = limit
+        self._records = []
+        self._positions = {}
+        self._next_position = 0
+
+    def __len__(self):
+        """
+        The number of records kept.
+        """
+        return len(self._records)
+
+    def append(self, record):
+        """
+        Adds a record, forgetting the oldest one if there are already
+        ``limit`` of them.
+        """
+        position = self._next_position
+        if len(self._records) < self.limit:
+            self._records.append(record)
+        else:
+            slot = position % self.limit
+            del self._positions[self._records[slot].id]
+            self._records[slot] = record
+        self._positions[record.id] = position
+        self._next_position += 1
+
+    def page(self, marker=None, limit=100, reverse=False):
+        """
+        Gets a page of records, starting from the one with the ID ``marker``.
+
+        :param marker: the ID of the first record of the page; the oldest
+            record (or the newest, if ``reverse``) if it is `None` or there is
+            no such record.
+        :param int limit: the most records to include.
+        :param bool reverse: whether to page from newer records to older ones.
+
+        :return: a 2-tuple of a list of records, and the ID of the first
+            record of the next page or `None` if there are no more.
+        :raises ValueError: if ``limit`` is negative.
+        """
+        if limit < 0:
+            raise ValueError('limit must not be negative')
+        oldest = self._next_position - len(self._records)
+        start = self._positions.get(marker)
+        if reverse:
+            step = -1
+            end = oldest - 1
+            if start is None:
+                start = self._next_position - 1
+            stop = max(start - limit, end)
+        else:
+            step = 1
+            end = self._next_position
+            if start is None:
+                start = oldest
+            stop = min(start + limit, end)
+        records = [self._records[position % self.limit]
+                   for position in range(start, stop, step)]
+        next_marker = None
+        if stop != end:
+            next_marker = self._records[stop % self.limit].id
+        return records, next_marker
+
+
+class MaasCatalog(object):
+    """
+    The check types and host info types supported by MaaS, which are the
+    same for every tenant, so one catalog is shared by all of them.
+
+    Nothing in the catalog should be changed: a tenant that overrides the
+    behavior of a check type gets its own copy of it from
+    :obj:`MaasStore.check_type_for_update`.
+
+    :ivar dict check_types: the :obj:`CheckType` objects, by name.
+    :ivar dict host_info_types: the :obj:`SingleHostInfoType` and
+        :obj:`MultiHostInfoType` objects, by name.
+    """
+    def __init__(self):
+        """
+        Builds the catalog.
+
+        This reflects the variety of available check types and metrics
+        supported by MaaS. Some MaaS check types have been omitted for
+        simplicity and clarity. The full list of check types and metrics can
+        be found in `the Rackspace Cloud Monitoring Developer Guide, appendix B
+            <http://docs.rackspace.com/cm/api/v1.0/cm-devguide/content/appendix-check-types.html>`_
+        """
+        self.check_types = _check_types()
+        self.host_info_types = _host_info_types()
+
+    def __deepcopy__(self, memo):
+        """
+        The catalog never changes, so copies of the tenants sharing it can
+        share it too.
+        """
+        return self
+
+
+_catalog = []
+
+
+def shared_catalog():
+    """
+    Gets the :obj:`MaasCatalog` shared by every tenant, building it the first
+    time it is needed.
+    """
+    if not _catalog:
+        _catalog.append(MaasCatalog())
+    return _catalog[0]
+
+
+def _check_types():
+    """
+    Creates the :obj:`CheckType` objects for :obj:`MaasCatalog`.
+    """
+    check_types = {
+        'agent.cpu': CheckType(metrics=[
+            _agent_metric(name='user_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='wait_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='sys_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='idle_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='irq_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='usage_average', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='min_cpu_usage', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='max_cpu_usage', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _agent_metric(name='stolen_percent_average', type=METRIC_TYPE_NUMBER, unit='percent')]),
+        'agent.disk': CheckType(metrics=[
+            _agent_metric(name='queue', type=METRIC_TYPE_INTEGER),
+            _agent_metric(name='read_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='reads', type=METRIC_TYPE_INTEGER, unit='count'),
+            _agent_metric(name='rtime', type=METRIC_TYPE_INTEGER),
+            _agent_metric(name='wtime', type=METRIC_TYPE_INTEGER),
+            _agent_metric(name='write_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='writes', type=METRIC_TYPE_INTEGER, unit='count')]),
+        'agent.filesystem': CheckType(metrics=[
+            _agent_metric(name='avail', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
+            _agent_metric(name='free', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
+            _agent_metric(name='options', type=METRIC_TYPE_STRING, unit='string'),
+            _agent_metric(name='total', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
+            _agent_metric(name='used', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
+            _agent_metric(name='files', type=METRIC_TYPE_INTEGER, unit='count'),
+            _agent_metric(name='free_files', type=METRIC_TYPE_INTEGER, unit='count')]),
+        'agent.load_average': CheckType(metrics=[
+            _agent_metric(name='1m', type=METRIC_TYPE_NUMBER),
+            _agent_metric(name='5m', type=METRIC_TYPE_NUMBER),
+            _agent_metric(name='10m', type=METRIC_TYPE_NUMBER)]),
+        'agent.memory': CheckType(metrics=[
+            _agent_metric(name='actual_free', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='actual_used', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='free', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='ram', type=METRIC_TYPE_INTEGER, unit='megabytes'),
+            _agent_metric(name='swap_free', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='swap_page_in', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='swap_page_out', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='swap_total', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='swap_used', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='total', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='used', type=METRIC_TYPE_INTEGER, unit='bytes')]),
+        'agent.network': CheckType(metrics=[
+            _agent_metric(name='rx_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='rx_dropped', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='rx_errors', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='rx_packets', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='tx_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='tx_dropped', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='tx_errors', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _agent_metric(name='tx_packets', type=METRIC_TYPE_INTEGER, unit='bytes')]),
+        'remote.http': CheckType(metrics=[
+            _remote_metric(name='bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _remote_metric(name='cert_end', type=METRIC_TYPE_INTEGER),
+            _remote_metric(name='cert_end_in', type=METRIC_TYPE_INTEGER),
+            _remote_metric(name='cert_error', type=METRIC_TYPE_STRING, unit='string'),
+            _remote_metric(name='cert_issuer', type=METRIC_TYPE_STRING, unit='string'),
+            _remote_metric(name='cert_start', type=METRIC_TYPE_INTEGER),
+            _remote_metric(name='cert_subject', type=METRIC_TYPE_STRING, unit='string'),
+            _remote_metric(name='cert_subject_alternative_names',
+                           type=METRIC_TYPE_STRING,
+                           unit='string'),
+            _remote_metric(name='code', type=METRIC_TYPE_STRING, unit='string'),
+            _remote_metric(name='duration', type=METRIC_TYPE_INTEGER),
+            _remote_metric(name='truncated', type=METRIC_TYPE_INTEGER, unit='bytes'),
+            _remote_metric(name='tt_connect', type=METRIC_TYPE_INTEGER),
+            _remote_metric(name='tt_firstbyte', type=METRIC_TYPE_INTEGER)]),
+        'remote.ping': CheckType(metrics=[
+            _remote_metric(name='available', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _remote_metric(name='average', type=METRIC_TYPE_NUMBER),
+            _remote_metric(name='count', type=METRIC_TYPE_INTEGER, unit='count'),
+            _remote_metric(name='maximum', type=METRIC_TYPE_NUMBER),
+            _remote_metric(name='minimum', type=METRIC_TYPE_NUMBER)])}
+
+    return check_types
+
+
+def _host_info_types():
+    """
+    Creates the host info types for :obj:`MaasCatalog`.
+    """
+    host_info_types = {
+        'cpus': MultiHostInfoType(metrics=[
+            _multi_host_info_metric(name='idle', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='irq', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='mhz', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='model', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='soft_irq', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='stolen', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='sys', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='total', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='total_cores', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='user', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='vendor', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='wait', type=METRIC_TYPE_INTEGER)]),
+        'disks': MultiHostInfoType(metrics=[
+            _multi_host_info_metric(name='name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='read_bytes', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='reads', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='rtime', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='time', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='write_bytes', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='writes', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='wtime', type=METRIC_TYPE_INTEGER)]),
+        'filesystems': MultiHostInfoType(metrics=[
+            _multi_host_info_metric(name='avail', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='dev_name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='dir_name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='files', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='free', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='free_files', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='options', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='sys_type_name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='total', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='used', type=METRIC_TYPE_INTEGER)]),
+        'memory': SingleHostInfoType(metrics=[
+            _single_host_info_metric(name='actual_free', type=METRIC_TYPE_INTEGER),
+            _single_host_info_metric(name='actual_used', type=METRIC_TYPE_INTEGER),
+            _single_host_info_metric(name='free', type=METRIC_TYPE_INTEGER),
+            _single_host_info_metric(name='free_percent', type=METRIC_TYPE_NUMBER, unit='percent'),
+            _single_host_info_metric(name='ram', type=METRIC_TYPE_INTEGER),
+            _single_host_info_metric(name='total', type=METRIC_TYPE_INTEGER),
+            _single_host_info_metric(name='used', type=METRIC_TYPE_INTEGER),
+            _single_host_info_metric(name='used_percent', type=METRIC_TYPE_NUMBER, unit='percent')]),
+        'network_interfaces': MultiHostInfoType(metrics=[
+            _multi_host_info_metric(name='address', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='address6', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='broadcast', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='flags', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='hwaddr', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='mtu', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='netmask', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='rx_bytes', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='rx_packets', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='tx_bytes', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='tx_packets', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='type', type=METRIC_TYPE_STRING)]),
+        'processes': MultiHostInfoType(metrics=[
+            _multi_host_info_metric(name='cred_group', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='cred_user', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='exe_cwd', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='exe_name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='exe_root', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='memory_major_faults', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='memory_minor_faults', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='memory_page_faults', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='memory_resident', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='memory_share', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='memory_size', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='pid', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='state_name', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='state_priority', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='state_threads', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='time_start_time', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='time_sys', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='time_total', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='time_user', type=METRIC_TYPE_INTEGER)]),
+        'system': SingleHostInfoType(metrics=[
+            _single_host_info_metric(name='arch', type=METRIC_TYPE_STRING),
+            _single_host_info_metric(name='name', type=METRIC_TYPE_STRING),
+            _single_host_info_metric(name='vendor', type=METRIC_TYPE_STRING),
+            _single_host_info_metric(name='vendor_name', type=METRIC_TYPE_STRING),
+            _single_host_info_metric(name='vendor_version', type=METRIC_TYPE_STRING),
+            _single_host_info_metric(name='version', type=METRIC_TYPE_STRING)]),
+        'who': MultiHostInfoType(metrics=[
+            _multi_host_info_metric(name='device', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='host', type=METRIC_TYPE_STRING),
+            _multi_host_info_metric(name='time', type=METRIC_TYPE_INTEGER),
+            _multi_host_info_metric(name='user', type=METRIC_TYPE_STRING)])}
+    return host_info_types
+
+
+class _LayeredCheckTypes(object):
+    """
+    A read-only mapping of check type names to check types, which are
+    taken from a tenant's overridden check types when it has overridden
+    them and from the shared catalog otherwise.
+    """
+    def __init__(self, catalog, overrides):
+        """
+        :param dict catalog: the check types in the shared catalog.
+        :param dict overrides: the check types the tenant has overridden.
+        """
+        self._catalog = catalog
+        self._overrides = overrides
+
+    def __getitem__(self, name):
+        """
+        Gets a check type by name.
+        """
+        if name in self._overrides:
+            return self._overrides[name]
+        return self._catalog[name]
+
+    def __contains__(self, name):
+        """
+        Whether there is a check type with the name.
+        """
+        return name in self._catalog
+
+    def __iter__(self):
+        """
+        Iterates over the names of the check types.
+        """
+        return iter(self._catalog)
+
+    def __len__(self):
+        """
+        The number of check types.
+        """
+        return len(self._catalog)
+
+
 class MaasStore(object):
     """
     A collection of MaaS configuration objects.
+
+    The alarm state history is kept in lists alongside their timestamps,
+    starting at an offset that moves forward as old states fall out of the
+    history; the lists are only trimmed once the offset reaches
+    :obj:`ALARM_STATE_HISTORY_LIMIT`, so that adding a state stays cheap and
+    looking up a time window is a bisection of the timestamps.
     """
     def __init__(self, clock):
         """
         Initializes the MaaS configuration using the provided clock.
-
-        This initializer reflects the variety of available check types and
-        metrics supported by MaaS. Some MaaS check types have been omitted
-        for simplicity and clarity. The full list of check types and metrics
-        can be found in `the Rackspace Cloud Monitoring Developer Guide, appendix B
-            <http://docs.rackspace.com/cm/api/v1.0/cm-devguide/content/appendix-check-types.html>`_
         """
         self.agents = {}
-        self.alarm_states = []
-
-        self.check_types = {
-            'agent.cpu': CheckType(clock=clock, metrics=[
-                _agent_metric(name='user_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='wait_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='sys_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='idle_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='irq_percent_average', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='usage_average', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='min_cpu_usage', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='max_cpu_usage', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _agent_metric(name='stolen_percent_average', type=METRIC_TYPE_NUMBER, unit='percent')]),
-            'agent.disk': CheckType(clock=clock, metrics=[
-                _agent_metric(name='queue', type=METRIC_TYPE_INTEGER),
-                _agent_metric(name='read_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='reads', type=METRIC_TYPE_INTEGER, unit='count'),
-                _agent_metric(name='rtime', type=METRIC_TYPE_INTEGER),
-                _agent_metric(name='wtime', type=METRIC_TYPE_INTEGER),
-                _agent_metric(name='write_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='writes', type=METRIC_TYPE_INTEGER, unit='count')]),
-            'agent.filesystem': CheckType(clock=clock, metrics=[
-                _agent_metric(name='avail', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
-                _agent_metric(name='free', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
-                _agent_metric(name='options', type=METRIC_TYPE_STRING, unit='string'),
-                _agent_metric(name='total', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
-                _agent_metric(name='used', type=METRIC_TYPE_INTEGER, unit='kilobytes'),
-                _agent_metric(name='files', type=METRIC_TYPE_INTEGER, unit='count'),
-                _agent_metric(name='free_files', type=METRIC_TYPE_INTEGER, unit='count')]),
-            'agent.load_average': CheckType(clock=clock, metrics=[
-                _agent_metric(name='1m', type=METRIC_TYPE_NUMBER),
-                _agent_metric(name='5m', type=METRIC_TYPE_NUMBER),
-                _agent_metric(name='10m', type=METRIC_TYPE_NUMBER)]),
-            'agent.memory': CheckType(clock=clock, metrics=[
-                _agent_metric(name='actual_free', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='actual_used', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='free', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='ram', type=METRIC_TYPE_INTEGER, unit='megabytes'),
-                _agent_metric(name='swap_free', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='swap_page_in', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='swap_page_out', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='swap_total', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='swap_used', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='total', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='used', type=METRIC_TYPE_INTEGER, unit='bytes')]),
-            'agent.network': CheckType(clock=clock, metrics=[
-                _agent_metric(name='rx_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='rx_dropped', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='rx_errors', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='rx_packets', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='tx_bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='tx_dropped', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='tx_errors', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _agent_metric(name='tx_packets', type=METRIC_TYPE_INTEGER, unit='bytes')]),
-            'remote.http': CheckType(clock=clock, metrics=[
-                _remote_metric(name='bytes', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _remote_metric(name='cert_end', type=METRIC_TYPE_INTEGER),
-                _remote_metric(name='cert_end_in', type=METRIC_TYPE_INTEGER),
-                _remote_metric(name='cert_error', type=METRIC_TYPE_STRING, unit='string'),
-                _remote_metric(name='cert_issuer', type=METRIC_TYPE_STRING, unit='string'),
-                _remote_metric(name='cert_start', type=METRIC_TYPE_INTEGER),
-                _remote_metric(name='cert_subject', type=METRIC_TYPE_STRING, unit='string'),
-                _remote_metric(name='cert_subject_alternative_names',
-                               type=METRIC_TYPE_STRING,
-                               unit='string'),
-                _remote_metric(name='code', type=METRIC_TYPE_STRING, unit='string'),
-                _remote_metric(name='duration', type=METRIC_TYPE_INTEGER),
-                _remote_metric(name='truncated', type=METRIC_TYPE_INTEGER, unit='bytes'),
-                _remote_metric(name='tt_connect', type=METRIC_TYPE_INTEGER),
-                _remote_metric(name='tt_firstbyte', type=METRIC_TYPE_INTEGER)]),
-            'remote.ping': CheckType(clock=clock, metrics=[
-                _remote_metric(name='available', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _remote_metric(name='average', type=METRIC_TYPE_NUMBER),
-                _remote_metric(name='count', type=METRIC_TYPE_INTEGER, unit='count'),
-                _remote_metric(name='maximum', type=METRIC_TYPE_NUMBER),
-                _remote_metric(name='minimum', type=METRIC_TYPE_NUMBER)])}
-
-        self.host_info_types = {
-            'cpus': MultiHostInfoType(metrics=[
-                _multi_host_info_metric(name='idle', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='irq', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='mhz', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='model', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='soft_irq', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='stolen', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='sys', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='total', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='total_cores', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='user', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='vendor', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='wait', type=METRIC_TYPE_INTEGER)]),
-            'disks': MultiHostInfoType(metrics=[
-                _multi_host_info_metric(name='name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='read_bytes', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='reads', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='rtime', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='time', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='write_bytes', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='writes', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='wtime', type=METRIC_TYPE_INTEGER)]),
-            'filesystems': MultiHostInfoType(metrics=[
-                _multi_host_info_metric(name='avail', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='dev_name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='dir_name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='files', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='free', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='free_files', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='options', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='sys_type_name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='total', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='used', type=METRIC_TYPE_INTEGER)]),
-            'memory': SingleHostInfoType(metrics=[
-                _single_host_info_metric(name='actual_free', type=METRIC_TYPE_INTEGER),
-                _single_host_info_metric(name='actual_used', type=METRIC_TYPE_INTEGER),
-                _single_host_info_metric(name='free', type=METRIC_TYPE_INTEGER),
-                _single_host_info_metric(name='free_percent', type=METRIC_TYPE_NUMBER, unit='percent'),
-                _single_host_info_metric(name='ram', type=METRIC_TYPE_INTEGER),
-                _single_host_info_metric(name='total', type=METRIC_TYPE_INTEGER),
-                _single_host_info_metric(name='used', type=METRIC_TYPE_INTEGER),
-                _single_host_info_metric(name='used_percent', type=METRIC_TYPE_NUMBER, unit='percent')]),
-            'network_interfaces': MultiHostInfoType(metrics=[
-                _multi_host_info_metric(name='address', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='address6', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='broadcast', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='flags', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='hwaddr', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='mtu', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='netmask', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='rx_bytes', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='rx_packets', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='tx_bytes', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='tx_packets', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='type', type=METRIC_TYPE_STRING)]),
-            'processes': MultiHostInfoType(metrics=[
-                _multi_host_info_metric(name='cred_group', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='cred_user', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='exe_cwd', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='exe_name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='exe_root', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='memory_major_faults', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='memory_minor_faults', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='memory_page_faults', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='memory_resident', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='memory_share', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='memory_size', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='pid', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='state_name', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='state_priority', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='state_threads', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='time_start_time', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='time_sys', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='time_total', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='time_user', type=METRIC_TYPE_INTEGER)]),
-            'system': SingleHostInfoType(metrics=[
-                _single_host_info_metric(name='arch', type=METRIC_TYPE_STRING),
-                _single_host_info_metric(name='name', type=METRIC_TYPE_STRING),
-                _single_host_info_metric(name='vendor', type=METRIC_TYPE_STRING),
-                _single_host_info_metric(name='vendor_name', type=METRIC_TYPE_STRING),
-                _single_host_info_metric(name='vendor_version', type=METRIC_TYPE_STRING),
-                _single_host_info_metric(name='version', type=METRIC_TYPE_STRING)]),
-            'who': MultiHostInfoType(metrics=[
-                _multi_host_info_metric(name='device', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='host', type=METRIC_TYPE_STRING),
-                _multi_host_info_metric(name='time', type=METRIC_TYPE_INTEGER),
-                _multi_host_info_metric(name='user', type=METRIC_TYPE_STRING)])}
+        self._alarm_states = []
+        self._alarm_state_timestamps = []
+        self._first_alarm_state = 0
+        self._latest_alarm_states = collections.defaultdict(dict)
+        self._clock = clock
+        self._catalog = shared_catalog()
+        self._check_type_overrides = {}
+
+    @property
+    def alarm_states(self):
+        """
+        The most recent :obj:`ALARM_STATE_HISTORY_LIMIT` :obj:`AlarmState`
+        objects, oldest first.  Add to them with :obj:`add_alarm_state`, which
+        also keeps track of the latest state of each alarm, however long ago
+        it was added.
+        """
+        return self._alarm_states[self._first_alarm_state:]
+
+    @property
+    def check_types(self):
+        """
+        The check types, by name, including any the tenant has overridden.
+        Use :obj:`check_type_for_update` to get a check type to override.
+        """
+        return _LayeredCheckTypes(self._catalog.check_types,
+                                  self._check_type_overrides)
+
+    @property
+    def host_info_types(self):
+        """
+        The host info types, by name.
+        """
+        return self._catalog.host_info_types
+
+    def check_type_for_update(self, name):
+        """
+        Gets the tenant's own copy of a check type, which uses the tenant's
+        clock, so that its behavior can be overridden without affecting other
+        tenants.
+        """
+        if name not in self._check_type_overrides:
+            check_type = deepcopy(self._catalog.check_types[name])
+            check_type._clock = self._clock
+            self._check_type_overrides[name] = check_type
+        return self._check_type_overrides[name]
+
+    def clear_check_type_overrides(self, name):
+        """
+        Clears the tenant's overrides of a check type, so that it behaves
+        like the shared catalog's check type again.
+        """
+        self._check_type_overrides.pop(name, None)
+
+    def add_alarm_state(self, state):
+        """
+        Records a new alarm state, which becomes the latest state of its
+        alarm.
+
+        New alarm states are assumed to be no older than the states already
+        recorded.
+        """
+        self._alarm_states.append(state)
+        self._alarm_state_timestamps.append(state.timestamp)
+        self._latest_alarm_states[state.entity_id][state.alarm_id] = state
+        if len(self._alarm_states) - self._first_alarm_state > ALARM_STATE_HISTORY_LIMIT:
+            self._first_alarm_state += 1
+            if self._first_alarm_state >= ALARM_STATE_HISTORY_LIMIT:
+                del self._alarm_states[:self._first_alarm_state]
+                del self._alarm_state_timestamps[:self._first_alarm_state]
+                self._first_alarm_state = 0
+
+    def latest_alarm_state(self, entity_id, alarm_id):
+        """
+        Gets the latest state of the specified alarm, or `None` if it has
+        never had one.
+        """
+        return self._latest_alarm_states.get(entity_id, {}).get(alarm_id)
 
     def latest_alarm_states_for_entity(self, entity_id):
         """
-        Computes the latest alarm states for the specified entity.
+        Gets the latest alarm states for the specified entity.
+        """
+        return list(self._latest_alarm_states.get(entity_id, {}).values())
+
+    def alarm_states_between(self, start=None, end=None):
+        """
+        Gets the recorded alarm states with timestamps from ``start`` to
+        ``end`` inclusive, oldest first.
 
-        Newer alarm states are assumed to be always appended to the list of
-        alarm states.
+        :param int start: the earliest timestamp to include, in milliseconds
+            since the epoch, or `None` to start from the oldest state.
+        :param int end: the latest timestamp to include, in milliseconds
+            since the epoch, or `None` to include the newest state.
         """
-        alarm_states_for_entity = [state for state in self.alarm_states
-                                   if state.entity_id == entity_id]
-        latest_alarm_states_by_alarm = {}
-        for state in alarm_states_for_entity:
-            latest_alarm_states_by_alarm[state.alarm_id] = state
-        return latest_alarm_states_by_alarm.values()
+        first = self._first_alarm_state
+        last = len(self._alarm_states)
+        if start is not None:
+            first = bisect_left(self._alarm_state_timestamps, start, first)
+        if end is not None:
+            last = bisect_right(self._alarm_state_timestamps, end, first)
+        return self._alarm_states[first:last]
 
     def list_connections_for_agent(self, agent_id):
         """
@@ -7,12 +7,15 @@ from __future__ import absolute_import, division, unicode_literals
 import re
 import uuid
 import attr
+from bisect import bisect_left, insort
+from collections import deque
 from random import randrange
 from json import loads, dumps
 from six.moves.urllib.parse import urlencode
 
 from six import string_types
 from six import text_type
+from six.moves import range
 
 from mimic.util.helper import (
     seconds_to_timestamp,
@@ -140,6 +143,12 @@ class Server(object):
     status = attr.ib()
     update_time = attr.ib()
     max_metadata_items = attr.ib(validator=attr.validators.instance_of(int), default=40)
+    _json_cache = attr.ib(default=attr.Factory(dict), repr=False, cmp=False)
+
+    _serialized_attributes = frozenset([
+        "disk_config", "flavor_ref", "image_ref", "key_name", "metadata",
+        "private_ips", "public_ips", "server_id", "server_name", "status",
+        "update_time"])
 
     static_defaults = {
         "OS-EXT-STS:power_state": 1,
@@ -151,6 +160,42 @@ class Server(object):
         "user_id": "170454"
     }
 
+    def __setattr__(self, name, value):
+        """
+        Forget any cached JSON for this server when state that appears in it
+        changes.
+        """
+        super(Server, self).__setattr__(name, value)
+        if name in self._serialized_attributes and "_json_cache" in self.__dict__:
+            self._json_cache.clear()
+
+    def invalidate_json(self):
+        """
+        Forget any cached JSON for this server; this must be called after
+        changing mutable state such as :obj:`metadata` in place.
+        """
+        self._json_cache.clear()
+
+    def serialized_json(self, include_details, absolutize_url):
+        """
+        Get the serialized form of either :obj:`detail_json` or
+        :obj:`brief_json`, reusing the previous serialization for the same
+        URL prefix if nothing about the server has changed since.
+
+        :param bool include_details: whether to serialize :obj:`detail_json`
+            rather than :obj:`brief_json`.
+        :param callable absolutize_url: see :obj:`default_create_behavior`.
+
+        :return: the JSON for this server.
+        :rtype: ``str``
+        """
+        key = (include_details, absolutize_url(""))
+        if key not in self._json_cache:
+            self._json_cache[key] = dumps(
+                self.detail_json(absolutize_url) if include_details
+                else self.brief_json(absolutize_url))
+        return self._json_cache[key]
+
     def addresses_json(self):
         """
         Create a JSON-serializable data structure describing the public and
@@ -248,12 +293,20 @@ class Server(object):
             }
         }
 
+    def _touch(self):
+        """
+        Set the `update_time` of the server to now, and let the collection
+        know that the server has changed.
+        """
+        self.update_time = self.collection.clock.seconds()
+        self.collection.server_updated(self)
+
     def set_metadata(self, metadata):
         """
         Replace all metadata with given metadata
         """
         self.metadata = metadata
-        self.update_time = self.collection.clock.seconds()
+        self._touch()
 
     def set_metadata_item(self, key, value):
         """
@@ -273,7 +326,7 @@ class Server(object):
                 "Invalid metadata: The input is not a string or unicode"))
 
         self.metadata[key] = value
-        self.update_time = self.collection.clock.seconds()
+        self._touch()
 
     def update_status(self, status):
         """
@@ -281,7 +334,9 @@ class Server(object):
         of the server
         """
         self.status = status
-        self.update_time = self.collection.clock.seconds()
+        self._touch()
+        if status == u"DELETED":
+            self.collection.server_deleted(self)
 
     @classmethod
     def validate_metadata(cls, metadata, max_metadata_items=40):
@@ -322,8 +377,7 @@ class Server(object):
         while True:
             private_ip = IPv4Address(
                 address="10.180.{0}.{1}".format(ipsegment(), ipsegment()))
-            if private_ip not in [addr for server in collection.servers
-                                  for addr in server.private_ips]:
+            if not collection.private_ip_in_use(private_ip):
                 break
 
         self = cls(
@@ -348,7 +402,7 @@ class Server(object):
             admin_password=random_string(12),
             max_metadata_items=max_metadata_items
         )
-        collection.servers.append(self)
+        collection.add_server(self)
         return self
 
 
@@ -669,6 +723,15 @@ def metadata_to_creation_behavior(metadata):
 class RegionalServerCollection(object):
     """
     A collection of servers, in a given region, for a given tenant.
+
+    :ivar list servers: all the servers in this collection, in creation order,
+        including servers that have been ``DELETED`` within the last
+        ``deleted_retention`` seconds.  They are indexed by ID, private IP
+        and update time, so call :obj:`reindex_servers` after changing the
+        list other than through :obj:`add_server`.
+    :ivar deleted_retention: the number of seconds a ``DELETED`` server
+        remains visible to ``changes-since`` queries before it is discarded,
+        or ``None`` to keep servers deleted while it is ``None`` forever.
     """
     tenant_id = attr.ib()
     region_name = attr.ib()
@@ -676,15 +739,124 @@ class RegionalServerCollection(object):
     servers = attr.ib(default=attr.Factory(list))
     behavior_registry_collection = attr.ib(default=attr.Factory(
         lambda: BehaviorRegistryCollection()))
+    deleted_retention = attr.ib(default=24 * 60 * 60)
+    _positions = attr.ib(default=attr.Factory(dict), repr=False)
+    _update_times = attr.ib(default=attr.Factory(list), repr=False)
+    _private_ips = attr.ib(default=attr.Factory(set), repr=False)
+    _tombstones = attr.ib(default=attr.Factory(deque), repr=False)
+    _expired = attr.ib(default=attr.Factory(set), repr=False)
+
+    def __attrs_post_init__(self):
+        """
+        Index the servers the collection is created with.
+        """
+        self.reindex_servers()
+
+    def reindex_servers(self):
+        """
+        Rebuild the indexes of :obj:`servers` after the list has been changed
+        directly.
+        """
+        self._positions = {}
+        self._private_ips = set()
+        for position, server in enumerate(self.servers):
+            self._positions.setdefault(server.server_id, position)
+            self._private_ips.update(
+                addr.address for addr in server.private_ips)
+        self._update_times = sorted(
+            (server.update_time, server.server_id) for server in self.servers)
+
+    def add_server(self, server):
+        """
+        Add a newly created :obj:`Server` to the end of this collection.
+        """
+        self._positions[server.server_id] = len(self.servers)
+        self.servers.append(server)
+        self._private_ips.update(addr.address for addr in server.private_ips)
+        insort(self._update_times, (server.update_time, server.server_id))
+        self._compact()
+
+    def server_updated(self, server):
+        """
+        Record the new `update_time` of the given server in the update-time
+        index.
+
+        The server's previous entry is left in place, since finding it would
+        cost as much as the scan the index is meant to avoid; stale entries
+        are skipped by :obj:`_servers_changed_since` and dropped when the
+        index grows to twice the number of servers.
+        """
+        insort(self._update_times, (server.update_time, server.server_id))
+        if len(self._update_times) > 2 * len(self.servers):
+            self._update_times = sorted(
+                (each.update_time, each.server_id) for each in self.servers)
+
+    def _servers_changed_since(self, since, start):
+        """
+        Get the servers, in creation order, at or after position ``start``
+        in :obj:`servers` which have been updated at or after ``since``.
+        """
+        positions = self._positions
+        first = bisect_left(self._update_times, (since,))
+        changed = set()
+        for update_time, server_id in self._update_times[first:]:
+            position = positions.get(server_id)
+            if position is not None and position >= start:
+                changed.add(position)
+        return [self.servers[position] for position in sorted(changed)]
+
+    def private_ip_in_use(self, address):
+        """
+        Whether a server in this collection already has the given private
+        :obj:`IPv4Address`.
+        """
+        return address.address in self._private_ips
 
     def server_by_id(self, server_id):
         """
         Retrieve a :obj:`Server` object by its ID.
         """
-        for server in self.servers:
-            if server.server_id == server_id and server.status != u"DELETED":
+        position = self._positions.get(server_id)
+        if position is not None:
+            server = self.servers[position]
+            if server.status != u"DELETED":
                 return server
 
+    def server_deleted(self, server):
+        """
+        Record that the given server has been deleted, so that it is discarded
+        once the retention window has passed, if there is one.
+        """
+        if self.deleted_retention is None:
+            return
+        self._tombstones.append((server.update_time, server.server_id))
+        self._compact()
+
+    def _compact(self):
+        """
+        Discard servers that were deleted more than ``deleted_retention``
+        seconds ago.
+
+        Expired servers are collected as their tombstones age out, but
+        :obj:`servers` is only rebuilt once they make up half of it, so that
+        the cost of compaction is amortized across requests.
+        """
+        if self.deleted_retention is None:
+            return
+        horizon = self.clock.seconds() - self.deleted_retention
+        while self._tombstones and self._tombstones[0][0] < horizon:
+            deleted_at, server_id = self._tombstones.popleft()
+            position = self._positions.get(server_id)
+            if (position is not None and
+                    self.servers[position].status == u"DELETED"):
+                self._expired.add(server_id)
+        if self._expired and len(self._expired) * 2 >= len(self.servers):
+            self.servers[:] = [server for server in self.servers
+                               if server.server_id not in self._expired or
+                               server.status != u"DELETED"]
+            self._expired = set()
+            self.reindex_servers()
+
     def request_creation(self, creation_http_request, creation_json,
                          absolutize_url):
         """
@@ -715,7 +887,8 @@ class RegionalServerCollection(object):
         if server is None:
             return dumps(not_found("Instance could not be found",
                                    http_get_request))
-        return dumps({"server": server.detail_json(absolutize_url)})
+        return '{{"server": {0}}}'.format(
+            server.serialized_json(True, absolutize_url))
 
     def request_ips(self, http_get_ips_request, server_id):
         """
@@ -744,34 +917,25 @@ class RegionalServerCollection(object):
 
         Pagination behavior verified against Rackspace Nova as of 2015-04-29.
         """
-        to_be_listed = self.servers
-
+        self._compact()
+        since = None
         if changes_since is not None:
             since = timestamp_to_seconds(changes_since)
-            to_be_listed = [s for s in to_be_listed if s.update_time >= since]
 
         # marker can be passed without limit, in which case the whole server
         # list, after the server that matches the marker, is returned
+        start = 0
         if marker is not None:
-            last_seen = [i for i, server in enumerate(to_be_listed)
-                         if server.server_id == marker]
-            if not last_seen:
+            position = self._positions.get(marker)
+            if position is None or (
+                    since is not None and
+                    self.servers[position].update_time < since):
                 # Error response and body verified against Rackspace Nova as
                 # of 2015-04-29
                 return dumps(bad_request(
                     "marker [{0}] not found".format(marker),
                     http_get_request))
-            else:
-                last_seen = last_seen[0]
-                to_be_listed = to_be_listed[last_seen + 1:]
-
-        # A valid marker is an ID in the entire server list.  It does not
-        # have to be for a server that matches the given name.
-        to_be_listed = [server for server in to_be_listed
-                        if name in server.server_name]
-
-        if changes_since is None:
-            to_be_listed = [s for s in to_be_listed if s.status != u"DELETED"]
+            start = position + 1
 
         if limit is not None:
             try:
@@ -783,15 +947,29 @@ class RegionalServerCollection(object):
                 return dumps(bad_request("limit param must be positive",
                                          http_get_request))
 
-            to_be_listed = to_be_listed[:limit]
+        if since is None:
+            candidates = (self.servers[position]
+                          for position in range(start, len(self.servers)))
+        else:
+            candidates = self._servers_changed_since(since, start)
 
-        result = {
-            "servers": [
-                server.brief_json(absolutize_url) if not include_details
-                else server.detail_json(absolutize_url)
-                for server in to_be_listed
-            ]
-        }
+        # A valid marker is an ID in the entire server list.  It does not
+        # have to be for a server that matches the given name.
+        to_be_listed = []
+        for server in candidates:
+            if limit is not None and len(to_be_listed) >= limit:
+                break
+            if since is None and server.status == u"DELETED":
+                continue
+            if name in server.server_name:
+                to_be_listed.append(server)
+
+        # Each server's JSON is serialized (and cached) separately and then
+        # spliced into the response, so unchanged servers are not serialized
+        # again on every request.
+        servers_json = "[{0}]".format(", ".join(
+            server.serialized_json(include_details, absolutize_url)
+            for server in to_be_listed))
 
         # A server links blob is included only if limit is passed.  If
         # only the marker was provided, no server links blob is included.
@@ -807,12 +985,11 @@ class RegionalServerCollection(object):
                 self.tenant_id,
                 "/detail" if include_details else "",
                 urlencode(query_params))
-            result["servers_links"] = [{
-                "href": absolutize_url(path),
-                "rel": "next"
-            }]
+            return '{{"servers": {0}, "servers_links": {1}}}'.format(
+                servers_json,
+                dumps([{"href": absolutize_url(path), "rel": "next"}]))
 
-        return dumps(result)
+        return '{{"servers": {0}}}'.format(servers_json)
 
     def request_delete(self, http_delete_request, server_id):
         """
@@ -830,6 +1007,7 @@ class RegionalServerCollection(object):
             if srvfail['times']:
                 srvfail['times'] -= 1
                 server.metadata['delete_server_failure'] = dumps(srvfail)
+                server.invalidate_json()
                 http_delete_request.setResponseCode(500)
                 return b''
         http_delete_request.setResponseCode(204)
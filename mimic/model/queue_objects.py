@@ -4,17 +4,30 @@ Models for the Queue plugin
 
 from __future__ import absolute_import, division, unicode_literals
 
+from bisect import bisect_right
+from heapq import heappop, heappush
+
 import attr
-from six import text_type
+from six import integer_types, text_type
+from twisted.internet.defer import Deferred
 from twisted.internet.interfaces import IReactorTime
 
 from mimic.util.helper import random_hex_generator
 
 
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 20
+
+
 @attr.s
 class Message(object):
     """
     A Message object in Cloud Queues.
+
+    :ivar int marker: the position of the message in its queue, which later
+        messages have higher values of.
+    :ivar claim_id: the ID of the last claim made on the message, which may
+        since have expired or been released.
     """
     ttl = attr.ib(validator=attr.validators.instance_of(int))
     body = attr.ib(validator=attr.validators.instance_of(dict))
@@ -23,21 +36,27 @@ class Message(object):
     posted_at = attr.ib(validator=attr.validators.instance_of(int))
     id = attr.ib(validator=attr.validators.instance_of(text_type),
                  default=attr.Factory(lambda: random_hex_generator(12)))
+    marker = attr.ib(default=0)
+    claim_id = attr.ib(default=None)
 
-    def to_json(self, current_time):
+    def to_json(self, current_time, claim_id=None):
         """
         A representation of this message that can be serialized via json.dumps.
         """
         return {'body': self.body,
                 'age': current_time - self.posted_at,
-                'href': self.href(),
+                'href': self.href(claim_id),
                 'ttl': self.ttl}
 
-    def href(self):
+    def href(self, claim_id=None):
         """
-        Returns the URL path representing this message.
+        Returns the URL path representing this message, including the claim
+        needed to delete it if given.
         """
-        return '/v1/queues/{0}/messages/{1}'.format(self.queue_name, self.id)
+        href = '/v1/queues/{0}/messages/{1}'.format(self.queue_name, self.id)
+        if claim_id is not None:
+            href += '?claim_id={0}'.format(claim_id)
+        return href
 
     def is_expired_at(self, current_time):
         """
@@ -46,22 +65,154 @@ class Message(object):
         return (self.posted_at + self.ttl) < current_time
 
 
+@attr.s
+class Claim(object):
+    """
+    A claim on some of the messages in a queue, which hides them from other
+    consumers until it expires or is released.
+    """
+    ttl = attr.ib(validator=attr.validators.instance_of(integer_types))
+    queue_name = attr.ib(validator=attr.validators.instance_of(text_type))
+    created_at = attr.ib(validator=attr.validators.instance_of(int))
+    expires_at = attr.ib(validator=attr.validators.instance_of(integer_types))
+    id = attr.ib(validator=attr.validators.instance_of(text_type),
+                 default=attr.Factory(lambda: random_hex_generator(12)))
+    message_ids = attr.ib(default=attr.Factory(list))
+
+    def href(self):
+        """
+        Returns the URL path representing this claim.
+        """
+        return '/v1/queues/{0}/claims/{1}'.format(self.queue_name, self.id)
+
+    def is_expired_at(self, current_time):
+        """
+        Returns True if the claim is expired at the given time.
+        """
+        return self.expires_at <= current_time
+
+
+class _Waiters(object):
+    """
+    Requests waiting for messages to be posted to a queue.
+    """
+    def __init__(self):
+        """
+        Start with nothing waiting.
+        """
+        self._waiting = {}
+
+    def __deepcopy__(self, memo):
+        """
+        Requests waiting on the original queue keep waiting on it, rather
+        than on a copy of it.
+        """
+        return _Waiters()
+
+    def wait(self, clock, timeout):
+        """
+        Wait for messages to be posted.
+
+        :param IReactorTime clock: the clock to time out with.
+        :param timeout: how many seconds to wait for.
+        :return: a :obj:`Deferred` that fires with ``True`` when messages are
+            posted, or ``False`` if none are posted before the timeout.
+        """
+        def cancel(d):
+            self._waiting.pop(d).cancel()
+
+        def time_out(d):
+            del self._waiting[d]
+            d.callback(False)
+
+        d = Deferred(cancel)
+        self._waiting[d] = clock.callLater(timeout, time_out, d)
+        return d
+
+    def notify(self):
+        """
+        Tell everything waiting that messages have been posted.
+        """
+        waiting, self._waiting = self._waiting, {}
+        for d, call in waiting.items():
+            call.cancel()
+            d.callback(True)
+
+
 @attr.s
 class Queue(object):
     """
     A Queue object in Cloud Queues.
+
+    Messages are kept in the order they were posted, as a sorted list of
+    their markers, along with indexes of the live messages by marker and by
+    ID.  The markers of removed messages are dropped from the list once they
+    make up half of it.  Expiry is driven by min-heaps of
+    ``(expiry time, marker)`` and ``(expiry time, claim ID)`` pairs, so only
+    the messages and claims that have actually expired are looked at when
+    clearing them out.
     """
     name = attr.ib(validator=attr.validators.instance_of(text_type))
     id = attr.ib(validator=attr.validators.instance_of(text_type),
                  default=attr.Factory(lambda: random_hex_generator(4)))
-    _messages = attr.ib(default=attr.Factory(list))
+    _markers = attr.ib(default=attr.Factory(list), repr=False)
+    _removed_markers = attr.ib(default=0, repr=False)
+    _by_marker = attr.ib(default=attr.Factory(dict), repr=False)
+    _by_id = attr.ib(default=attr.Factory(dict), repr=False)
+    _expiry = attr.ib(default=attr.Factory(list), repr=False)
+    _claims = attr.ib(default=attr.Factory(dict), repr=False)
+    _claim_expiry = attr.ib(default=attr.Factory(list), repr=False)
+    _last_marker = attr.ib(default=0, repr=False)
+    _waiters = attr.ib(default=attr.Factory(_Waiters), repr=False)
 
     def _clear_expired_messages(self, current_time):
         """
-        Clears expired messages from the queue.
+        Clears expired messages and claims from the queue.
+        """
+        while self._expiry and self._expiry[0][0] < current_time:
+            _, marker = heappop(self._expiry)
+            message = self._by_marker.get(marker)
+            if message is not None and message.is_expired_at(current_time):
+                self._remove_message(message)
+        while self._claim_expiry and self._claim_expiry[0][0] <= current_time:
+            _, claim_id = heappop(self._claim_expiry)
+            claim = self._claims.get(claim_id)
+            if claim is not None and claim.is_expired_at(current_time):
+                del self._claims[claim_id]
+
+    def _remove_message(self, message):
+        """
+        Remove a message from the indexes, and compact the list of markers
+        if the markers of removed messages make up half of it.
+        """
+        del self._by_marker[message.marker]
+        del self._by_id[message.id]
+        self._removed_markers += 1
+        if 2 * self._removed_markers >= len(self._markers):
+            self._markers = [marker for marker in self._markers
+                             if marker in self._by_marker]
+            self._removed_markers = 0
+
+    def _active_claim(self, message):
+        """
+        Get the claim that currently holds a message, if any.
+        """
+        if message.claim_id is None:
+            return None
+        return self._claims.get(message.claim_id)
+
+    def _messages_after(self, marker):
+        """
+        Iterate over the live messages posted after the one with the given
+        marker, oldest first.
         """
-        self._messages[:] = [message for message in self._messages
-                             if not message.is_expired_at(current_time)]
+        markers = self._markers
+        start = 0 if marker is None else bisect_right(markers, marker)
+        while start < len(markers):
+            message = self._by_marker.get(markers[start])
+            if message is not None:
+                yield message
+            start += 1
 
     def brief_json(self):
         """
@@ -76,30 +227,194 @@ class Queue(object):
         Posts a series of messages to the message queue.
         """
         self._clear_expired_messages(current_time)
-        new_messages = [Message(ttl=message['ttl'],
-                                body=message['body'],
-                                queue_name=self.name,
-                                posted_by=client_id,
-                                posted_at=current_time)
-                        for message in messages]
-        self._messages.extend(new_messages)
+        new_messages = []
+        for message in messages:
+            self._last_marker += 1
+            new_message = Message(ttl=message['ttl'],
+                                  body=message['body'],
+                                  queue_name=self.name,
+                                  posted_by=client_id,
+                                  posted_at=current_time,
+                                  marker=self._last_marker)
+            self._markers.append(new_message.marker)
+            self._by_marker[new_message.marker] = new_message
+            self._by_id[new_message.id] = new_message
+            heappush(self._expiry, (current_time + new_message.ttl,
+                                    new_message.marker))
+            new_messages.append(new_message)
         response_json = {'partial': False,
                          'resources': [message.href() for message in new_messages]}
+        if new_messages:
+            self._waiters.notify()
         return response_json, 201
 
-    def list_messages(self, client_id, current_time, echo):
+    def wait_for_messages(self, clock, timeout):
+        """
+        Waits for messages to be posted to the queue.
+
+        :return: a :obj:`Deferred` that fires with ``True`` when messages are
+            posted, or ``False`` if none are posted within ``timeout``
+            seconds.
+        """
+        return self._waiters.wait(clock, timeout)
+
+    def get_messages(self, message_ids, current_time):
         """
-        Lists messages (that the client can see).
+        Gets the messages with the given IDs, ignoring those that do not
+        exist.
+        """
+        self._clear_expired_messages(current_time)
+        messages = [self._by_id[message_id].to_json(current_time)
+                    for message_id in message_ids
+                    if message_id in self._by_id]
+        return (messages, 200) if messages else (None, 204)
+
+    def delete_messages(self, message_ids, current_time):
+        """
+        Deletes the messages with the given IDs, whether or not they are
+        claimed, ignoring those that do not exist.
+        """
+        self._clear_expired_messages(current_time)
+        for message_id in message_ids:
+            message = self._by_id.get(message_id)
+            if message is not None:
+                self._remove_message(message)
+        return None, 204
+
+    def list_messages(self, client_id, current_time, echo, marker=None,
+                      limit=DEFAULT_LIMIT, include_claimed=False):
+        """
+        Lists messages (that the client can see), a page at a time.
 
         If the echo parameter is set to true, the client sees all messages.
         Otherwise, the client only sees messages posted by other clients.
+        Claimed messages are only seen if include_claimed is true.  The
+        response links to the next page, which starts after the marker of
+        the last message on this page.
         """
         self._clear_expired_messages(current_time)
+        page = []
+        for message in self._messages_after(marker):
+            if len(page) == limit:
+                break
+            if ((echo or message.posted_by != client_id) and
+                    (include_claimed or self._active_claim(message) is None)):
+                page.append(message)
+        if not page:
+            return None, 204
+        next_href = ('/v1/queues/{0}/messages?marker={1}&limit={2}'
+                     '&echo={3}&include_claimed={4}').format(
+                         self.name, page[-1].marker, limit,
+                         'true' if echo else 'false',
+                         'true' if include_claimed else 'false')
         response_json = {'messages': [message.to_json(current_time)
-                                      for message in self._messages
-                                      if echo or message.posted_by != client_id],
-                         'links': []}
-        return (response_json, 200) if response_json['messages'] else (None, 204)
+                                      for message in page],
+                         'links': [{'rel': 'next', 'href': next_href}]}
+        return response_json, 200
+
+    def claim_messages(self, ttl, grace, current_time, limit=DEFAULT_LIMIT):
+        """
+        Claims up to ``limit`` of the oldest unclaimed messages, and extends
+        their lives so that they outlive the claim by at least ``grace``
+        seconds.
+
+        Returns the response body and code, and the claim's URL path if any
+        messages were claimed.
+        """
+        self._clear_expired_messages(current_time)
+        claim = Claim(ttl=ttl, queue_name=self.name, created_at=current_time,
+                      expires_at=current_time + ttl)
+        claimed = []
+        for message in self._messages_after(None):
+            if len(claimed) == limit:
+                break
+            if self._active_claim(message) is None:
+                claimed.append(message)
+        if not claimed:
+            return None, 204, None
+        self._claims[claim.id] = claim
+        heappush(self._claim_expiry, (claim.expires_at, claim.id))
+        for message in claimed:
+            message.claim_id = claim.id
+            claim.message_ids.append(message.id)
+        self._extend_messages(claim, grace)
+        return ([message.to_json(current_time, claim.id) for message in claimed],
+                201, claim.href())
+
+    def _extend_messages(self, claim, grace):
+        """
+        Extend the lives of the messages held by a claim to at least
+        ``grace`` seconds past the end of the claim.
+        """
+        expires_at = claim.expires_at + grace
+        for message in self._claimed_messages(claim):
+            if message.posted_at + message.ttl < expires_at:
+                message.ttl = expires_at - message.posted_at
+                heappush(self._expiry, (expires_at, message.marker))
+
+    def _claimed_messages(self, claim):
+        """
+        Get the live messages still held by a claim.
+        """
+        return [self._by_id[message_id] for message_id in claim.message_ids
+                if message_id in self._by_id and
+                self._by_id[message_id].claim_id == claim.id]
+
+    def get_claim(self, claim_id, current_time):
+        """
+        Gets a claim and the messages it holds.
+        """
+        self._clear_expired_messages(current_time)
+        claim = self._claims.get(claim_id)
+        if claim is None:
+            return None, 404
+        return {'age': current_time - claim.created_at,
+                'ttl': claim.ttl,
+                'href': claim.href(),
+                'messages': [message.to_json(current_time, claim.id)
+                             for message in self._claimed_messages(claim)]}, 200
+
+    def update_claim(self, claim_id, ttl, grace, current_time):
+        """
+        Renews a claim so that it expires ``ttl`` seconds from now.
+        """
+        self._clear_expired_messages(current_time)
+        claim = self._claims.get(claim_id)
+        if claim is None:
+            return None, 404
+        claim.ttl = ttl
+        claim.expires_at = current_time + ttl
+        heappush(self._claim_expiry, (claim.expires_at, claim.id))
+        self._extend_messages(claim, grace)
+        return None, 204
+
+    def release_claim(self, claim_id, current_time):
+        """
+        Releases a claim, making the messages it held visible again.
+        """
+        self._clear_expired_messages(current_time)
+        claim = self._claims.pop(claim_id, None)
+        if claim is not None:
+            for message in self._claimed_messages(claim):
+                message.claim_id = None
+        return None, 204
+
+    def delete_message(self, message_id, claim_id, current_time):
+        """
+        Deletes a message.  A claimed message can only be deleted by giving
+        the ID of the claim that holds it.
+        """
+        self._clear_expired_messages(current_time)
+        message = self._by_id.get(message_id)
+        if message is None:
+            return None, 204
+        claim = self._active_claim(message)
+        if claim is not None and claim.id != claim_id:
+            return {'title': 'Unable to delete',
+                    'description': 'This message is claimed; it cannot be '
+                                   'deleted without a valid claim_id.'}, 403
+        self._remove_message(message)
+        return None, 204
 
 
 @attr.s
@@ -109,7 +424,7 @@ class QueueCollection(object):
     for a single tenant in a single region.
     """
     _clock = attr.ib(validator=attr.validators.provides(IReactorTime))
-    _queues = attr.ib(default=attr.Factory(list))
+    _queues = attr.ib(default=attr.Factory(dict))
 
     def _current_time(self):
         """
@@ -121,16 +436,20 @@ class QueueCollection(object):
 
     def add_queue(self, queue_name):
         """
-        Adds the new named queue and returns HTTP 201.
+        Adds the new named queue and returns HTTP 201, or returns HTTP 204 if
+        it already exists.
         """
-        self._queues.append(Queue(name=queue_name))
+        if queue_name in self._queues:
+            return (None, 204)
+        self._queues[queue_name] = Queue(name=queue_name)
         return (None, 201)
 
     def list_queues(self):
         """
-        Lists all queues in the collection.
+        Lists all queues in the collection, in order of their names.
         """
-        return {'queues': [queue.brief_json() for queue in self._queues]}, 200
+        return {'queues': [self._queues[name].brief_json()
+                           for name in sorted(self._queues)]}, 200
 
     def delete_queue(self, queue_name):
         """
@@ -138,24 +457,106 @@ class QueueCollection(object):
 
         Returns HTTP 204.
         """
-        self._queues[:] = [queue for queue in self._queues
-                           if queue.name != queue_name]
+        self._queues.pop(queue_name, None)
         return None, 204
 
-    def list_messages_for_queue(self, queue_name, client_id, echo):
+    def list_messages_for_queue(self, queue_name, client_id, echo,
+                                marker=None, limit=DEFAULT_LIMIT,
+                                include_claimed=False):
         """
-        Lists all messages in the named queue.
+        Lists a page of messages in the named queue.
         """
-        for queue in self._queues:
-            if queue.name == queue_name:
-                return queue.list_messages(client_id, self._current_time(), echo)
-        return None, 204
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 204
+        return queue.list_messages(client_id, self._current_time(), echo,
+                                   marker, limit, include_claimed)
 
     def post_messages_to_queue(self, queue_name, messages, client_id):
         """
         Post a series of messages to the named queue.
         """
-        for queue in self._queues:
-            if queue.name == queue_name:
-                return queue.post_messages(messages, client_id, self._current_time())
-        return None, 404
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 404
+        return queue.post_messages(messages, client_id, self._current_time())
+
+    def wait_for_messages_in_queue(self, queue_name, timeout):
+        """
+        Wait for messages to be posted to the named queue.
+
+        :return: a :obj:`Deferred` as described by
+            :obj:`Queue.wait_for_messages`, or ``None`` if there is no such
+            queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None
+        return queue.wait_for_messages(self._clock, timeout)
+
+    def get_messages_from_queue(self, queue_name, message_ids):
+        """
+        Get the messages with the given IDs from the named queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 404
+        return queue.get_messages(message_ids, self._current_time())
+
+    def delete_messages_from_queue(self, queue_name, message_ids):
+        """
+        Delete the messages with the given IDs from the named queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 204
+        return queue.delete_messages(message_ids, self._current_time())
+
+    def delete_message_from_queue(self, queue_name, message_id, claim_id):
+        """
+        Delete a message from the named queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 204
+        return queue.delete_message(message_id, claim_id, self._current_time())
+
+    def claim_messages_in_queue(self, queue_name, ttl, grace,
+                                limit=DEFAULT_LIMIT):
+        """
+        Claim messages in the named queue.
+
+        Returns the response body and code, and the claim's URL path if any
+        messages were claimed.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 404, None
+        return queue.claim_messages(ttl, grace, self._current_time(), limit)
+
+    def get_claim_in_queue(self, queue_name, claim_id):
+        """
+        Get a claim on messages in the named queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 404
+        return queue.get_claim(claim_id, self._current_time())
+
+    def update_claim_in_queue(self, queue_name, claim_id, ttl, grace):
+        """
+        Renew a claim on messages in the named queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 404
+        return queue.update_claim(claim_id, ttl, grace, self._current_time())
+
+    def release_claim_in_queue(self, queue_name, claim_id):
+        """
+        Release a claim on messages in the named queue.
+        """
+        queue = self._queues.get(queue_name)
+        if queue is None:
+            return None, 204
+        return queue.release_claim(claim_id, self._current_time())
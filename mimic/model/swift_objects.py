@@ -0,0 +1,393 @@
+"""
+Storage for the contents of objects in the Swift plugin.
+"""
+
+from __future__ import absolute_import, division, unicode_literals
+
+import atexit
+import hashlib
+import os
+import shutil
+import tempfile
+
+from io import BytesIO
+
+import attr
+
+from twisted.internet.defer import Deferred
+from twisted.internet.interfaces import IPushProducer
+from zope.interface import implementer
+
+from mimic.util.helper import on_discard
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+@attr.s(hash=False)
+class InlineData(object):
+    """
+    The contents of a small Swift object, kept in memory, or any other bytes
+    that need to be produced like stored content.
+    """
+    _store = attr.ib(repr=False)
+    content = attr.ib()
+    etag = attr.ib(default=None)
+
+    @property
+    def length(self):
+        """
+        The number of bytes of content.
+        """
+        return len(self.content)
+
+    def open(self):
+        """
+        Open the content for reading.
+
+        :return: a binary file-like object.
+        """
+        return BytesIO(self.content)
+
+    def read(self):
+        """
+        Read all of the content.
+        """
+        return self.content
+
+    def __deepcopy__(self, memo):
+        """
+        The content is immutable, so a copy is just another reference to it,
+        which is given back to the store once the copy is discarded.
+        """
+        if self._store is not None:
+            self._store.retain(self)
+            on_discard(memo, lambda: self._store.release(self))
+        return self
+
+
+@attr.s(hash=False)
+class SpilledData(object):
+    """
+    The contents of a large Swift object, kept in a file named after the
+    SHA-256 digest of its content.
+    """
+    _store = attr.ib(repr=False)
+    path = attr.ib()
+    length = attr.ib()
+    etag = attr.ib()
+
+    def open(self):
+        """
+        Open the content for reading.
+
+        :return: a binary file object.
+        """
+        return open(self.path, "rb")
+
+    def read(self):
+        """
+        Read all of the content.
+        """
+        with self.open() as f:
+            return f.read()
+
+    def __deepcopy__(self, memo):
+        """
+        The content is immutable, so a copy is just another reference to it,
+        which is given back to the store once the copy is discarded.
+        """
+        self._store.retain(self)
+        on_discard(memo, lambda: self._store.release(self))
+        return self
+
+
+class SegmentedData(object):
+    """
+    Content made of ranges of other content, read one after the other
+    without copying them into a combined whole.
+
+    :ivar list segments: 3-tuples of an :obj:`InlineData`,
+        :obj:`SpilledData` or :obj:`SegmentedData`, the offset of the first
+        byte of it to include, and the number of bytes to include.
+    """
+    def __init__(self, segments):
+        """
+        :param segments: the ranges of content, as described for the
+            ``segments`` attribute.
+        """
+        self.segments = list(segments)
+        self.length = sum(length for (_, _, length) in self.segments)
+
+    def open(self):
+        """
+        Open the content for reading.
+
+        :return: a binary file-like object supporting ``read``, ``seek`` and
+            ``close``.
+        """
+        return _SegmentedFile(self.segments)
+
+    def read(self):
+        """
+        Read all of the content.
+        """
+        f = self.open()
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+
+class _SegmentedFile(object):
+    """
+    A read-only file over the content of a :obj:`SegmentedData`, which only
+    has one of its segments open at a time.
+    """
+    def __init__(self, segments):
+        """
+        :param list segments: see :obj:`SegmentedData.segments`.
+        """
+        self._segments = segments
+        self._index = 0
+        self._offset = 0
+        self._current = None
+
+    def seek(self, offset):
+        """
+        Move to an absolute offset in the content.
+        """
+        self.close()
+        self._index = 0
+        for (_, _, length) in self._segments:
+            if offset < length:
+                break
+            offset -= length
+            self._index += 1
+        self._offset = offset
+
+    def read(self, size=-1):
+        """
+        Read up to ``size`` bytes, or all the remaining bytes if ``size`` is
+        negative.
+        """
+        chunks = []
+        while size != 0 and self._index < len(self._segments):
+            data, start, length = self._segments[self._index]
+            if self._current is None:
+                self._current = data.open()
+                self._current.seek(start + self._offset)
+            wanted = length - self._offset
+            if size >= 0:
+                wanted = min(wanted, size)
+            chunk = self._current.read(wanted)
+            chunks.append(chunk)
+            self._offset += len(chunk)
+            if size >= 0:
+                size -= len(chunk)
+            if self._offset >= length or not chunk:
+                self.close()
+                self._index += 1
+                self._offset = 0
+        return b"".join(chunks)
+
+    def close(self):
+        """
+        Close the segment currently being read.
+        """
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+
+class ObjectStore(object):
+    """
+    Storage for the contents of Swift objects, which computes the MD5 ETag
+    of each object's content as it is stored.
+
+    Objects of up to ``inline_limit`` bytes are kept in memory as
+    :obj:`InlineData`, as long as all the objects kept in memory add up to no
+    more than ``memory_budget`` bytes.  All other objects are written to files
+    in ``directory`` as :obj:`SpilledData`.  Since those files are named
+    after the digest of their content, objects with the same content share a
+    file, which is removed once no object refers to it.
+
+    :ivar int inline_bytes: the total size of the objects kept in memory,
+        counting content that is referred to more than once, as by snapshots,
+        only once.
+    """
+
+    def __init__(self, directory=None, inline_limit=CHUNK_SIZE,
+                 memory_budget=64 * 1024 * 1024):
+        """
+        :param str directory: the directory to write large objects to; a new
+            temporary directory, removed when the process exits, if not given.
+        :param int inline_limit: the size of the largest object to keep in
+            memory.
+        :param int memory_budget: the total size of the objects to keep in
+            memory.
+        """
+        self._directory = directory
+        self.inline_limit = inline_limit
+        self.memory_budget = memory_budget
+        self.inline_bytes = 0
+        self._inline = {}
+        self._spilled = {}
+
+    def __deepcopy__(self, memo):
+        """
+        There is only one store, however many copies are made of the objects
+        stored in it.
+        """
+        return self
+
+    @property
+    def directory(self):
+        """
+        The directory that large objects are written to, creating it if
+        necessary.
+        """
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="mimic-swift-")
+            atexit.register(shutil.rmtree, self._directory, True)
+        return self._directory
+
+    def store(self, content):
+        """
+        Store the content of an object.
+
+        :param content: a binary file-like object to read the content from,
+            a chunk at a time.
+        :return: an :obj:`InlineData` or :obj:`SpilledData`.
+        """
+        head = content.read(self.inline_limit + 1)
+        if (len(head) <= self.inline_limit and
+                self.inline_bytes + len(head) <= self.memory_budget):
+            self.inline_bytes += len(head)
+            data = InlineData(self, head, hashlib.md5(head).hexdigest())
+            self._inline[id(data)] = [data, 1]
+            return data
+
+        digest = hashlib.sha256()
+        md5 = hashlib.md5()
+        length = 0
+        handle, temporary = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(handle, "wb") as f:
+            chunk = head
+            while chunk:
+                digest.update(chunk)
+                md5.update(chunk)
+                length += len(chunk)
+                f.write(chunk)
+                chunk = content.read(CHUNK_SIZE)
+
+        path = os.path.join(self.directory, digest.hexdigest())
+        if path in self._spilled:
+            os.remove(temporary)
+            data = self._spilled[path][0]
+            self.retain(data)
+            return data
+        os.rename(temporary, path)
+        data = SpilledData(self, path, length, md5.hexdigest())
+        self._spilled[path] = [data, 1]
+        return data
+
+    def retain(self, data):
+        """
+        Record another reference to some stored content.
+
+        :param data: an :obj:`InlineData` or :obj:`SpilledData` returned by
+            :obj:`store`.
+        """
+        if isinstance(data, SpilledData):
+            self._spilled[data.path][1] += 1
+        else:
+            self._inline[id(data)][1] += 1
+
+    def release(self, data):
+        """
+        Record that a reference to some stored content has gone away,
+        removing its file or freeing its memory if it was the last one.
+
+        :param data: an :obj:`InlineData` or :obj:`SpilledData` returned by
+            :obj:`store`.
+        """
+        if isinstance(data, SpilledData):
+            references = self._spilled[data.path]
+            references[1] -= 1
+            if references[1] == 0:
+                del self._spilled[data.path]
+                os.remove(data.path)
+        else:
+            references = self._inline[id(data)]
+            references[1] -= 1
+            if references[1] == 0:
+                del self._inline[id(data)]
+                self.inline_bytes -= data.length
+
+
+@implementer(IPushProducer)
+class DataProducer(object):
+    """
+    A producer which writes stored content to a request a chunk at a time,
+    pausing whenever the request's transport asks it to.
+    """
+
+    def __init__(self, data, request, start=0, length=None):
+        """
+        :param data: an :obj:`InlineData`, :obj:`SpilledData` or
+            :obj:`SegmentedData`.
+        :param request: the :obj:`twisted.web.server.Request` to write to.
+        :param int start: the offset of the first byte to write.
+        :param int length: the number of bytes to write; all the bytes from
+            ``start`` onwards if not given.
+        """
+        self._file = data.open()
+        self._file.seek(start)
+        self._request = request
+        self._remaining = (data.length - start if length is None else length)
+        self._paused = False
+        self._done = None
+
+    def start(self):
+        """
+        Start writing the content.
+
+        :return: a :obj:`Deferred` that fires with an empty response body
+            once all the content has been written.
+        """
+        self._done = Deferred(lambda _: self.stopProducing())
+        self._request.registerProducer(self, True)
+        self.resumeProducing()
+        return self._done
+
+    def resumeProducing(self):
+        """
+        Write chunks of content until the request's transport asks to pause
+        or the content has all been written.
+        """
+        self._paused = False
+        while not self._paused and self._done is not None:
+            chunk = self._file.read(min(CHUNK_SIZE, self._remaining))
+            if not chunk:
+                done = self._done
+                self.stopProducing()
+                done.callback(b"")
+                return
+            self._remaining -= len(chunk)
+            self._request.write(chunk)
+
+    def pauseProducing(self):
+        """
+        Stop writing content until :obj:`resumeProducing` is called.
+        """
+        self._paused = True
+
+    def stopProducing(self):
+        """
+        Stop writing content for good.
+        """
+        if self._done is not None:
+            self._done = None
+            self._file.close()
+            self._request.unregisterProducer()
@@ -6,8 +6,13 @@ from __future__ import unicode_literals
 
 import json
 
+from collections import deque
 from io import BytesIO
 
+import attr
+
+from six import python_2_unicode_compatible, text_type
+
 from twisted.web.resource import NoResource
 from twisted.web.server import Request, Site
 from twisted.logger import Logger
@@ -29,6 +34,34 @@ from mimic.util.helper import seconds_to_timestamp
 log = Logger("mimic").info
 
 
+def _snapshot_name(request):
+    """
+    Get the snapshot name from the JSON body of the given request, or
+    ``"default"`` if the request has no body or the body has no name.
+
+    :raises ValueError: if the body is not a JSON object, or its name is not
+        a string.
+    """
+    content = request.content.read()
+    if not content:
+        return "default"
+    body = json.loads(content.decode("utf-8"))
+    if not isinstance(body, dict):
+        raise ValueError("The request body must be a JSON object.")
+    name = body.get("name", "default")
+    if not isinstance(name, text_type):
+        raise ValueError("The snapshot name must be a string.")
+    return name
+
+
+def _bad_request(request, message):
+    """
+    Respond to the given request with a 400 and the given message.
+    """
+    request.setResponseCode(400)
+    return json.dumps({"badRequest": {"code": 400, "message": message}})
+
+
 class MimicRoot(object):
     """
     Klein routes for the root of the mimic URI hierarchy.
@@ -36,16 +69,44 @@ class MimicRoot(object):
 
     app = MimicApp()
 
-    def __init__(self, core, clock=None):
+    def __init__(self, core, clock=None, request_log=None):
         """
         :param mimic.core.MimicCore core: The core object to dispatch routes
             from.
         :param twisted.internet.task.Clock clock: The clock to advance from the
             ``/mimic/v1.1/tick`` API.
+        :param RequestLog request_log: The log of recent requests to serve
+            from the ``/mimic/v1.1/requests`` API, if requests are being
+            logged.
         """
         self.core = core
         self.clock = clock
+        self.request_log = request_log
         self.identity_behavior_registry = BehaviorRegistryCollection()
+        self._resources = {}
+        self._snapshots = {}
+
+    def _cached_resource(self, name, factory):
+        """
+        Get the resource for the given route name, building it with
+        ``factory`` only if it has not been built already.
+
+        :param unicode name: the name of the route the resource serves.
+        :param factory: a no-argument callable returning the resource.
+
+        :return: the cached resource.
+        """
+        if name not in self._resources:
+            self._resources[name] = factory()
+        return self._resources[name]
+
+    def invalidate_resources(self):
+        """
+        Forget all cached resources, including the per-service resources
+        cached by the core, so that they are rebuilt on the next request.
+        """
+        self._resources.clear()
+        self.core.invalidate_resources()
 
     @app.route("/", methods=["GET"])
     def help(self, request):
@@ -61,8 +122,8 @@ class MimicRoot(object):
         """
         Get the identity ...
         """
-        return IdentityApi(self.core,
-                           self.identity_behavior_registry).app.resource()
+        return self._cached_resource("identity", lambda: IdentityApi(
+            self.core, self.identity_behavior_registry).app.resource())
 
     @app.route("/noit", branch=True)
     def get_noit_api(self, request):
@@ -70,7 +131,8 @@ class MimicRoot(object):
         Mock Noit api here ... until mimic allows services outside of the
         service catalog.
         """
-        return NoitApi(self.core, self.clock).app.resource()
+        return self._cached_resource(
+            "noit", lambda: NoitApi(self.core, self.clock).app.resource())
 
     @app.route("/sendgrid/mail.send.json", methods=['POST'])
     def send_grid_api(self, request):
@@ -85,35 +147,43 @@ class MimicRoot(object):
         """
         Mock Mail Gun API.
         """
-        return mailgun_api.MailGunApi(self.core).app.resource()
+        return self._cached_resource(
+            "mailgun",
+            lambda: mailgun_api.MailGunApi(self.core).app.resource())
 
     @app.route("/fastly", branch=True)
     def get_fastly_api(self, request):
         """
         Get the Fastly API ...
         """
-        return fastly_api.FastlyApi(self.core).app.resource()
+        return self._cached_resource(
+            "fastly", lambda: fastly_api.FastlyApi(self.core).app.resource())
 
     @app.route("/v1/customer_accounts/CLOUD", branch=True)
     def get_customer_api(self, request):
         """
         Adds support for the Customer API
         """
-        return customer_api.CustomerApi(self.core).app.resource()
+        return self._cached_resource(
+            "customer",
+            lambda: customer_api.CustomerApi(self.core).app.resource())
 
     @app.route("/ironic/v1", branch=True)
     def ironic_api(self, request):
         """
         Mock Ironic API.
         """
-        return ironic_api.IronicApi(self.core).app.resource()
+        return self._cached_resource(
+            "ironic", lambda: ironic_api.IronicApi(self.core).app.resource())
 
     @app.route("/valkyrie/v2.0", branch=True)
     def valkyrie_api(self, request):
         """
         Mock Valkyrie API.
         """
-        return valkyrie_api.ValkyrieApi(self.core).app.resource()
+        return self._cached_resource(
+            "valkyrie",
+            lambda: valkyrie_api.ValkyrieApi(self.core).app.resource())
 
     @app.route('/mimic/v1.0/presets', methods=['GET'])
     def get_mimic_presets(self, request):
@@ -137,13 +207,74 @@ class MimicRoot(object):
             "now": seconds_to_timestamp(self.clock.seconds())
         })
 
+    @app.route("/mimic/v1.1/requests", methods=['GET'])
+    def get_recent_requests(self, request):
+        """
+        List the most recent requests and responses, oldest first, if
+        requests are being logged.  At most ``limit`` requests are listed, if
+        that query parameter is given.
+        """
+        if self.request_log is None:
+            request.setResponseCode(404)
+            return json.dumps({"itemNotFound": {
+                "code": 404,
+                "message": "Requests are only recorded in verbose mode"}})
+        limit = request.args.get(b"limit", [None])[0]
+        if limit is not None:
+            if not limit.isdigit():
+                return _bad_request(
+                    request, "limit must be a non-negative integer")
+            limit = int(limit)
+        entries = self.request_log.recent(limit)
+        request.setResponseCode(200)
+        return json.dumps({"requests": [entry.json() for entry in entries]})
+
+    @app.route("/mimic/v1.1/snapshot", methods=['POST'])
+    def take_snapshot(self, request):
+        """
+        Take a snapshot of the state of every mocked service, under the name
+        given in the request body (``"default"`` if there is no body),
+        discarding any snapshot previously taken under that name.
+        """
+        try:
+            name = _snapshot_name(request)
+        except ValueError as e:
+            return _bad_request(request, text_type(e))
+        replaced = self._snapshots.get(name)
+        self._snapshots[name] = self.core.snapshot()
+        if replaced is not None:
+            self.core.discard(replaced)
+        request.setResponseCode(201)
+        return json.dumps({"snapshot": name})
+
+    @app.route("/mimic/v1.1/restore", methods=['POST'])
+    def restore_snapshot(self, request):
+        """
+        Replace the state of every mocked service with the state in the
+        snapshot named in the request body (``"default"`` if there is no
+        body).  The snapshot is kept, so it can be restored again.
+        """
+        try:
+            name = _snapshot_name(request)
+        except ValueError as e:
+            return _bad_request(request, text_type(e))
+        if name not in self._snapshots:
+            request.setResponseCode(404)
+            return json.dumps({"itemNotFound": {
+                "code": 404, "message": "No snapshot named " + name}})
+        self.core.restore(self._snapshots[name])
+        request.setResponseCode(200)
+        return json.dumps({"restored": name})
+
     @app.route("/mimic/v1.1/IdentityControlAPI/behaviors", branch=True)
     def handle_identity_behaviors(self, request):
         """
         Handle creating/deleting behaviors for mimic identity.
         """
-        api = AuthControlApiBehaviors(self.identity_behavior_registry)
-        return api.app.resource()
+        return self._cached_resource(
+            "identity-behaviors",
+            lambda: AuthControlApiBehaviors(
+                self.identity_behavior_registry).app.resource())
 
     @app.route("/mimicking/<string:service_id>/<string:region_name>",
                branch=True)
@@ -191,7 +322,9 @@ class MimicRoot(object):
         """
         Mock for the glance admin api
         """
-        return glance_api.GlanceAdminApi(self.core).app.resource()
+        return self._cached_resource(
+            "glance-admin",
+            lambda: glance_api.GlanceAdminApi(self.core).app.resource())
 
 
 class MimicRequest(Request, object):
@@ -201,68 +334,246 @@ class MimicRequest(Request, object):
     defaultContentType = b"application/json"
 
 
+@python_2_unicode_compatible
+@attr.s
+class _HeadersJSON(object):
+    """
+    Raw HTTP headers which are only decoded and serialized to JSON when
+    they are written to the log or listed.
+    """
+    raw_headers = attr.ib()
+
+    def as_dict(self):
+        """
+        Decode the headers into a JSON-serializable dictionary.
+        """
+        return {k.decode("utf-8"): [vv.decode("utf-8", "replace") for vv in v]
+                for (k, v) in self.raw_headers}
+
+    def __str__(self):
+        """
+        Serialize the headers as JSON.
+        """
+        return json.dumps(self.as_dict())
+
+
+@python_2_unicode_compatible
+@attr.s
+class _LogBody(object):
+    """
+    A request or response body (possibly truncated), which is only decoded
+    when it is written to the log or listed.
+    """
+    content = attr.ib()
+    truncated = attr.ib()
+
+    def as_text(self):
+        """
+        Decode the body, noting whether it was truncated.
+        """
+        text = self.content.decode("utf-8", "replace")
+        if self.truncated:
+            text += "... (truncated)"
+        return text
+
+    def __str__(self):
+        """
+        Format the body on its own lines, or as nothing if it is empty.
+        """
+        if not self.content:
+            return ""
+        return "\n" + self.as_text() + "\n"
+
+
+@attr.s
+class LoggedRequest(object):
+    """
+    A record of a request and the response to it, as kept by a
+    :obj:`RequestLog`.
+    """
+    method = attr.ib()
+    url = attr.ib()
+    request_headers = attr.ib()
+    request_body = attr.ib()
+    code = attr.ib()
+    response_headers = attr.ib()
+    response_body = attr.ib()
+
+    def log(self):
+        """
+        Write this request and its response to the Mimic log.
+
+        The headers and bodies are formatted as text here, rather than left
+        for the logger to format, since on Python 2 it would format them with
+        ``str``, which cannot encode text that is not ASCII.
+        """
+        log("Received request: {method} {url}\n"
+            "Headers: {headers}\n"
+            "{body}",
+            method=self.method, url=self.url,
+            headers=text_type(self.request_headers),
+            body=text_type(self.request_body))
+        log("Responding with {code} for: {method} {url}\n"
+            "Headers: {headers}\n"
+            "{body}",
+            method=self.method, url=self.url, code=self.code,
+            headers=text_type(self.response_headers),
+            body=text_type(self.response_body))
+
+    def json(self):
+        """
+        A JSON-serializable representation of this request and response.
+        """
+        return {
+            "method": self.method,
+            "url": self.url,
+            "request": {"headers": self.request_headers.as_dict(),
+                        "body": self.request_body.as_text()},
+            "response": {"code": self.code,
+                         "headers": self.response_headers.as_dict(),
+                         "body": self.response_body.as_text()}
+        }
+
+
+class RequestLog(object):
+    """
+    A bounded, in-memory history of the most recent requests made to Mimic.
+
+    Requests are also written to the Mimic log, but not while they are being
+    responded to: they are queued, and the queue is written out in a single
+    batch on the next iteration of the reactor.
+
+    :ivar int max_body_bytes: the maximum number of bytes of each request and
+        response body to keep.
+    """
+
+    def __init__(self, reactor=None, max_entries=1000, max_body_bytes=4096):
+        """
+        :param reactor: the :obj:`IReactorTime` with which to schedule writing
+            requests to the log; the global reactor if not given.
+        :param int max_entries: the number of requests to remember.
+        :param int max_body_bytes: the maximum number of bytes of each request
+            and response body to keep.
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+        self._reactor = reactor
+        self._entries = deque(maxlen=max_entries)
+        self._pending = []
+        self._flush_call = None
+        self.max_body_bytes = max_body_bytes
+
+    def record(self, entry):
+        """
+        Remember a :obj:`LoggedRequest`, and queue it to be written to the log.
+        """
+        self._entries.append(entry)
+        self._pending.append(entry)
+        if self._flush_call is None:
+            self._flush_call = self._reactor.callLater(0, self.flush)
+
+    def flush(self):
+        """
+        Write all the queued requests to the log.
+        """
+        self._flush_call = None
+        pending, self._pending = self._pending, []
+        for entry in pending:
+            entry.log()
+
+    def recent(self, limit=None):
+        """
+        Get the most recent requests, oldest first.
+
+        :param limit: the maximum number of requests to return, or ``None``
+            for all the remembered requests.
+        :return: a ``list`` of :obj:`LoggedRequest`
+        """
+        entries = list(self._entries)
+        if limit is not None:
+            entries = entries[max(len(entries) - limit, 0):]
+        return entries
+
+
 class MimicLoggingRequest(MimicRequest, object):
     """
     Mimic request that by default logs all incoming requests and outgoing
-    responses.
+    responses to the :obj:`RequestLog` of its site.
     """
 
     def __init__(self, *args, **kwargs):
         """
         Same as the superclass's :obj:`__init__` except it also creates a
-        buffer to store the response for logging.
+        buffer to store the start of the response for logging.
         """
         super(MimicLoggingRequest, self).__init__(*args, **kwargs)
         self.response_body_for_logging = BytesIO()
+        self.response_truncated = False
+
+    @property
+    def request_log(self):
+        """
+        The :obj:`RequestLog` of the site this request was made to.
+        """
+        return self.channel.site.request_log
 
     def process(self):
         """
-        Log the incoming response before calling the superclass's
-        :obj:`process`.
+        Capture the start of the request body before calling the
+        superclass's :obj:`process`.
         """
-        content = self.content.read()
+        max_body_bytes = self.request_log.max_body_bytes
+        content = self.content.read(max_body_bytes + 1)
         self.content.seek(0)
-        log("Received request: {method} {url}\n"
-            "Headers: {headers}\n"
-            "{body}",
-            method=self.method.decode("utf-8"), url=self.uri.decode("utf-8"),
-            headers=json.dumps(
-                {k.decode("utf-8"): [vv.decode("utf-8") for vv in v]
-                 for (k, v) in self.requestHeaders.getAllRawHeaders()}
-            ),
-            body=("\n" + content.decode("utf-8") + "\n" if content else ""))
+        self.request_body_for_logging = _LogBody(
+            content=content[:max_body_bytes],
+            truncated=len(content) > max_body_bytes)
         return super(MimicLoggingRequest, self).process()
 
     def write(self, data):
         """
-        Collect the response data before calling the superclass's :obj:`write`.
+        Collect the start of the response data before calling the
+        superclass's :obj:`write`.
         """
-        self.response_body_for_logging.write(data)
+        remaining = (self.request_log.max_body_bytes -
+                     self.response_body_for_logging.tell())
+        if remaining > 0:
+            self.response_body_for_logging.write(data[:remaining])
+        if len(data) > remaining:
+            self.response_truncated = True
         return super(MimicLoggingRequest, self).write(data)
 
     def finish(self):
         """
-        Before finishing the request, log the response.
+        Before finishing the request, record the request and response.
         """
-        content = self.response_body_for_logging.getvalue()
-        log("Responding with {code} for: {method} {url}\n"
-            "Headers: {headers}\n"
-            "{body}",
-            method=self.method.decode("utf-8"), url=self.uri.decode("utf-8"),
+        self.request_log.record(LoggedRequest(
+            method=self.method.decode("utf-8"),
+            url=self.uri.decode("utf-8"),
+            request_headers=_HeadersJSON(
+                list(self.requestHeaders.getAllRawHeaders())),
+            request_body=self.request_body_for_logging,
             code=self.code,
-            headers=json.dumps(
-                {k.decode("utf-8"): [vv.decode("utf-8") for vv in v]
-                 for (k, v) in self.responseHeaders.getAllRawHeaders()}),
-            body=("\n" + content.decode("utf-8") + "\n" if content else ""))
+            response_headers=_HeadersJSON(
+                list(self.responseHeaders.getAllRawHeaders())),
+            response_body=_LogBody(
+                content=self.response_body_for_logging.getvalue(),
+                truncated=self.response_truncated)))
         return super(MimicLoggingRequest, self).finish()
 
 
-def get_site(resource, logging=False):
+def get_site(resource, logging=False, request_log=None):
     """
     :param resource: A :class:`twisted.web.resource.Resource` object.
+    :param bool logging: Whether to log all requests and responses.
+    :param RequestLog request_log: Where to log requests and responses, if
+        ``logging`` is true; a new :obj:`RequestLog` if not given.
     :return: a :class:`Site` that can be run
     """
     site = Site(resource)
     site.displayTracebacks = False
     site.requestFactory = MimicLoggingRequest if logging else MimicRequest
+    if logging and request_log is None:
+        request_log = RequestLog()
+    site.request_log = request_log
     return site
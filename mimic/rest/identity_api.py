@@ -135,24 +135,18 @@ def default_authentication_behavior(core, http_request, credentials):
             }})
 
         http_request.setResponseCode(200)
-        prefix_map = {
-            # map of entry to URI prefix for that entry
-        }
-
-        def lookup(entry):
-            return prefix_map[entry]
         result = get_token(
             session.tenant_id,
-            entry_generator=lambda tenant_id:
-            list(core.entries_for_tenant(
-                 session.tenant_id, prefix_map,
-                 base_uri_from_request(http_request))),
-            prefix_for_endpoint=lookup,
             response_token=session.token,
             response_user_id=session.user_id,
             response_user_name=session.username,
         )
-        return json.dumps(result)
+        # Splice the pre-encoded service catalog into the "access" object.
+        encoded = json.dumps(result)
+        return "{0}, \"serviceCatalog\": {1}}}}}".format(
+            encoded[:-2],
+            core.catalog_json(session.tenant_id,
+                              base_uri_from_request(http_request)))
 
 
 @authentication.declare_behavior_creator("fail")
@@ -15,9 +15,9 @@ from mimic.imimic import IAPIMock
 from mimic.catalog import Entry
 from mimic.catalog import Endpoint
 
-from mimic.model.clb_errors import invalid_json_schema
+from mimic.model.clb_errors import bad_request_xml, invalid_json_schema
 from mimic.model.clb_objects import (
-    GlobalCLBCollections, BadKeysError, BadValueError
+    DEFAULT_FEED_LIMIT, GlobalCLBCollections, BadKeysError, BadValueError
 )
 from random import randrange
 
@@ -186,7 +186,7 @@ class LoadBalancerControlRegion(object):
                 "code": 404,
             })
 
-        node = next((node for node in clb.nodes if node.id == node_id), None)
+        node = clb.node_by_id(node_id)
         if node is None:
             request.setResponseCode(404)
             return json.dumps({
@@ -359,12 +359,29 @@ class LoadBalancerRegion(object):
                methods=['GET'])
     def get_node_feed(self, request, tenant_id, lb_id, node_id):
         """
-        Returns a 200 response code and node's feed on the load balancer
+        Returns a 200 response code and a page of node's feed on the load
+        balancer, which starts after the ``marker`` event (or with the oldest
+        event still kept) and has at most ``limit`` events, oldest first.  The
+        feed is written an entry at a time.
         """
-        body, code = self.session(tenant_id).get_node_feed(lb_id, node_id)
+        try:
+            marker = request.args.get(b'marker')
+            if marker is not None:
+                marker = int(marker[0])
+            limit = int(request.args.get(b'limit', [DEFAULT_FEED_LIMIT])[0])
+        except ValueError:
+            body, code = bad_request_xml("Marker and limit must be integers")
+        else:
+            body, code = self.session(tenant_id).get_node_feed(
+                lb_id, node_id, request.prePathURL().decode("utf-8"), marker,
+                limit)
         request.setResponseCode(code)
         request.setHeader(b"Content-Type", b"application/atom+xml")
-        return body
+        if code != 200:
+            return body
+        for piece in body:
+            request.write(piece.encode("utf-8"))
+        return b""
 
     @app.route(
         '/v2/<string:tenant_id>/loadbalancers/<int:lb_id>/nodes/<int:node_id>',
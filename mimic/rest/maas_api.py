@@ -30,6 +30,7 @@ from mimic.model.maas_errors import ObjectDoesNotExist, ParentDoesNotExist
 from mimic.model.maas_objects import (Agent,
                                       Alarm,
                                       AlarmState,
+                                      AuditLog,
                                       Check,
                                       Entity,
                                       MaasStore,
@@ -80,6 +81,27 @@ class MaasApi(object):
         return MaasMock(self, uri_prefix, session_store, region).app.resource()
 
 
+# The notification types are the same for every tenant, and never change.
+NOTIFICATION_TYPES = [{'id': 'webhook', 'fields': [{'name': 'url',
+                                                    'optional': False,
+                                                    'description': 'An HTTP or \
+                                                                      HTTPS URL to POST to'}]},
+                      {'id': 'email', 'fields': [{'name': 'address',
+                                                  'optional': False,
+                                                  'description': 'Email \
+                                                                    address to send notifications to'}]},
+                      {'id': 'pagerduty', 'fields': [{'name': 'service_key',
+                                                      'optional': False,
+                                                      'description': 'The PagerDuty \
+                                                                        service key to use.'}]},
+                      {'id': 'sms', 'fields': [{'name': 'phone_number',
+                                                'optional': False,
+                                                'description': 'Phone number to send \
+                                                                  the notification to, \
+                                                                  with leading + and country \
+                                                                  code (E.164 format)'}]}]
+
+
 class MCache(object):
     """
     M(onitoring) Cache Object to hold dictionaries of all entities, checks and alarms.
@@ -105,26 +127,9 @@ class MCache(object):
                                label=u'Technical Contacts - Email',
                                created_at=current_time_milliseconds,
                                updated_at=current_time_milliseconds))])
-        self.notificationtypes_list = [{'id': 'webhook', 'fields': [{'name': 'url',
-                                                                     'optional': False,
-                                                                     'description': 'An HTTP or \
-                                                                      HTTPS URL to POST to'}]},
-                                       {'id': 'email', 'fields': [{'name': 'address',
-                                                                   'optional': False,
-                                                                   'description': 'Email \
-                                                                    address to send notifications to'}]},
-                                       {'id': 'pagerduty', 'fields': [{'name': 'service_key',
-                                                                       'optional': False,
-                                                                       'description': 'The PagerDuty \
-                                                                        service key to use.'}]},
-                                       {'id': 'sms', 'fields': [{'name': 'phone_number',
-                                                                 'optional': False,
-                                                                 'description': 'Phone number to send \
-                                                                  the notification to, \
-                                                                  with leading + and country \
-                                                                  code (E.164 format)'}]}]
+        self.notificationtypes_list = NOTIFICATION_TYPES
         self.suppressions = collections.OrderedDict()
-        self.audits_list = []
+        self.audit_log = AuditLog()
         self.maas_store = MaasStore(clock)
         self.test_alarm_responses = {}
         self.test_alarm_errors = {}
@@ -490,17 +495,22 @@ def _compute_multiplot(maas_store, entity_id, check, metric_name, from_date, to_
     except NameError:
         return fallback
 
+    recorded = metric.get_recorded_values(**metric_value_kwargs)
+    if recorded is not None:
+        data = recorded.downsample(from_date, to_date, points)
+    else:
+        timestamps = [int(from_date + (i * interval)) for i in range(points)]
+        values = metric.get_values(timestamps, **metric_value_kwargs)
+        data = [{'numPoints': 4,
+                 'timestamp': timestamp,
+                 'average': value}
+                for timestamp, value in zip(timestamps, values)]
     return {'entity_id': entity_id,
             'check_id': check.id,
             'metric': metric_name,
             'unit': metric.unit,
             'type': metric.type,
-            'data': [{'numPoints': 4,
-                      'timestamp': int(from_date + (i * interval)),
-                      'average': metric.get_value(
-                          timestamp=int(from_date + (i * interval)),
-                          **metric_value_kwargs)}
-                     for i in range(points)]}
+            'data': data}
 
 
 def parse_and_flatten_qs(url):
@@ -522,6 +532,57 @@ def _mcache_factory(clock):
     return lambda: collections.defaultdict(lambda: MCache(clock))
 
 
+class _AuditRecord(object):
+    """
+    A record in the audit log of a tenant, which keeps the parts of the
+    request it needs, and only decodes them into the record returned by the
+    audits API the first time it is listed.
+    """
+
+    def __init__(self, app, request, tenant_id, status, content, timestamp):
+        """
+        Create a record of a request that has just been handled.
+        """
+        self.id = text_type(uuid4())
+        self._app = app
+        self._headers = request.getAllHeaders()
+        self._path = request.path
+        self._uri = request.uri
+        self._method = request.method
+        self._tenant_id = tenant_id
+        self._status = status
+        self._content = content
+        self._timestamp = timestamp
+        self._json = None
+
+    def to_json(self):
+        """
+        Get the record as returned by the audits API.
+        """
+        if self._json is None:
+            headers = {k.decode("utf-8"): [vv.decode("utf-8") if isinstance(vv, bytes) else vv
+                                           for vv in v]
+                       for k, v in self._headers.items()
+                       if k != b'x-auth-token'}
+            self._json = {
+                'id': self.id,
+                'timestamp': self._timestamp,
+                'headers': headers,
+                'url': self._path.decode("utf-8"),
+                'app': self._app,
+                'query': parse_and_flatten_qs(self._uri.decode("utf-8")),
+                'txnId': text_type(uuid4()),
+                'payload': self._content.decode("utf-8"),
+                'method': self._method.decode("utf-8"),
+                'account_id': self._tenant_id,
+                'who': '',
+                'why': '',
+                'statusCode': self._status
+            }
+            self._headers = self._path = self._uri = self._method = self._content = None
+        return self._json
+
+
 class MaasMock(object):
     """
     Klein routes for the Monitoring API.
@@ -546,26 +607,9 @@ class MaasMock(object):
                 )
 
     def _audit(self, app, request, tenant_id, status, content=b''):
-        headers = {k.decode("utf-8"): [vv.decode("utf-8") if isinstance(vv, bytes) else vv for vv in v]
-                   for k, v in request.getAllHeaders().items()
-                   if k != b'x-auth-token'}
-
-        record = {
-            'id': text_type(uuid4()),
-            'timestamp': int(1000 * self._session_store.clock.seconds()),
-            'headers': headers,
-            'url': request.path.decode("utf-8"),
-            'app': app,
-            'query': parse_and_flatten_qs(request.uri.decode("utf-8")),
-            'txnId': text_type(uuid4()),
-            'payload': content.decode("utf-8"),
-            'method': request.method.decode("utf-8"),
-            'account_id': tenant_id,
-            'who': '',
-            'why': '',
-            'statusCode': status
-        }
-        self._entity_cache_for_tenant(tenant_id).audits_list.append(record)
+        record = _AuditRecord(app, request, tenant_id, status, content,
+                              int(1000 * self._session_store.clock.seconds()))
+        self._entity_cache_for_tenant(tenant_id).audit_log.append(record)
 
     app = MimicApp()
 
@@ -1076,24 +1120,25 @@ class MaasMock(object):
         """
         Gets the user's audit logs.
         """
-        ordering = -1 if request.args.get(b'reverse', False) else 1
-        all_audits = self._entity_cache_for_tenant(
-            tenant_id).audits_list[::ordering]
-        page_limit = min(int(request.args.get(b'limit', [100])[0]), 1000)
-        offset = 0
+        reverse = bool(request.args.get(b'reverse', False))
+        try:
+            page_limit = int(request.args.get(b'limit', [100])[0])
+            if page_limit < 0:
+                raise ValueError('limit must not be negative')
+        except ValueError as e:
+            request.setResponseCode(400)
+            return json.dumps({'type': 'badRequest',
+                               'code': 400,
+                               'message': 'Validation error for key \'limit\'',
+                               'details': text_type(e)})
+        page_limit = min(page_limit, 1000)
         current_marker = request.args.get(b'marker', [None])[0]
         if current_marker is not None:
             current_marker = current_marker.decode("utf-8")
-            try:
-                offset = all_audits.index(
-                    Matcher(lambda audit: audit['id'] == current_marker))
-            except ValueError:
-                offset = 0
 
-        audits = all_audits[offset:offset + page_limit]
-        next_marker = None
-        if offset + page_limit < len(all_audits):
-            next_marker = all_audits[offset + page_limit]['id']
+        records, next_marker = self._entity_cache_for_tenant(
+            tenant_id).audit_log.page(current_marker, page_limit, reverse)
+        audits = [record.to_json() for record in records]
 
         metadata = {
             'count': len(audits),
@@ -1628,6 +1673,11 @@ class MaasMock(object):
         """
         datapoints for all metrics requested
         Right now, only checks of type remote.ping work
+
+        Each metric has ``points`` datapoints spaced evenly from ``from`` to
+        ``to``. A metric with recorded values instead has the average of the
+        values nearest to each of those timestamps, and leaves out any
+        timestamp that no values are near, so it may have fewer datapoints.
         """
         entities = self._entity_cache_for_tenant(tenant_id).entities
         maas_store = self._entity_cache_for_tenant(tenant_id).maas_store
@@ -1696,13 +1746,27 @@ class MaasMock(object):
     @app.route('/v1.0/<string:tenant_id>/changelogs/alarms', methods=['GET'])
     def change_logs(self, request, tenant_id):
         """
-        Gets entities, checks and alarms grouped with their latest alarm states.
+        Gets the recorded alarm state changes, optionally only those with
+        timestamps from ``from`` to ``to`` (in milliseconds since the epoch).
         """
+        start = None
+        end = None
+        try:
+            if b'from' in request.args:
+                start = int(request.args[b'from'][0])
+            if b'to' in request.args:
+                end = int(request.args[b'to'][0])
+        except ValueError as e:
+            request.setResponseCode(400)
+            return json.dumps({'type': 'badRequest',
+                               'code': 400,
+                               'message': 'Validation error for key \'from, to\'',
+                               'details': text_type(e)})
         all_alarm_states = self._entity_cache_for_tenant(
-            tenant_id).maas_store.alarm_states
+            tenant_id).maas_store.alarm_states_between(start, end)
 
         values = [{'id': text_type(uuid4()),  # probably "correct" would be each_alarm_state.id
-                   'timestamp': int(1000 * self._session_store.clock.seconds()),
+                   'timestamp': each_alarm_state.timestamp,
                    'entity_id': each_alarm_state.entity_id,
                    'alarm_id': each_alarm_state.alarm_id,
                    'check_id': each_alarm_state.check_id,
@@ -1835,7 +1899,7 @@ class MaasController(object):
         entity ID and check type.
         """
         maas_store = self._entity_cache_for_tenant(tenant_id).maas_store
-        check_type_ins = maas_store.check_types[check_type]
+        check_type_ins = maas_store.check_type_for_update(check_type)
         overrides = json_from_request(request)
         check_id = '__test_check'
         ench_key = (entity_id, check_id)
@@ -1867,8 +1931,7 @@ class MaasController(object):
         Clears overriding behavior on a test-check handler.
         """
         maas_store = self._entity_cache_for_tenant(tenant_id).maas_store
-        check_type_ins = maas_store.check_types[check_type]
-        check_type_ins.clear_overrides()
+        maas_store.clear_check_type_overrides(check_type)
         request.setResponseCode(204)
         return b''
 
@@ -1890,11 +1953,9 @@ class MaasController(object):
             return json.dumps(e.to_json())
 
         previous_state = u'UNKNOWN'
-        alarm_states_same_entity_and_alarm = [
-            state for state in maas_store.alarm_states
-            if state.entity_id == entity_id and state.alarm_id == alarm_id]
-        if len(alarm_states_same_entity_and_alarm) > 0:
-            previous_state = alarm_states_same_entity_and_alarm[-1].state
+        latest_state = maas_store.latest_alarm_state(entity_id, alarm_id)
+        if latest_state is not None:
+            previous_state = latest_state.state
 
         monitoring_zone_id = request_body.get(
             'analyzed_by_monitoring_zone_id', u'mzord')
@@ -1920,7 +1981,7 @@ class MaasController(object):
                                'details': 'Missing required key ({0})'.format(missing_key),
                                'txnId': '.fake.mimic.transaction.id.c-1111111.ts-123444444.v-12344frf'})
 
-        maas_store.alarm_states.append(new_state)
+        maas_store.add_alarm_state(new_state)
         request.setResponseCode(201)
         request.setHeader(b'x-object-id', new_state.id.encode('utf-8'))
         request.setHeader(b'content-type', b'text/plain')
@@ -1942,8 +2003,8 @@ class MaasController(object):
             return json.dumps(e.to_json())
 
         maas_store = self._entity_cache_for_tenant(tenant_id).maas_store
-        metric = maas_store.check_types[
-            check.type].get_metric_by_name(metric_name)
+        metric = maas_store.check_type_for_update(
+            check.type).get_metric_by_name(metric_name)
         request_body = json_from_request(request)
         monitoring_zones = request_body.get('monitoring_zones', ['__AGENT__'])
         override_type = request_body['type']
@@ -1975,6 +2036,80 @@ class MaasController(object):
         request.setResponseCode(204)
         return b''
 
+    def _metric_for_update(self, tenant_id, entity_id, check_id, metric_name):
+        """
+        Gets the tenant's own copy of a metric of a check, to record values
+        of.
+
+        :raises ObjectDoesNotExist: or :obj:`ParentDoesNotExist` if there is
+            no such check, or the check has no such metric.
+        """
+        entities = self._entity_cache_for_tenant(tenant_id).entities
+        check = _get_check(entities, entity_id, check_id)
+        maas_store = self._entity_cache_for_tenant(tenant_id).maas_store
+        check_types = maas_store.check_types
+        if check.type not in check_types:
+            raise ObjectDoesNotExist(object_type='CheckType', key=check.type)
+        try:
+            check_types[check.type].get_metric_by_name(metric_name)
+        except NameError:
+            raise ObjectDoesNotExist(object_type='Metric', key=metric_name)
+        return maas_store.check_type_for_update(
+            check.type).get_metric_by_name(metric_name)
+
+    @app.route('/v1.0/<string:tenant_id>/entities/<string:entity_id>/checks' +
+               '/<string:check_id>/metrics/<string:metric_name>/datapoints', methods=['POST'])
+    def record_metric_values(self, request, tenant_id, entity_id, check_id, metric_name):
+        """
+        Records values of a metric, given as ``datapoints``, a list of
+        ``[timestamp, value]`` pairs, which multiplot will return (averaged
+        over each of its points) instead of random data.
+        """
+        try:
+            metric = self._metric_for_update(tenant_id, entity_id, check_id, metric_name)
+        except (ObjectDoesNotExist, ParentDoesNotExist) as e:
+            request.setResponseCode(e.code)
+            return json.dumps(e.to_json())
+
+        request_body = json_from_request(request)
+        monitoring_zones = request_body.get('monitoring_zones', ['__AGENT__'])
+        try:
+            for monitoring_zone in monitoring_zones:
+                metric.record_values(request_body['datapoints'],
+                                     entity_id=entity_id,
+                                     check_id=check_id,
+                                     monitoring_zone=monitoring_zone)
+        except (KeyError, TypeError, ValueError) as e:
+            request.setResponseCode(400)
+            return json.dumps({'type': 'badRequest',
+                               'code': 400,
+                               'message': 'Validation error for key \'datapoints\'',
+                               'details': text_type(e)})
+        request.setResponseCode(204)
+        return b''
+
+    @app.route('/v1.0/<string:tenant_id>/entities/<string:entity_id>/checks' +
+               '/<string:check_id>/metrics/<string:metric_name>/datapoints', methods=['DELETE'])
+    def clear_metric_values(self, request, tenant_id, entity_id, check_id, metric_name):
+        """
+        Clears the recorded values of a metric, in the monitoring zones
+        given as ``monitoring_zone`` query parameters.
+        """
+        try:
+            metric = self._metric_for_update(tenant_id, entity_id, check_id, metric_name)
+        except (ObjectDoesNotExist, ParentDoesNotExist) as e:
+            request.setResponseCode(e.code)
+            return json.dumps(e.to_json())
+
+        monitoring_zones = [zone.decode("utf-8") for zone in
+                            request.args.get(b'monitoring_zone', [b'__AGENT__'])]
+        for monitoring_zone in monitoring_zones:
+            metric.clear_recorded_values(entity_id=entity_id,
+                                         check_id=check_id,
+                                         monitoring_zone=monitoring_zone)
+        request.setResponseCode(204)
+        return b''
+
     @app.route('/v1.0/<string:tenant_id>/entities/<string:entity_id>/agents', methods=['POST'])
     def create_agent(self, request, tenant_id, entity_id):
         """
@@ -5,12 +5,157 @@ Contains the base Klein app for Mimic.
 from __future__ import absolute_import, division, unicode_literals
 
 from klein import Klein
+from werkzeug.routing import Map
+
+
+def _first_segment(path):
+    """
+    Get the first segment of a URL path or route.
+
+    :param str path: a URL path like ``/v2/tenant/servers``, or a route like
+        ``/v2/<string:tenant_id>/servers``.
+    :return: the first segment, like ``v2``.
+    """
+    return path.lstrip("/").split("/", 1)[0]
+
+
+class _DispatchMapAdapter(object):
+    """
+    A stand-in for the :obj:`MapAdapter` of a :obj:`RouteDispatchMap`, which
+    only tries to match a path against the rules which share its first
+    segment, or whose first segment is variable, by matching it with an
+    adapter for a smaller map of just those rules.  Everything else, such as
+    building URLs, is done by the adapter for the whole map.
+    """
+    def __init__(self, url_map, adapter, bind_args, bind_kwargs):
+        """
+        :param RouteDispatchMap url_map: the map being matched against.
+        :param MapAdapter adapter: an adapter for the whole map.
+        :param tuple bind_args: the positional arguments ``adapter`` was
+            bound with.
+        :param dict bind_kwargs: the keyword arguments ``adapter`` was bound
+            with.
+        """
+        self._map = url_map
+        self._adapter = adapter
+        self._bind_args = bind_args
+        self._bind_kwargs = bind_kwargs
+
+    def match(self, path_info=None, *args, **kwargs):
+        """
+        Match the path against the candidate rules only; see
+        :obj:`MapAdapter.match`.
+        """
+        if path_info is None:
+            path_info = self._adapter.path_info
+        adapter = self._map.map_for(path_info).bind(
+            *self._bind_args, **self._bind_kwargs)
+        return adapter.match(path_info, *args, **kwargs)
+
+    def __getattr__(self, name):
+        """
+        Get any other attribute from the adapter for the whole map.
+        """
+        return getattr(self._adapter, name)
+
+
+class RouteDispatchMap(Map):
+    """
+    A werkzeug :obj:`Map` that dispatches on the first segment of the path
+    before matching it, rather than trying every rule in turn.
+
+    The dispatch table is compiled the first time a path is matched after a
+    rule is added.  Each entry is a smaller :obj:`Map` with the same settings
+    as this one, of unbound copies of the rules whose first segment is that
+    static text, along with the rules whose first segment contains a
+    variable; since it sorts its rules the same way, it tries them in the
+    order this map would have.
+    """
+    def __init__(self, *args, **kwargs):
+        """
+        Same as :obj:`Map.__init__`, with an empty dispatch table.
+        """
+        super(RouteDispatchMap, self).__init__(*args, **kwargs)
+        self._dispatch_table = None
+
+    def add(self, rulefactory):
+        """
+        Add a rule, and forget the dispatch table compiled for the old ones.
+        """
+        super(RouteDispatchMap, self).add(rulefactory)
+        self._dispatch_table = None
+
+    def _submap(self, rules):
+        """
+        Build a :obj:`Map` with the same settings as this one, of unbound
+        copies of the given rules.
+        """
+        return Map([rule.empty() for rule in rules],
+                   default_subdomain=self.default_subdomain,
+                   charset=self.charset,
+                   strict_slashes=self.strict_slashes,
+                   redirect_defaults=self.redirect_defaults,
+                   converters=self.converters,
+                   sort_parameters=self.sort_parameters,
+                   sort_key=self.sort_key,
+                   encoding_errors=self.encoding_errors,
+                   host_matching=self.host_matching)
+
+    def _compile(self):
+        """
+        Build the dispatch table from the sorted rules.
+
+        :return: a 2-tuple of a ``dict`` mapping static first segments to
+            maps of their candidate rules, and a map of the rules that can
+            match any other path.
+        """
+        static = {}
+        variable = []
+        for rule in self.iter_rules():
+            segment = _first_segment(rule.rule)
+            if "<" in segment:
+                variable.append(rule)
+                for rules in static.values():
+                    rules.append(rule)
+            else:
+                static.setdefault(segment, list(variable)).append(rule)
+        return ({segment: self._submap(rules)
+                 for segment, rules in static.items()},
+                self._submap(variable))
+
+    def map_for(self, path_info):
+        """
+        Get a map of the rules which could match a path.
+
+        :param str path_info: the path to be matched.
+        :return: a :obj:`Map`.
+        """
+        if self._dispatch_table is None:
+            self._dispatch_table = self._compile()
+        static, variable = self._dispatch_table
+        return static.get(_first_segment(path_info or ""), variable)
+
+    def bind(self, *args, **kwargs):
+        """
+        Same as :obj:`Map.bind`, but returns an adapter that matches using
+        the dispatch table.
+        """
+        adapter = super(RouteDispatchMap, self).bind(*args, **kwargs)
+        return _DispatchMapAdapter(self, adapter, args, kwargs)
 
 
 class MimicApp(Klein):
     """
-    Base app that extends Klein to override route.
+    Base app that extends Klein to override route, and to dispatch requests
+    with a :obj:`RouteDispatchMap`.
     """
+    def __init__(self):
+        """
+        Same as :obj:`Klein.__init__`, but with a :obj:`RouteDispatchMap`.
+        """
+        super(MimicApp, self).__init__()
+        self._url_map = RouteDispatchMap()
+
     def route(self, *args, **kwargs):
         """
         Default strict_slashes to False
@@ -7,18 +7,21 @@ from __future__ import absolute_import, division, unicode_literals
 import json
 import collections
 from uuid import uuid4
-from six import text_type
+from six import integer_types, text_type
 
 from mimic.imimic import IAPIMock
 from twisted.plugin import IPlugin
 
 from mimic.catalog import Entry
 from mimic.catalog import Endpoint
-from mimic.model.queue_objects import QueueCollection
+from mimic.model.queue_objects import DEFAULT_LIMIT, MAX_LIMIT, QueueCollection
 from mimic.rest.mimicapp import MimicApp
 from zope.interface import implementer
 
 
+MAX_WAIT = 60
+
+
 def _client_id(request):
     """
     Gets the value of the Client-ID header from the request.
@@ -30,6 +33,85 @@ def _client_id(request):
     return request.requestHeaders.getRawHeaders(b'client-id')[0].decode("ascii")
 
 
+def _bool_arg(request, name):
+    """
+    Gets the value of a boolean query parameter from the request, which is
+    false unless it is ``true``.
+    """
+    return request.args.get(name, [b'false'])[0] == b'true'
+
+
+def _limit_arg(request):
+    """
+    Gets the value of the ``limit`` query parameter from the request.
+
+    :raises ValueError: if the limit is not a number from 1 to
+        :obj:`MAX_LIMIT`.
+    """
+    limit = int(request.args.get(b'limit', [DEFAULT_LIMIT])[0])
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError("limit must be from 1 to {0}".format(MAX_LIMIT))
+    return limit
+
+
+def _ids_arg(request):
+    """
+    Gets the message IDs in the comma-separated ``ids`` query parameter from
+    the request.
+
+    :return: a list of IDs, or ``None`` if the parameter was not given.
+    :raises ValueError: if there are more than :obj:`MAX_LIMIT` IDs.
+    """
+    ids = request.args.get(b'ids')
+    if ids is None:
+        return None
+    ids = [message_id for message_id in ids[0].decode("ascii").split(',')
+           if message_id]
+    if len(ids) > MAX_LIMIT:
+        raise ValueError("at most {0} ids may be given".format(MAX_LIMIT))
+    return ids
+
+
+def _wait_arg(request):
+    """
+    Gets the number of seconds to wait for messages from the ``wait`` query
+    parameter of the request.
+
+    :raises ValueError: if it is not a number from 0 to :obj:`MAX_WAIT`.
+    """
+    wait = float(request.args.get(b'wait', [0])[0])
+    if not 0 <= wait <= MAX_WAIT:
+        raise ValueError("wait must be from 0 to {0}".format(MAX_WAIT))
+    return wait
+
+
+def _bad_request(request, description):
+    """
+    Sets the response code for an invalid request, and returns its body.
+    """
+    request.setResponseCode(400)
+    return json.dumps({'title': 'Invalid API request',
+                       'description': description})
+
+
+def _claim_options(request):
+    """
+    Gets the ``ttl`` and ``grace`` of a claim from the JSON body of the
+    request.
+
+    :raises ValueError: if the body is not a JSON object with an integer
+        ``ttl``, and optionally an integer ``grace``.
+    """
+    options = json.loads(request.content.read().decode("utf-8"))
+    ttl = options['ttl']
+    grace = options.get('grace', 0)
+    if not all(isinstance(value, integer_types) and
+               not isinstance(value, bool) and value >= 0
+               for value in (ttl, grace)):
+        raise ValueError("ttl and grace must be non-negative integers")
+    return ttl, grace
+
+
 @implementer(IAPIMock, IPlugin)
 class QueueApi(object):
     """
@@ -125,14 +207,45 @@ class QueueApiRoutes(object):
     @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/messages", methods=['GET'])
     def list_messages_for_queue(self, request, tenant_id, queue_name):
         """
-        Lists messages from the queue.
+        Lists messages from the queue, or gets the messages whose IDs are
+        given as ``ids``.
+
+        If there are no messages to list and ``wait`` is given, the response
+        is held until messages are posted or ``wait`` seconds have passed.
         """
         q_collection = self._queue_collection(tenant_id)
-        echo = request.args.get(b'echo', [b'false'])[0] == b'true'
-        (response_body, response_code) = q_collection.list_messages_for_queue(
-            queue_name, _client_id(request), echo)
-        request.setResponseCode(response_code)
-        return json.dumps(response_body)
+        try:
+            ids = _ids_arg(request)
+            limit = _limit_arg(request)
+            wait = _wait_arg(request)
+            marker = request.args.get(b'marker')
+            if marker is not None:
+                marker = int(marker[0])
+        except ValueError as e:
+            return _bad_request(request, "Invalid query: {0}".format(e))
+
+        if ids is not None:
+            (response_body, response_code) = q_collection.get_messages_from_queue(
+                queue_name, ids)
+            request.setResponseCode(response_code)
+            return json.dumps(response_body)
+
+        clock = self._session_store.clock
+        deadline = clock.seconds() + wait
+
+        def list_messages(_=None):
+            (response_body, response_code) = q_collection.list_messages_for_queue(
+                queue_name, _client_id(request), _bool_arg(request, b'echo'),
+                marker, limit, _bool_arg(request, b'include_claimed'))
+            remaining = deadline - clock.seconds()
+            if response_code == 204 and remaining > 0:
+                d = q_collection.wait_for_messages_in_queue(queue_name, remaining)
+                if d is not None:
+                    return d.addCallback(list_messages)
+            request.setResponseCode(response_code)
+            return json.dumps(response_body)
+
+        return list_messages()
 
     @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/messages", methods=['POST'])
     def post_messages_to_queue(self, request, tenant_id, queue_name):
@@ -145,3 +258,94 @@ class QueueApiRoutes(object):
             queue_name, messages, _client_id(request))
         request.setResponseCode(response_code)
         return json.dumps(response_body)
+
+    @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/messages", methods=['DELETE'])
+    def delete_messages(self, request, tenant_id, queue_name):
+        """
+        Deletes the messages whose IDs are given as ``ids`` from the queue.
+        """
+        q_collection = self._queue_collection(tenant_id)
+        try:
+            ids = _ids_arg(request)
+        except ValueError as e:
+            return _bad_request(request, "Invalid query: {0}".format(e))
+        if ids is None:
+            return _bad_request(request, "ids must be given")
+        (response_body, response_code) = q_collection.delete_messages_from_queue(
+            queue_name, ids)
+        request.setResponseCode(response_code)
+        return json.dumps(response_body)
+
+    @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/messages/<string:message_id>",
+               methods=['DELETE'])
+    def delete_message(self, request, tenant_id, queue_name, message_id):
+        """
+        Deletes a message from the queue.  A claimed message can only be
+        deleted by giving the ID of its claim as ``claim_id``.
+        """
+        q_collection = self._queue_collection(tenant_id)
+        claim_id = request.args.get(b'claim_id', [None])[0]
+        if claim_id is not None:
+            claim_id = claim_id.decode("ascii")
+        (response_body, response_code) = q_collection.delete_message_from_queue(
+            queue_name, message_id, claim_id)
+        request.setResponseCode(response_code)
+        return json.dumps(response_body)
+
+    @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/claims", methods=['POST'])
+    def claim_messages(self, request, tenant_id, queue_name):
+        """
+        Claims a batch of messages in the queue.
+        """
+        q_collection = self._queue_collection(tenant_id)
+        try:
+            limit = _limit_arg(request)
+            ttl, grace = _claim_options(request)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return _bad_request(request, "Invalid claim: {0}".format(e))
+        (response_body, response_code, location) = (
+            q_collection.claim_messages_in_queue(queue_name, ttl, grace, limit))
+        if location is not None:
+            request.setHeader(b'location', location.encode("ascii"))
+        request.setResponseCode(response_code)
+        return json.dumps(response_body)
+
+    @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/claims/<string:claim_id>",
+               methods=['GET'])
+    def get_claim(self, request, tenant_id, queue_name, claim_id):
+        """
+        Gets a claim and the messages it holds.
+        """
+        q_collection = self._queue_collection(tenant_id)
+        (response_body, response_code) = q_collection.get_claim_in_queue(
+            queue_name, claim_id)
+        request.setResponseCode(response_code)
+        return json.dumps(response_body)
+
+    @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/claims/<string:claim_id>",
+               methods=['PATCH'])
+    def update_claim(self, request, tenant_id, queue_name, claim_id):
+        """
+        Renews a claim.
+        """
+        q_collection = self._queue_collection(tenant_id)
+        try:
+            ttl, grace = _claim_options(request)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return _bad_request(request, "Invalid claim: {0}".format(e))
+        (response_body, response_code) = q_collection.update_claim_in_queue(
+            queue_name, claim_id, ttl, grace)
+        request.setResponseCode(response_code)
+        return json.dumps(response_body)
+
+    @app.route("/v1/<string:tenant_id>/queues/<string:queue_name>/claims/<string:claim_id>",
+               methods=['DELETE'])
+    def release_claim(self, request, tenant_id, queue_name, claim_id):
+        """
+        Releases a claim, so the messages it held can be claimed again.
+        """
+        q_collection = self._queue_collection(tenant_id)
+        (response_body, response_code) = q_collection.release_claim_in_queue(
+            queue_name, claim_id)
+        request.setResponseCode(response_code)
+        return json.dumps(response_body)
@@ -6,23 +6,34 @@ API mock for OpenStack Swift / Rackspace Cloud Files.
 
 from __future__ import absolute_import, division, unicode_literals
 
+from bisect import bisect_left, bisect_right, insort
+from hashlib import md5
+from io import BytesIO
 from uuid import uuid4, uuid5, NAMESPACE_URL
-from six import text_type
+from six import text_type, unichr
 
 import attr
-from json import dumps
+from json import dumps, loads
 
 from mimic.imimic import IAPIMock
 from twisted.plugin import IPlugin
-from twisted.web.http import CREATED, ACCEPTED, OK
+from twisted.web.http import (
+    CREATED, ACCEPTED, OK, NOT_MODIFIED, PARTIAL_CONTENT, PRECONDITION_FAILED,
+    REQUESTED_RANGE_NOT_SATISFIABLE, datetimeToString, stringToDatetime
+)
 
 from mimic.catalog import Entry
 from mimic.catalog import Endpoint
+from mimic.model.swift_objects import (
+    DataProducer, InlineData, ObjectStore, SegmentedData
+)
 from mimic.rest.mimicapp import MimicApp
-from twisted.web.http import CONFLICT
+from twisted.web.http import BAD_REQUEST, CONFLICT
 from twisted.web.resource import ErrorPage, NoResource
 from zope.interface import implementer
 
+UNPROCESSABLE_ENTITY = 422
+
 
 class Conlict(ErrorPage):
     """
@@ -36,6 +47,117 @@ class Conlict(ErrorPage):
         ErrorPage.__init__(self, CONFLICT, "Conflict", message)
 
 
+def parse_ranges(header, length):
+    """
+    Parse the value of a ``Range`` header for content of a given length.
+
+    :param unicode header: the value of the header, like ``bytes=0-99,-10``.
+    :param int length: the length of the content.
+
+    :return: ``None`` if the header is not a valid byte range header and so
+        should be ignored, or else a ``list`` of 2-tuples of the offset of the
+        first byte and the number of bytes for each satisfiable range, which
+        is empty if no range can be satisfied.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip() != "bytes":
+        return None
+    ranges = []
+    for spec in specs.split(","):
+        first, dash, last = spec.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = length - 1
+                if last:
+                    end = int(last)
+                    if end < start:
+                        return None
+            else:
+                suffix = int(last)
+                if suffix == 0:
+                    continue
+                start = max(length - suffix, 0)
+                end = length - 1
+        except ValueError:
+            return None
+        if start < length:
+            ranges.append((start, min(end, length - 1) - start + 1))
+    return ranges
+
+
+def _etag_matches(header, etag):
+    """
+    Determine whether an ETag is one of those listed in an ``If-Match`` or
+    ``If-None-Match`` header.
+
+    :param unicode header: the value of the header.
+    :param unicode etag: the ETag of the object, which may be quoted.
+    :return: ``True`` if the header lists the ETag, or is ``*``.
+    """
+    etag = etag.strip('"')
+    for value in header.split(","):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        if value == "*" or value.strip('"') == etag:
+            return True
+    return False
+
+
+def _header_time(request, name):
+    """
+    Get the time in an HTTP date header of a request.
+
+    :param request: the request.
+    :param bytes name: the name of the header.
+    :return: the time as seconds since the epoch, or ``None`` if the header
+        is missing, blank, or is not a valid date.
+    """
+    value = request.getHeader(name)
+    if value is None:
+        return None
+    try:
+        return stringToDatetime(value)
+    except (ValueError, IndexError):
+        # stringToDatetime raises IndexError for a blank value.
+        return None
+
+
+def check_preconditions(request, etag, last_modified):
+    """
+    Evaluate the conditional headers of a ``GET`` or ``HEAD`` request for an
+    object, in the order given by RFC 7232.
+
+    :param request: the request.
+    :param unicode etag: the ETag of the object.
+    :param int last_modified: when the object was last modified, as seconds
+        since the epoch.
+    :return: ``PRECONDITION_FAILED`` or ``NOT_MODIFIED`` if the request
+        should not get the object, otherwise ``None``.
+    """
+    if_match = request.getHeader(b"if-match")
+    if if_match is not None:
+        if not _etag_matches(if_match.decode("ascii", "replace"), etag):
+            return PRECONDITION_FAILED
+    else:
+        since = _header_time(request, b"if-unmodified-since")
+        if since is not None and last_modified > since:
+            return PRECONDITION_FAILED
+
+    if_none_match = request.getHeader(b"if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match.decode("ascii", "replace"), etag):
+            return NOT_MODIFIED
+    else:
+        since = _header_time(request, b"if-modified-since")
+        if since is not None and last_modified <= since:
+            return NOT_MODIFIED
+    return None
+
+
 def normal_tenant_id_to_crazy_mosso_id(normal_tenant_id):
     """
     Convert the tenant ID used by basically everything else (keystone, nova,
@@ -61,12 +183,19 @@ class SwiftMock(object):
     API mock for Swift.
     """
 
-    def __init__(self, rackspace_flavor=True):
+    def __init__(self, rackspace_flavor=True, object_store=None):
         """
         Construct a SwiftMock, either using Rackspace's tenant-ID translation
         idiom or not.
+
+        :param ObjectStore object_store: where to store the contents of
+            objects; an :obj:`ObjectStore` with the default memory budget if
+            not given.
         """
         self._regions = ["ORD", "DFW", "IAD"]
+        if object_store is None:
+            object_store = ObjectStore()
+        self.object_store = object_store
         if rackspace_flavor:
             self.translate_tenant = normal_tenant_id_to_crazy_mosso_id
         else:
@@ -114,7 +243,10 @@ class SwiftRegion(object):
         return (self.session_store.session_for_tenant_id(tenant_id)
                 .data_for_api(self.api,
                               lambda:
-                              SwiftTenantInRegion().app.resource()))
+                              SwiftTenantInRegion(
+                                  self.api.object_store,
+                                  self.session_store.clock))
+                .app.resource())
 
 
 @attr.s
@@ -132,12 +264,15 @@ class Object(object):
 
     data = attr.ib()
 
+    static_manifest = attr.ib(default=None)
+    last_modified = attr.ib(default=0)
+
     @property
     def length(self):
         """
         Return the length of the data
         """
-        return len(self.data)
+        return self.data.length
 
     def as_json(self):
         """
@@ -158,6 +293,10 @@ class Container(object):
     """
     name = attr.ib()
     objects = attr.ib(default=attr.Factory(dict))
+    byte_count = attr.ib(default=0)
+    _names = attr.ib(default=attr.Factory(list), repr=False)
+
+    max_listing = 10000
 
     @property
     def object_count(self):
@@ -166,15 +305,104 @@ class Container(object):
         """
         return len(self.objects)
 
-    @property
-    def byte_count(self):
+    def add_object(self, obj):
         """
-        Return the sum of data of all the objects in the container
+        Add an object to the container, replacing any object with the same
+        name, and keep count of the bytes in the container.
+
+        :param Object obj: the object to add.
+        :return: the :obj:`Object` that was replaced, or ``None``.
         """
-        byte_count = 0
-        for obj in self.objects.values():
-            byte_count += obj.length
-        return byte_count
+        replaced = self.objects.get(obj.name)
+        if replaced is not None:
+            self.byte_count -= replaced.length
+        else:
+            insort(self._names, obj.name)
+        self.objects[obj.name] = obj
+        self.byte_count += obj.length
+        return replaced
+
+    def remove_object(self, name):
+        """
+        Remove an object from the container, and keep count of the bytes in
+        the container.
+
+        :param unicode name: the name of the object to remove.
+        :return: the removed :obj:`Object`.
+        """
+        obj = self.objects.pop(name)
+        self.byte_count -= obj.length
+        del self._names[bisect_left(self._names, name)]
+        return obj
+
+    def names(self, prefix="", marker=None, end_marker=None):
+        """
+        Get the names of the objects in the container, in order, starting at
+        the first name matching the prefix without looking at the names
+        before it.
+
+        :param unicode prefix: only names starting with this.
+        :param unicode marker: only names after this.
+        :param unicode end_marker: only names before this.
+
+        :return: an iterable of ``unicode`` names.
+        """
+        position = self._first_position(prefix, marker)
+        while position < len(self._names):
+            name = self._names[position]
+            if not name.startswith(prefix) or (
+                    end_marker is not None and name >= end_marker):
+                return
+            yield name
+            position += 1
+
+    def _first_position(self, prefix, marker):
+        """
+        Find the position in the sorted names of the first name that could
+        both start with the prefix and come after the marker.
+        """
+        position = bisect_left(self._names, prefix)
+        if marker is not None:
+            position = max(position, bisect_right(self._names, marker))
+        return position
+
+    def listing(self, prefix="", marker=None, end_marker=None,
+                delimiter=None, limit=None):
+        """
+        List the objects in the container, as Swift's container GET does.
+
+        :param unicode prefix: only list objects whose names start with this.
+        :param unicode marker: only list objects after this name.
+        :param unicode end_marker: only list objects before this name.
+        :param unicode delimiter: if given, roll up the objects whose names
+            contain this after the prefix into a single ``subdir`` entry for
+            the pseudo-directory up to and including the delimiter.
+        :param int limit: the maximum number of entries to list; at most
+            :obj:`max_listing`.
+
+        :return: a ``list`` of JSON-serializable entries.
+        """
+        if limit is None or limit > self.max_listing:
+            limit = self.max_listing
+        names = self._names
+        position = self._first_position(prefix, marker)
+        listing = []
+        while position < len(names) and len(listing) < limit:
+            name = names[position]
+            if not name.startswith(prefix) or (
+                    end_marker is not None and name >= end_marker):
+                break
+            index = name.find(delimiter, len(prefix)) if delimiter else -1
+            if index >= 0:
+                subdir = name[:index + len(delimiter)]
+                listing.append({"subdir": subdir})
+                # Skip every other name in the same pseudo-directory.
+                position = bisect_left(
+                    names, subdir[:-1] + unichr(ord(subdir[-1]) + 1))
+            else:
+                listing.append(self.objects[name].as_json())
+                position += 1
+        return listing
 
 
 class SwiftTenantInRegion(object):
@@ -185,11 +413,19 @@ class SwiftTenantInRegion(object):
 
     app = MimicApp()
 
-    def __init__(self):
+    def __init__(self, object_store, clock):
         """
         Initialize a tenant with some containers.
+
+        :param ObjectStore object_store: where to store the contents of
+            objects.
+        :param IReactorTime clock: the clock to timestamp objects with.
         """
+        self.object_store = object_store
+        self.clock = clock
         self.containers = {}
+        self.object_count = 0
+        self.bytes_used = 0
         self.metadata = {}
 
     @app.route("/", methods=["POST"])
@@ -211,15 +447,9 @@ class SwiftTenantInRegion(object):
         """
         Api call to get the meta-data regarding all containers for a tenant
         """
-        total_containers = len(self.containers)
-        total_objects = 0
-        total_bytes = 0
-        for container in self.containers.values():
-            total_objects += container.object_count
-            total_bytes += container.byte_count
-        container_count = "{0}".format(total_containers).encode("utf-8")
-        object_count = "{0}".format(total_objects).encode("utf-8")
-        byte_count = "{0}".format(total_bytes).encode("utf-8")
+        container_count = "{0}".format(len(self.containers)).encode("utf-8")
+        object_count = "{0}".format(self.object_count).encode("utf-8")
+        byte_count = "{0}".format(self.bytes_used).encode("utf-8")
         request.responseHeaders.setRawHeaders(b"content-type",
                                               [b"application/json"])
         request.responseHeaders.setRawHeaders(b"x-account-container-count",
@@ -286,11 +516,30 @@ class SwiftTenantInRegion(object):
                                                   [object_count])
             request.responseHeaders.setRawHeaders(b"x-container-bytes-used",
                                                   [byte_count])
+
+            def query(name):
+                value = request.args.get(name.encode("ascii"))
+                if value is None:
+                    return None
+                return value[0].decode("utf-8")
+
+            limit = query("limit")
+            if limit is not None:
+                try:
+                    limit = int(limit)
+                    if limit < 0:
+                        raise ValueError(limit)
+                except ValueError:
+                    request.setResponseCode(PRECONDITION_FAILED)
+                    return b"Value of limit must be a positive integer"
+
             request.setResponseCode(OK)
-            return dumps([
-                obj.as_json() for obj in
-                self.containers[container_name].objects.values()
-            ])
+            return dumps(container.listing(
+                prefix=query("prefix") or "",
+                marker=query("marker"),
+                end_marker=query("end_marker"),
+                delimiter=query("delimiter"),
+                limit=limit))
         else:
             return NoResource("No such container")
 
@@ -322,24 +571,16 @@ class SwiftTenantInRegion(object):
             container = self.containers[container_name]
             if object_name in container.objects:
                 obj = container.objects[object_name]
-
-                def set_header_if_not_none(header_key, obj_value):
-                    if obj_value is not None:
-                        request.responseHeaders.setRawHeaders(
-                            header_key, [obj_value.encode("ascii")])
-
-                set_header_if_not_none(
-                    b"content-type",
-                    obj.content_type if obj.content_type is not None else
-                    u"application/octet-stream")
-                set_header_if_not_none(b"content-encoding", obj.content_encoding)
-                set_header_if_not_none(b"etag", obj.etag)
-                set_header_if_not_none(b"x-object-manifest", obj.object_manifest)
-                set_header_if_not_none(b"x-object-meta-name", obj.object_meta_name)
-
+                content = self.object_content(obj)
+                if content is None:
+                    return Conlict("A segment of the manifest is missing")
+                etag = self.object_etag(obj, content)
+                self.set_object_headers(request, obj, etag)
+                status = check_preconditions(request, etag,
+                                             int(obj.last_modified))
                 # return 200 since it actually "touches" the object
                 # while non-standard, this is how the Swift API works :(
-                request.setResponseCode(200)
+                request.setResponseCode(status or 200)
                 return b""
             else:
                 return NoResource("No such object in container")
@@ -357,27 +598,172 @@ class SwiftTenantInRegion(object):
             if object_name in container.objects:
                 obj = container.objects[object_name]
 
-                def set_header_if_not_none(header_key, obj_value):
-                    if obj_value is not None:
-                        request.responseHeaders.setRawHeaders(
-                            header_key, [obj_value.encode("ascii")])
-
-                set_header_if_not_none(
-                    b"content-type",
-                    obj.content_type if obj.content_type is not None else
-                    u"application/octet-stream")
-                set_header_if_not_none(b"content-encoding", obj.content_encoding)
-                set_header_if_not_none(b"etag", obj.etag)
-                set_header_if_not_none(b"x-object-manifest", obj.object_manifest)
-                set_header_if_not_none(b"x-object-meta-name", obj.object_meta_name)
-
-                request.setResponseCode(200)
-                return container.objects[object_name].data
+                if (obj.static_manifest is not None and
+                        request.args.get(b"multipart-manifest") == [b"get"]):
+                    self.set_object_headers(request, obj, obj.etag)
+                    request.responseHeaders.setRawHeaders(
+                        b"content-type", [b"application/json"])
+                    request.setResponseCode(OK)
+                    return dumps([
+                        {"name": "/{0}/{1}".format(*path)}
+                        for path in obj.static_manifest
+                    ])
+
+                content = self.object_content(obj)
+                if content is None:
+                    return Conlict("A segment of the manifest is missing")
+                etag = self.object_etag(obj, content)
+                self.set_object_headers(request, obj, etag)
+                status = check_preconditions(request, etag,
+                                             int(obj.last_modified))
+                if status is not None:
+                    request.setResponseCode(status)
+                    return b""
+                return self.respond_with_content(
+                    request, content, obj.content_type or
+                    "application/octet-stream")
             else:
                 return NoResource("No such object in container")
         else:
             return NoResource("No such container")
 
+    def set_object_headers(self, request, obj, etag):
+        """
+        Set the headers describing an object on the response to a request.
+
+        :param request: the request.
+        :param Object obj: the object.
+        :param unicode etag: the ETag of the object's content.
+        """
+        def set_header_if_not_none(header_key, obj_value):
+            if obj_value is not None:
+                request.responseHeaders.setRawHeaders(
+                    header_key, [obj_value.encode("ascii")])
+
+        set_header_if_not_none(
+            b"content-type",
+            obj.content_type if obj.content_type is not None else
+            u"application/octet-stream")
+        set_header_if_not_none(b"content-encoding", obj.content_encoding)
+        set_header_if_not_none(b"etag", etag)
+        request.responseHeaders.setRawHeaders(
+            b"last-modified", [datetimeToString(int(obj.last_modified))])
+        set_header_if_not_none(b"x-object-manifest", obj.object_manifest)
+        set_header_if_not_none(b"x-object-meta-name", obj.object_meta_name)
+
+    def object_etag(self, obj, content):
+        """
+        Get the ETag of the content of an object.  For a manifest object, that
+        is the quoted MD5 digest of the ETags of its segments, rather than of
+        its content.
+
+        :param Object obj: the object.
+        :param content: the object's content, as returned by
+            :obj:`object_content`.
+        :return: the ETag, as ``unicode``.
+        """
+        if content is obj.data:
+            return obj.etag
+        digest = md5()
+        for data, _, _ in content.segments:
+            digest.update(data.etag.encode("ascii"))
+        return '"{0}"'.format(digest.hexdigest())
+
+    def object_content(self, obj):
+        """
+        Get the content of an object, which for a manifest object is the
+        concatenation of its segments.
+
+        :param Object obj: the object.
+        :return: an :obj:`InlineData`, :obj:`SpilledData` or
+            :obj:`SegmentedData`, or ``None`` if a segment of a static large
+            object is missing.
+        """
+        if obj.object_manifest is not None:
+            container_name, _, prefix = obj.object_manifest.partition("/")
+            container = self.containers.get(container_name)
+            if container is None:
+                return SegmentedData([])
+            segments = [container.objects[name]
+                        for name in container.names(prefix)
+                        if container.objects[name] is not obj]
+        elif obj.static_manifest is not None:
+            segments = []
+            for container_name, object_name in obj.static_manifest:
+                container = self.containers.get(container_name)
+                if (container is None or
+                        object_name not in container.objects):
+                    return None
+                segments.append(container.objects[object_name])
+        else:
+            return obj.data
+        return SegmentedData((segment.data, 0, segment.length)
+                             for segment in segments)
+
+    def respond_with_content(self, request, content, content_type):
+        """
+        Stream content in response to a request, or just the ranges of it
+        given by the request's ``Range`` header.
+
+        :param request: the request.
+        :param content: an :obj:`InlineData`, :obj:`SpilledData` or
+            :obj:`SegmentedData`.
+        :param unicode content_type: the content type of the content.
+
+        :return: a :obj:`Deferred` firing with an empty response body once
+            the content has been written.
+        """
+        header = request.getHeader(b"range")
+        ranges = None
+        if header is not None:
+            ranges = parse_ranges(header.decode("ascii", "replace"),
+                                  content.length)
+
+        if ranges == []:
+            request.responseHeaders.setRawHeaders(
+                b"content-range",
+                ["bytes */{0}".format(content.length).encode("ascii")])
+            request.setResponseCode(REQUESTED_RANGE_NOT_SATISFIABLE)
+            return b""
+
+        if ranges is None:
+            request.setResponseCode(OK)
+        elif len(ranges) == 1:
+            [(start, length)] = ranges
+            request.responseHeaders.setRawHeaders(
+                b"content-range",
+                ["bytes {0}-{1}/{2}".format(
+                    start, start + length - 1, content.length
+                ).encode("ascii")])
+            request.setResponseCode(PARTIAL_CONTENT)
+            content = SegmentedData([(content, start, length)])
+        else:
+            boundary = uuid4().hex
+            parts = []
+            for start, length in ranges:
+                part_headers = (
+                    "--{0}\r\nContent-Type: {1}\r\n"
+                    "Content-Range: bytes {2}-{3}/{4}\r\n\r\n".format(
+                        boundary, content_type, start, start + length - 1,
+                        content.length).encode("ascii"))
+                parts.append((InlineData(None, part_headers), 0,
+                              len(part_headers)))
+                parts.append((content, start, length))
+                parts.append((InlineData(None, b"\r\n"), 0, 2))
+            end = "--{0}--\r\n".format(boundary).encode("ascii")
+            parts.append((InlineData(None, end), 0, len(end)))
+            content = SegmentedData(parts)
+            request.responseHeaders.setRawHeaders(
+                b"content-type",
+                ["multipart/byteranges; boundary={0}".format(
+                    boundary).encode("ascii")])
+            request.setResponseCode(PARTIAL_CONTENT)
+
+        request.responseHeaders.setRawHeaders(
+            b"content-length",
+            ["{0}".format(content.length).encode("ascii")])
+        return DataProducer(content, request).start()
+
     @app.route("/<string:container_name>/<path:object_name>",
                methods=["PUT"])
     def put_object(self, request, container_name, object_name):
@@ -396,24 +782,83 @@ class SwiftTenantInRegion(object):
 
             content_type = get_header_value(b"content-type")
             content_encoding = get_header_value(b"content-encoding")
-            etag = get_header_value(b"etag")
+            expected_etag = get_header_value(b"etag")
             object_manifest = get_header_value(b"x-object-manifest")
             object_meta_name = get_header_value(b"x-object-meta-name")
 
-            container.objects[object_name] = Object(
+            static_manifest = None
+            content = request.content
+            if request.args.get(b"multipart-manifest") == [b"put"]:
+                try:
+                    static_manifest = self.parse_static_manifest(
+                        loads(request.content.read().decode("utf-8")))
+                except (ValueError, KeyError, TypeError) as e:
+                    return ErrorPage(BAD_REQUEST, "Bad Request",
+                                     "Invalid manifest: {0}".format(e))
+                content = BytesIO(b"")
+                expected_etag = None
+
+            data = self.object_store.store(content)
+            if (expected_etag is not None and
+                    expected_etag.strip('"').lower() != data.etag):
+                self.object_store.release(data)
+                return ErrorPage(UNPROCESSABLE_ENTITY, "Unprocessable Entity",
+                                 "The ETag does not match the MD5 digest "
+                                 "of the object's content")
+
+            obj = Object(
                 name=object_name,
                 content_encoding=content_encoding,
                 content_type=content_type,
-                etag=etag,
+                etag=data.etag,
                 object_manifest=object_manifest,
                 object_meta_name=object_meta_name,
-                data=request.content.read()
+                data=data,
+                static_manifest=static_manifest,
+                last_modified=self.clock.seconds()
             )
+            replaced = container.add_object(obj)
+            self.bytes_used += obj.length
+            if replaced is None:
+                self.object_count += 1
+            else:
+                self.bytes_used -= replaced.length
+                self.object_store.release(replaced.data)
+            request.responseHeaders.setRawHeaders(
+                b"etag", [data.etag.encode("ascii")])
             request.setResponseCode(201)
             return b""
         else:
             return NoResource("No such container")
 
+    def parse_static_manifest(self, manifest):
+        """
+        Check the segments listed in the manifest of a static large object.
+
+        :param list manifest: the decoded JSON manifest, a list of segments
+            with a ``path`` of ``/container/object`` and optionally their
+            ``size_bytes``.
+        :return: a ``list`` of 2-tuples of the container and object name of
+            each segment.
+        :raises ValueError: if a segment's path is not a string, or the
+            segment does not exist, or is not the given size.
+        """
+        segments = []
+        for segment in manifest:
+            path = segment["path"]
+            if not isinstance(path, text_type):
+                raise ValueError("{0!r} is not a path".format(path))
+            container_name, _, object_name = path.lstrip("/").partition("/")
+            container = self.containers.get(container_name)
+            if container is None or object_name not in container.objects:
+                raise ValueError("{0} does not exist".format(path))
+            size = segment.get("size_bytes")
+            if (size is not None and
+                    size != container.objects[object_name].length):
+                raise ValueError("{0} is not {1} bytes".format(path, size))
+            segments.append((container_name, object_name))
+        return segments
+
     @app.route("/<string:container_name>/<path:object_name>",
                methods=["DELETE"])
     def delete_object(self, request, container_name, object_name):
@@ -423,7 +868,10 @@ class SwiftTenantInRegion(object):
         if container_name in self.containers:
             container = self.containers[container_name]
             if object_name in container.objects:
-                del container.objects[object_name]
+                obj = container.remove_object(object_name)
+                self.object_count -= 1
+                self.bytes_used -= obj.length
+                self.object_store.release(obj.data)
                 request.setResponseCode(204)
                 return b""
             else:
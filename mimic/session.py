@@ -9,6 +9,11 @@ from __future__ import absolute_import, division, unicode_literals
 from six import text_type
 from uuid import uuid4
 from datetime import datetime, timedelta
+from calendar import timegm
+from collections import OrderedDict
+from copy import deepcopy
+from heapq import heappush, heappop
+from itertools import count
 
 import attr
 
@@ -59,6 +64,14 @@ class NonMatchingTenantError(Exception):
     desired_tenant = attr.ib()
 
 
+def _expires_seconds(session):
+    """
+    Get the expiration time of the given session in seconds since the epoch.
+    """
+    return (timegm(session.expires.utctimetuple()) +
+            session.expires.microsecond / 1000000.)
+
+
 class SessionStore(object):
     """
     A collection of sessions addressable by multiple different keys.
@@ -67,14 +80,41 @@ class SessionStore(object):
     are created on demand, since all authentication succeeds by default within
     Mimic.
 
+    By default sessions are kept forever.  If ``expire_sessions`` is true,
+    sessions are evicted once the clock passes their ``expires`` time; if
+    ``max_sessions`` is set, the least recently used sessions are evicted
+    whenever there are more than that many.  An evicted session, and all the
+    application data associated with it, is forgotten: the next request for
+    the same token, username, or tenant creates a brand new session.
+
     :ivar IReactorTime clock: The clock used to track session expiration.
+    :ivar bool expire_sessions: Whether sessions are evicted when they expire.
+        Only sessions created while this is true are expired.
+    :ivar max_sessions: The maximum number of sessions to keep, or ``None``
+        for no limit.
+    :ivar int expired_count: The number of sessions evicted because they
+        expired.
+    :ivar int capacity_evicted_count: The number of sessions evicted because
+        there were more than ``max_sessions`` sessions.
     """
 
-    def __init__(self, clock):
+    def __init__(self, clock, expire_sessions=False, max_sessions=None):
         """
         Create a session store with the given IReactorTime provider.
         """
         self.clock = clock
+        self.expire_sessions = expire_sessions
+        self.max_sessions = max_sessions
+        self.expired_count = 0
+        self.capacity_evicted_count = 0
+        self._sessions_by_use = OrderedDict(
+            # mapping of id(session) to session (Session), least recently
+            # used first
+        )
+        self._expirations = [
+            # heap of (expiration in seconds, sequence number, session)
+        ]
+        self._sequence = count()
         self._token_to_session = {
             # mapping of token (unicode) to session (Session)
         }
@@ -89,6 +129,20 @@ class SessionStore(object):
             # _token_to_session)
         }
 
+    def __deepcopy__(self, memo):
+        """
+        Copy this store and all its sessions, re-keying the index of sessions
+        by use, since it is keyed by the identities of the sessions.
+        """
+        copied = SessionStore.__new__(SessionStore)
+        memo[id(self)] = copied
+        for name, value in self.__dict__.items():
+            copied.__dict__[name] = deepcopy(value, memo)
+        copied._sessions_by_use = OrderedDict(
+            (id(session), session)
+            for session in copied._sessions_by_use.values())
+        return copied
+
     def _new_session(self, username_key=None, **attributes):
         """
         Create a new session and persist it according to its username and token
@@ -123,6 +177,67 @@ class SessionStore(object):
         self._token_to_session[session.token] = session
         self._userid_to_session[session.user_id] = session
         self._tenant_to_session[session.tenant_id] = session
+        self._sessions_by_use[id(session)] = session
+        self._schedule_expiration(session)
+        while (self.max_sessions is not None and
+               len(self._sessions_by_use) > self.max_sessions):
+            _, oldest = self._sessions_by_use.popitem(last=False)
+            self._evict(oldest)
+            self.capacity_evicted_count += 1
+        return session
+
+    def _schedule_expiration(self, session):
+        """
+        Remember to evict the given session when it expires, if sessions are
+        being expired.
+        """
+        if self.expire_sessions:
+            heappush(self._expirations, (_expires_seconds(session),
+                                         next(self._sequence), session))
+
+    def _evict(self, session):
+        """
+        Remove the given session from every index in this store.
+        """
+        self._sessions_by_use.pop(id(session), None)
+        for token in [session.token] + list(session.impersonator_session_map):
+            if self._token_to_session.get(token) is session:
+                del self._token_to_session[token]
+        if self._userid_to_session.get(session.user_id) is session:
+            del self._userid_to_session[session.user_id]
+        if self._tenant_to_session.get(session.tenant_id) is session:
+            del self._tenant_to_session[session.tenant_id]
+        if self._username_to_token.get(session.username) == session.token:
+            del self._username_to_token[session.username]
+
+    def _evict_expired(self):
+        """
+        Evict every session whose expiration time has passed.
+
+        Each session has an entry in a heap ordered by expiration time, so
+        this only looks at sessions which are due to expire.  A session whose
+        ``expires`` has since been extended is put back into the heap with its
+        new expiration time.
+        """
+        now = self.clock.seconds()
+        while self._expirations and self._expirations[0][0] <= now:
+            _, _, session = heappop(self._expirations)
+            if self._sessions_by_use.get(id(session)) is not session:
+                continue
+            expires = _expires_seconds(session)
+            if expires > now:
+                heappush(self._expirations,
+                         (expires, next(self._sequence), session))
+                continue
+            self._evict(session)
+            self.expired_count += 1
+
+    def _used(self, session):
+        """
+        Mark the given session as the most recently used one.
+        """
+        if self._sessions_by_use.pop(id(session), None) is session:
+            self._sessions_by_use[id(session)] = session
         return session
 
     def _assert_tenant_matches(self, session, tenant_id):
@@ -138,6 +253,7 @@ class SessionStore(object):
         :return: a session for the given token.
         :rtype: Session
         """
+        self._evict_expired()
         if token in self._token_to_session:
             s = self._token_to_session[token]
             self._assert_tenant_matches(s, tenant_id)
@@ -145,7 +261,7 @@ class SessionStore(object):
             s = self._tenant_to_session[tenant_id]
         else:
             s = self._new_session(token=token, tenant_id=tenant_id)
-        return s
+        return self._used(s)
 
     def existing_session_for_token(self, token):
         """
@@ -159,8 +275,9 @@ class SessionStore(object):
 
         :raise: :obj:`KeyError` if no such thing exists.
         """
+        self._evict_expired()
         if token in self._token_to_session:
-            return self._token_to_session[token]
+            return self._used(self._token_to_session[token])
         raise KeyError(token)
 
     def session_for_api_key(self, username, api_key, tenant_id=None):
@@ -181,13 +298,14 @@ class SessionStore(object):
         """
         Create or return a :obj:`Session` based on a user's credentials.
         """
+        self._evict_expired()
         if username in self._username_to_token:
             s = self._token_to_session[self._username_to_token[username]]
             self._assert_tenant_matches(s, tenant_id)
-            return s
+            return self._used(s)
 
         if tenant_id and tenant_id in self._tenant_to_session:
-            return self._tenant_to_session[tenant_id]
+            return self._used(self._tenant_to_session[tenant_id])
 
         return self._new_session(username=username,
                                  tenant_id=tenant_id)
@@ -205,6 +323,7 @@ class SessionStore(object):
         session.expires = datetime.utcfromtimestamp(self.clock.seconds() + expires_in)
         session.impersonator_session_map[impersonated_token] = impersonator_session
         self._token_to_session[impersonated_token] = session
+        self._schedule_expiration(session)
         return session
 
     def session_for_tenant_id(self, tenant_id, token_id=None):
@@ -215,6 +334,7 @@ class SessionStore(object):
         :param unicode token_id: Sets token in the session to the token_id provided,
             else, creates one.
         """
+        self._evict_expired()
         if tenant_id not in self._tenant_to_session:
             return self._new_session(tenant_id=tenant_id, token=token_id)
-        return self._tenant_to_session[tenant_id]
+        return self._used(self._tenant_to_session[tenant_id])
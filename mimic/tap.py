@@ -8,7 +8,7 @@ from twisted.application.strports import service
 from twisted.application.service import MultiService
 from twisted.python import usage
 from mimic.core import MimicCore
-from mimic.resource import MimicRoot, get_site
+from mimic.resource import MimicRoot, RequestLog, get_site
 from twisted.internet.task import Clock
 
 
@@ -16,12 +16,21 @@ class Options(usage.Options):
     """
     Options for Mimic
     """
-    optParameters = [['listen', 'l', 'tcp:8900', 'The endpoint to listen on.']]
+    optParameters = [['listen', 'l', 'tcp:8900', 'The endpoint to listen on.'],
+                     ['max-sessions', None, None,
+                      'Forget the least recently used sessions once there '
+                      'are more than this many.', int],
+                     ['log-body-limit', None, 4096,
+                      'In verbose mode, log at most this many bytes of each '
+                      'request and response body.', int]]
     optFlags = [['realtime', 'r',
                  'Make mimic advance time as real time advances; '
                  'disable the "tick" endpoint.'],
                 ['verbose', 'v',
-                 'Log more verbosely: include full requests and responses.']]
+                 'Log more verbosely: include full requests and responses.'],
+                ['expire-sessions', None,
+                 'Forget sessions, and all the data that belongs to them, '
+                 'once their tokens expire.']]
 
 
 def makeService(config):
@@ -34,8 +43,14 @@ def makeService(config):
     else:
         clock = Clock()
     core = MimicCore.fromPlugins(clock)
-    root = MimicRoot(core, clock)
-    site = get_site(root.app.resource(), logging=bool(config['verbose']))
+    core.sessions.expire_sessions = bool(config['expire-sessions'])
+    core.sessions.max_sessions = config['max-sessions']
+    request_log = None
+    if config['verbose']:
+        request_log = RequestLog(max_body_bytes=config['log-body-limit'])
+    root = MimicRoot(core, clock, request_log)
+    site = get_site(root.app.resource(), logging=bool(config['verbose']),
+                    request_log=request_log)
 
     # The Twisted code currently (v16.6.0, 17.1.0) compares the type of
     # this argument to 'str' in order to determine how to handle it.
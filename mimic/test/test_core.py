@@ -1,5 +1,6 @@
 from __future__ import absolute_import, division, unicode_literals
 
+import json
 import sys
 import uuid
 
@@ -11,6 +12,7 @@ from twisted.plugin import IPlugin
 from twisted.python.filepath import FilePath
 from twisted.web.resource import IResource
 
+from mimic.canned_responses.auth import get_token
 from mimic.core import (
     MimicCore,
     ServiceBadInterface,
@@ -23,6 +25,7 @@ from mimic.plugins import (nova_plugin, loadbalancer_plugin, swift_plugin,
                            queue_plugin, maas_plugin, rackconnect_v3_plugin,
                            glance_plugin, cloudfeeds_plugin, heat_plugin,
                            neutron_plugin, dns_plugin, cinder_plugin)
+from mimic.rest.nova_api import NovaApi
 from mimic.test.dummy import (
     exampleEndpointTemplate,
     make_example_internal_api,
@@ -318,6 +321,46 @@ class CoreApiBuildingTests(SynchronousTestCase):
             IResource.providedBy(resource)
         )
 
+    def test_service_with_region_cached(self):
+        """
+        The resource for an internal service is built once per region and
+        base URI, and reused on subsequent lookups until the core's resources
+        are invalidated.
+        """
+        iapi = make_example_internal_api(self)
+        core = MimicCore(Clock(), [iapi])
+        [service_id] = core._uuid_to_api_internal.keys()
+
+        first = core.service_with_region(u"ORD", service_id, u"http://a/")
+        self.assertIs(
+            first, core.service_with_region(u"ORD", service_id, u"http://a/"))
+        self.assertIsNot(
+            first, core.service_with_region(u"ORD", service_id, u"http://b/"))
+
+        core.invalidate_resources()
+        self.assertIsNot(
+            first, core.service_with_region(u"ORD", service_id, u"http://a/"))
+
+    def test_add_and_remove_api_invalidate_resources(self):
+        """
+        Adding or removing an API forgets all cached service resources.
+        """
+        iapi = make_example_internal_api(self)
+        core = MimicCore(Clock(), [iapi])
+        [service_id] = core._uuid_to_api_internal.keys()
+        first = core.service_with_region(u"ORD", service_id, u"http://a/")
+
+        eeapi = make_example_external_api(self, name=self.eeapi_name)
+        core.add_api(eeapi)
+        second = core.service_with_region(u"ORD", service_id, u"http://a/")
+        self.assertIsNot(first, second)
+
+        for template_id in [ept.id_key for ept in eeapi.list_templates()]:
+            eeapi.remove_template(template_id)
+        core.remove_external_api(eeapi.uuid_key)
+        self.assertIsNot(
+            second, core.service_with_region(u"ORD", service_id, u"http://a/"))
+
     def test_uri_for_service(self):
         """
         Validate that the URI returned by uri_for_service returns the
@@ -570,3 +613,102 @@ class CoreApiBuildingTests(SynchronousTestCase):
         self.assertTrue(found_internal)
         self.assertTrue(found_first_external)
         self.assertTrue(found_second_external)
+
+    def test_entries_for_tenant_internal_cached(self):
+        """
+        The entries of the internal APIs are built once for each tenant and
+        base URI, so their endpoint IDs are stable.  The entries of external
+        APIs are built each time, so changes to their endpoint templates show
+        up immediately.
+        """
+        eeapi = make_example_external_api(
+            self,
+            name=self.eeapi_name,
+            set_enabled=True
+        )
+        core = MimicCore(Clock(), [eeapi, NovaApi(["ORD", "DFW"])])
+        base_uri = "http://some/random/prefix"
+
+        def endpoint_ids(tenant_id, base_uri=base_uri):
+            prefix_map = {}
+            entries = list(core.entries_for_tenant(tenant_id, prefix_map,
+                                                   base_uri))
+            self.assertEqual(
+                set(endpoint for entry in entries
+                    for endpoint in entry.endpoints),
+                set(prefix_map))
+            return {entry.name: [endpoint.endpoint_id
+                                 for endpoint in entry.endpoints]
+                    for entry in entries}
+
+        first = endpoint_ids('some-tenant')
+        self.assertEqual(2, len(first["cloudServersOpenStack"]))
+        self.assertEqual(first, endpoint_ids('some-tenant'))
+        self.assertNotEqual(first["cloudServersOpenStack"],
+                            endpoint_ids('other-tenant')["cloudServersOpenStack"])
+        self.assertNotEqual(
+            first["cloudServersOpenStack"],
+            endpoint_ids('some-tenant', "http://other/")["cloudServersOpenStack"])
+
+        for template in eeapi.list_templates():
+            template.enabled_key = False
+        self.assertEqual([], endpoint_ids('some-tenant')[eeapi.name_key])
+        self.assertEqual(first["cloudServersOpenStack"],
+                         endpoint_ids('some-tenant')["cloudServersOpenStack"])
+
+    def test_add_api_invalidates_catalog(self):
+        """
+        Adding an API forgets the cached catalog entries, so the new API's
+        entries show up.
+        """
+        core = MimicCore(Clock(), [make_example_internal_api(self)])
+        self.assertEqual(1, len(list(core.entries_for_tenant(
+            'some-tenant', {}, "http://some/random/prefix"))))
+        core.add_api(NovaApi(["ORD"]))
+        self.assertEqual(2, len(list(core.entries_for_tenant(
+            'some-tenant', {}, "http://some/random/prefix"))))
+
+    def test_catalog_cache_is_bounded(self):
+        """
+        Only the catalogs of the most recent ``catalog_cache_size`` tenants are
+        cached.
+        """
+        core = MimicCore(Clock(), [NovaApi(["ORD"])])
+        core.catalog_cache_size = 2
+
+        def endpoint_id(tenant_id):
+            [entry] = core.entries_for_tenant(tenant_id, {}, "http://prefix/")
+            return entry.endpoints[0].endpoint_id
+
+        first = endpoint_id('tenant-1')
+        endpoint_id('tenant-2')
+        endpoint_id('tenant-3')
+        self.assertEqual(2, len(core._catalog_cache))
+        self.assertNotEqual(first, endpoint_id('tenant-1'))
+
+    def test_catalog_json(self):
+        """
+        :obj:`MimicCore.catalog_json` encodes the service catalog, with the
+        external APIs first, the way
+        :obj:`mimic.canned_responses.auth.get_token` formats it.
+        """
+        eeapi = make_example_external_api(
+            self,
+            name=self.eeapi_name,
+            set_enabled=True
+        )
+        core = MimicCore(Clock(), [eeapi, NovaApi(["ORD"])])
+        base_uri = "http://some/random/prefix"
+        prefix_map = {}
+        expected = get_token(
+            'some-tenant',
+            entry_generator=lambda tenant_id: list(
+                core.entries_for_tenant(tenant_id, prefix_map, base_uri)),
+            prefix_for_endpoint=prefix_map.get)["access"]["serviceCatalog"]
+
+        self.assertEqual(expected,
+                         json.loads(core.catalog_json('some-tenant', base_uri)))
+        self.assertEqual(expected,
+                         json.loads(core.catalog_json('some-tenant', base_uri)))
+        self.assertEqual(
+            "[]", MimicCore(Clock(), []).catalog_json('some-tenant', base_uri))
@@ -7,8 +7,19 @@ from __future__ import absolute_import, division, unicode_literals
 import json
 import treq
 
+from copy import deepcopy
+
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 from mimic.canned_responses.loadbalancer import load_balancer_example
+from mimic.model.clb_objects import (
+    CLB,
+    FEED_EVENTS_LIMIT,
+    GlobalCLBCollections,
+    Node,
+    RegionalCLBCollection,
+    node_feed_xml
+)
 from mimic.model.clb_errors import (
     considered_immutable_error,
     invalid_json_schema,
@@ -19,7 +30,7 @@ from mimic.model.clb_errors import (
 from mimic.test.fixtures import APIMockHelper, TenantAuthentication
 from mimic.rest.loadbalancer_api import LoadBalancerApi, LoadBalancerControlApi
 from mimic.test.helpers import json_request, request_with_content, request
-from mimic.util.helper import EMPTY_RESPONSE
+from mimic.util.helper import EMPTY_RESPONSE, seconds_to_timestamp
 import attr
 
 
@@ -1413,6 +1424,52 @@ class LoadbalancerNodeAPITests(SynchronousTestCase):
              '<itemNotFound xmlns="http://docs.openstack.org/loadbalancers/api/v1.0" code="404">'
              '<message>Load balancer not found</message></itemNotFound>'))
 
+    def test_get_feed_pages(self):
+        """
+        Given a ``limit``, the feed of a node only has that many entries, and
+        links to the next page with a ``marker``, until the last page.
+        """
+        for weight in (2, 3):
+            resp, body = _update_clb_node(
+                self, self.helper, self.lb_id, self.node[0]["id"],
+                json.dumps({"node": {"weight": weight}}).encode("utf-8"),
+                request_func=request_with_content)
+            self.assertEqual(resp.code, 202)
+        feed_url = "{0}/loadbalancers/{1}/nodes/{2}.atom".format(
+            self.uri, self.lb_id, self.node[0]["id"])
+        entry = ("<entry><summary>Node successfully updated with address: "
+                 "'127.0.0.1', port: '80', weight: '{0}', condition: 'ENABLED'"
+                 "</summary><updated>1970-01-01T00:00:00.000000Z</updated></entry>")
+
+        d = request(self, self.root, b"GET", feed_url + "?limit=2")
+        feed_response = self.successResultOf(d)
+        self.assertEqual(feed_response.code, 200)
+        feed = self.successResultOf(treq.content(feed_response)).decode("utf-8")
+        next_link = '<link rel="next" href="{0}?marker=2&amp;limit=2"/>'.format(feed_url)
+        self.assertTrue(feed.startswith(
+            '<feed xmlns="http://www.w3.org/2005/Atom">' + next_link +
+            "<entry><summary>Node successfully created"))
+        self.assertTrue(feed.endswith(entry.format(2) + "</feed>"))
+
+        d = request(self, self.root, b"GET", feed_url + "?marker=2&limit=2")
+        feed_response = self.successResultOf(d)
+        self.assertEqual(
+            self.successResultOf(treq.content(feed_response)).decode("utf-8"),
+            '<feed xmlns="http://www.w3.org/2005/Atom">' + entry.format(3) + "</feed>")
+
+    def test_get_feed_invalid_limit(self):
+        """
+        Getting the feed of a node with a ``limit`` or ``marker`` that is not
+        a number, or a ``limit`` out of range, returns 400.
+        """
+        feed_url = "{0}/loadbalancers/{1}/nodes/{2}.atom".format(
+            self.uri, self.lb_id, self.node[0]["id"])
+        for query in ("?limit=0", "?limit=-1", "?limit=1001", "?limit=x",
+                      "?marker=x"):
+            d = request(self, self.root, b"GET", feed_url + query)
+            feed_response = self.successResultOf(d)
+            self.assertEqual(feed_response.code, 400)
+
 
 class LoadbalancerAPINegativeTests(SynchronousTestCase):
     """
@@ -1694,3 +1751,271 @@ class LoadbalancerAPINegativeTests(SynchronousTestCase):
 
         self.assertEqual((body, resp.code),
                          considered_immutable_error("PENDING-UPDATE", lb_id))
+
+
+class LargeLoadBalancerTests(SynchronousTestCase):
+    """
+    Tests for the node indexes of :obj:`RegionalCLBCollection`, with load
+    balancers big enough that scanning their nodes for every node added,
+    found or deleted would be too slow to run.
+    """
+
+    def setUp(self):
+        """
+        Create a collection that allows 10,000 nodes per load balancer, and
+        a load balancer with that many nodes.
+        """
+        self.collection = RegionalCLBCollection(Clock(), node_limit=10000)
+        self.collection.batch_delete_limit = 10000
+        self.collection.add_load_balancer(
+            {"name": "big", "protocol": "HTTP", "virtualIps": [{"type": "PUBLIC"}]},
+            "1")
+        self.nodes = [
+            {"address": "10.0.{0}.{1}".format(n // 250, n % 250), "port": 80}
+            for n in range(10000)]
+        body, code = self.collection.add_node(self.nodes, "1")
+        self.assertEqual(202, code)
+        self.node_ids = [node["id"] for node in body["nodes"]]
+
+    def test_unique_ids(self):
+        """
+        Every node gets a different ID, which it can be found by.
+        """
+        self.assertEqual(10000, len(set(self.node_ids)))
+        for node_id in self.node_ids:
+            body, code = self.collection.get_node("1", node_id)
+            self.assertEqual((200, node_id), (code, body["node"]["id"]))
+
+    def test_duplicate_address(self):
+        """
+        A node with the same address and port as any existing node is
+        rejected.
+        """
+        body, code = self.collection.add_node(
+            [{"address": "10.0.39.249", "port": 80}], "1")
+        self.assertEqual(413, code)
+
+    def test_bulk_delete(self):
+        """
+        Deleting half the nodes at once leaves the other half, in order, and
+        their addresses can be used again.
+        """
+        body, code = self.collection.delete_nodes("1", self.node_ids[::2])
+        self.assertEqual(202, code)
+        body, code = self.collection.list_nodes("1")
+        self.assertEqual(self.node_ids[1::2],
+                         [node["id"] for node in body["nodes"]])
+        self.assertEqual(404,
+                         self.collection.get_node("1", self.node_ids[0])[1])
+        body, code = self.collection.add_node(self.nodes[::2], "1")
+        self.assertEqual(202, code)
+        self.assertEqual(
+            413, self.collection.add_node(self.nodes[:1], "1")[1])
+
+
+class CLBNodeIndexTests(SynchronousTestCase):
+    """
+    Tests for the node indexes of :obj:`CLB`.
+    """
+
+    def setUp(self):
+        """
+        Create a load balancer with two nodes that were given the same ID.
+        """
+        self.nodes = [Node(address="10.0.0.1", port=80, id=1),
+                      Node(address="10.0.0.2", port=80, id=1)]
+        self.clb = CLB({}, nodes=self.nodes)
+
+    def test_new_nodes_renumbered(self):
+        """
+        Nodes the load balancer is created with, or which are added to it,
+        are given new IDs if theirs are already taken.
+        """
+        self.assertEqual(1, self.nodes[0].id)
+        self.assertNotEqual(1, self.nodes[1].id)
+        added = Node(address="10.0.0.3", port=80, id=1)
+        self.clb.add_nodes([added])
+        self.assertNotIn(added.id, [1, self.nodes[1].id])
+        self.assertIs(added, self.clb.node_by_id(added.id))
+
+    def test_reindex_nodes(self):
+        """
+        After the list of nodes is replaced by one of the same length,
+        :obj:`CLB.reindex_nodes` indexes the new nodes under their own IDs.
+        """
+        replacements = [Node(address="10.0.1.1", port=80, id=5),
+                        Node(address="10.0.1.2", port=80, id=6)]
+        self.clb.nodes = replacements
+        self.clb.reindex_nodes()
+        self.assertEqual([5, 6], [node.id for node in replacements])
+        self.assertIs(replacements[0], self.clb.node_by_id(5))
+        self.assertIs(replacements[1],
+                      self.clb.node_by_address("10.0.1.2", 80))
+        self.assertIs(None, self.clb.node_by_id(1))
+        self.assertIs(None, self.clb.node_by_address("10.0.0.1", 80))
+
+
+class NodeFeedTests(SynchronousTestCase):
+    """
+    Tests for the feed of events kept by a :obj:`Node`.
+    """
+
+    def setUp(self):
+        """
+        Create a node with more events than its feed keeps.
+        """
+        self.node = Node(address="127.0.0.1", port=80)
+        for n in range(FEED_EVENTS_LIMIT + 5):
+            self.node.add_feed_event("event {0}".format(n), "t")
+
+    def test_oldest_events_forgotten(self):
+        """
+        Only the most recent :obj:`FEED_EVENTS_LIMIT` events are kept.
+        """
+        events, next_marker = self.node.feed_page(limit=FEED_EVENTS_LIMIT)
+        self.assertEqual(FEED_EVENTS_LIMIT, len(events))
+        self.assertEqual((6, "event 5", "t"), events[0])
+        self.assertIs(None, next_marker)
+
+    def test_pages_oldest_first(self):
+        """
+        Without a marker, the first page starts with the oldest event kept,
+        and following the next markers reaches the newest event last.
+        """
+        events, next_marker = self.node.feed_page()
+        self.assertEqual(list(range(6, 106)),
+                         [marker for marker, _, _ in events])
+        while next_marker is not None:
+            events, next_marker = self.node.feed_page(next_marker)
+        self.assertEqual((FEED_EVENTS_LIMIT + 5, "event {0}".format(
+            FEED_EVENTS_LIMIT + 4), "t"), events[-1])
+
+    def test_marker_before_oldest_event(self):
+        """
+        A page after a marker for an event that has been forgotten starts
+        with the oldest event kept.
+        """
+        events, next_marker = self.node.feed_page(marker=3, limit=2)
+        self.assertEqual([6, 7], [marker for marker, _, _ in events])
+        self.assertEqual(7, next_marker)
+
+    def test_last_page(self):
+        """
+        A page after the marker for the latest event is empty.
+        """
+        self.assertEqual(([], None),
+                         self.node.feed_page(marker=FEED_EVENTS_LIMIT + 5))
+
+    def test_xml_escaped(self):
+        """
+        Summaries and links are escaped in the feed's XML.
+        """
+        self.assertEqual(
+            '<feed xmlns="http://www.w3.org/2005/Atom">'
+            '<link rel="next" href="/feed?a=1&amp;b=&lt;"/>'
+            '<entry><summary>a &lt;b&gt; &amp; c</summary>'
+            '<updated>t</updated></entry></feed>',
+            "".join(node_feed_xml([(1, "a <b> & c", "t")], "/feed?a=1&b=<")))
+
+
+class LoadBalancerTransitionTests(SynchronousTestCase):
+    """
+    Tests for the status transitions of load balancers in a
+    :obj:`RegionalCLBCollection`, which are scheduled with its clock.
+    """
+
+    def setUp(self):
+        """
+        Create a collection with a load balancer that stays in each status
+        for 5 seconds.
+        """
+        self.clock = Clock()
+        self.collection = RegionalCLBCollection(self.clock)
+        self.collection.add_load_balancer(
+            {"name": "lb", "protocol": "HTTP", "virtualIps": [{"type": "PUBLIC"}],
+             "metadata": [{"key": key, "value": 5}
+                          for key in ("lb_building", "lb_pending_delete")]},
+            "1")
+
+    def status(self):
+        """
+        Get the status of the load balancer.
+        """
+        return self.collection.get_load_balancers("1")[0]["loadBalancer"]["status"]
+
+    def test_transitions_without_reads(self):
+        """
+        A load balancer goes from BUILD to ACTIVE, and from PENDING-DELETE to
+        DELETED and then away, as the clock advances, without being read.
+        """
+        self.assertEqual("BUILD", self.status())
+        self.clock.advance(5)
+        self.assertEqual("ACTIVE", self.collection.lbs["1"]["status"])
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+        self.collection.del_load_balancer("1")
+        self.clock.advance(5)
+        self.assertEqual("DELETED", self.collection.lbs["1"]["status"])
+        self.clock.advance(self.collection.deleted_retention)
+        self.assertNotIn("1", self.collection.lbs)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_reads_do_not_delay_transitions(self):
+        """
+        Reading a load balancer does not change when its transition is due.
+        """
+        for _ in range(4):
+            self.clock.advance(1)
+            self.assertEqual("BUILD", self.status())
+        self.clock.advance(1)
+        self.assertEqual("ACTIVE", self.status())
+        self.assertEqual(
+            seconds_to_timestamp(5),
+            self.collection.lbs["1"]["updated"]["time"])
+
+    def test_set_status_cancels_transition(self):
+        """
+        Setting the status of a load balancer through the control API
+        cancels the transition it was waiting for.
+        """
+        self.collection.set_attributes("1", {"status": "ERROR"})
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.clock.advance(5)
+        self.assertEqual("ERROR", self.status())
+
+    def test_removed_load_balancer_cancels_transition(self):
+        """
+        Deleting an ACTIVE load balancer with no PENDING-DELETE status
+        removes it along with any transition it was waiting for.
+        """
+        self.collection.meta["1"].pop("lb_pending_delete")
+        self.collection.set_attributes("1", {"status": "ACTIVE"})
+        self.collection.del_load_balancer("1")
+        self.assertNotIn("1", self.collection.lbs)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_copies_resume_transitions(self):
+        """
+        A copy of the collection, such as one restored from a snapshot, has
+        no transitions scheduled until :obj:`resume_transitions` is called,
+        which carries out the overdue ones and schedules the others.
+        """
+        collections = GlobalCLBCollections(self.clock)
+        collections.regional_collections["ORD"] = self.collection
+        self.clock.advance(2)
+        copied = deepcopy(collections, {id(self.clock): self.clock})
+        self.clock.advance(4)
+        self.assertEqual("ACTIVE", self.collection.lbs["1"]["status"])
+        self.assertEqual("BUILD", copied.regional_collections["ORD"]
+                         .lbs["1"]["status"])
+
+        copied = deepcopy(copied, {id(self.clock): self.clock})
+        regional = copied.collection_for_region("ORD")
+        self.assertEqual("ACTIVE", regional.lbs["1"]["status"])
+
+        regional.del_load_balancer("1")
+        copied = deepcopy(copied, {id(self.clock): self.clock})
+        regional = copied.collection_for_region("ORD")
+        self.assertEqual(2, len(self.clock.getDelayedCalls()))
+        self.clock.advance(5)
+        self.assertEqual("DELETED", regional.lbs["1"]["status"])
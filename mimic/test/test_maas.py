@@ -1,11 +1,16 @@
 from __future__ import absolute_import, division, unicode_literals
 
 from six import text_type
+import gc
+import attr
 import json
 import treq
+import weakref
 from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
-from mimic.model.maas_objects import Metric, CheckType
+from mimic.model.maas_objects import (
+    ALARM_STATE_HISTORY_LIMIT, AlarmState, AuditLog, CheckType, MaasStore, Metric,
+    MetricSeries)
 from mimic.rest.maas_api import MaasApi, MaasControlApi
 from mimic.test.helpers import json_request, request
 from mimic.test.fixtures import APIMockHelper
@@ -42,6 +47,193 @@ class MaasObjectsTests(SynchronousTestCase):
         with self.assertRaises(NameError):
             check_type.get_metric_by_name('not_that_metric')
 
+    def test_get_values_reproducible(self):
+        """
+        :obj:`Metric.get_values` gets a value for each timestamp, which are
+        the same every time for the same metric, keys and timestamp, whatever
+        window it is requested in, but different for other keys.
+        """
+        metric = Metric(name='m', type='n', unit='percent',
+                        override_key=lambda **kw: (kw['entity_id'], kw['check_id']))
+        timestamps = list(range(0, 10000, 10))
+        values = metric.get_values(timestamps, entity_id='en', check_id='ch')
+        self.assertEqual(1000, len(values))
+        self.assertTrue(all(0 <= value <= 100 for value in values))
+        self.assertEqual(values, metric.get_values(timestamps, entity_id='en', check_id='ch'))
+        self.assertNotEqual(values, metric.get_values(timestamps, entity_id='en2',
+                                                      check_id='ch'))
+        self.assertEqual(values[500:600], metric.get_values(
+            timestamps[500:600], entity_id='en', check_id='ch'))
+        self.assertEqual(values[999:], metric.get_values(
+            timestamps[999:] + [10000], entity_id='en', check_id='ch')[:1])
+
+        metric.set_override(entity_id='en', check_id='ch', override_fn=lambda t: t * 2)
+        self.assertEqual([t * 2 for t in timestamps],
+                         metric.get_values(timestamps, entity_id='en', check_id='ch'))
+
+    def test_audit_log_bounded(self):
+        """
+        An :obj:`AuditLog` only keeps its most recent records, which can be
+        paged through in either direction from any of their IDs.
+        """
+        @attr.s
+        class Record(object):
+            id = attr.ib()
+
+        log = AuditLog(limit=5)
+        for n in range(8):
+            log.append(Record(id=text_type(n)))
+        self.assertEqual(5, len(log))
+
+        def page(*args):
+            records, next_marker = log.page(*args)
+            return [record.id for record in records], next_marker
+
+        self.assertEqual((['3', '4'], '5'), page(None, 2))
+        self.assertEqual((['5', '6', '7'], None), page('5', 10))
+        self.assertEqual((['3', '4'], '5'), page('1', 2))
+        self.assertEqual((['7', '6'], '5'), page(None, 2, True))
+        self.assertEqual((['4', '3'], None), page('4', 2, True))
+        self.assertEqual(([], '3'), page(None, 0))
+        self.assertRaises(ValueError, log.page, None, -1)
+
+    def test_metric_series_add(self):
+        """
+        Values added to a :obj:`MetricSeries` are kept in timestamp order, and
+        a value at the same timestamp as an earlier one replaces it.
+        """
+        series = MetricSeries()
+        series.add([(30, 3), (10, 1)])
+        series.add([(40, 4), (40, 5)])
+        series.add([(20, 2), (30, 6)])
+        self.assertEqual([10, 20, 30, 40], list(series.timestamps))
+        self.assertEqual([1, 2, 6, 5], list(series.values))
+        self.assertEqual((1, 3), series.window(15, 30))
+        self.assertRaises(ValueError, series.add, [(50, 'x')])
+        self.assertEqual(4, len(series))
+
+    def test_metric_series_downsample(self):
+        """
+        :obj:`MetricSeries.downsample` averages the values nearest each of the
+        timestamps spaced evenly from the start to the end, and leaves out
+        timestamps with no values near them.
+        """
+        series = MetricSeries()
+        series.add((timestamp, timestamp % 7) for timestamp in range(100000))
+        data = series.downsample(1000, 1900, 4)
+        self.assertEqual([1000, 1300, 1600, 1900],
+                         [point['timestamp'] for point in data])
+        self.assertEqual([150, 300, 300, 151],
+                         [point['numPoints'] for point in data])
+        self.assertEqual(
+            sum(timestamp % 7 for timestamp in range(1750, 1901)) / 151,
+            data[-1]['average'])
+        self.assertEqual([1000], [point['timestamp'] for point in
+                                  series.downsample(1000, 1900, 1)])
+        self.assertEqual([], series.downsample(200000, 300000, 10))
+
+    def test_metric_series_downsample_sparse(self):
+        """
+        :obj:`MetricSeries.downsample` leaves out the timestamps that have no
+        values near them.
+        """
+        series = MetricSeries()
+        series.add([(0, 1), (10, 3), (90, 5)])
+        self.assertEqual(
+            [{'numPoints': 2, 'timestamp': 0, 'average': 2},
+             {'numPoints': 1, 'timestamp': 100, 'average': 5}],
+            series.downsample(0, 100, 5))
+
+    def test_check_types_shared_until_overridden(self):
+        """
+        Every :obj:`MaasStore`, whatever its clock, shares the same check
+        types, until one of them overrides a check type, which only changes
+        that store's copy of it.
+        """
+        clock = Clock()
+        store, other_store = MaasStore(clock), MaasStore(Clock())
+        self.assertIs(store.check_types['remote.ping'],
+                      other_store.check_types['remote.ping'])
+        self.assertIs(store.host_info_types, other_store.host_info_types)
+
+        check_type = store.check_type_for_update('remote.ping')
+        self.assertIs(check_type, store.check_types['remote.ping'])
+        clock.advance(5)
+        self.assertEqual(5000, check_type.get_test_check_response(
+            entity_id='en')[1][0]['timestamp'])
+        check_type.test_check_available[('en', '__test_check')] = False
+        check_type.get_metric_by_name('average').set_override(
+            entity_id='en', check_id='ch', monitoring_zone='mzord',
+            override_fn=lambda t: 1)
+        metric_args = dict(entity_id='en', check_id='ch',
+                           monitoring_zone='mzord', timestamp=0)
+        self.assertEqual(1, store.check_types['remote.ping']
+                         .get_metric_by_name('average').get_value(**metric_args))
+        self.assertEqual({}, other_store.check_types['remote.ping'].test_check_available)
+        self.assertNotIn(metric_args['check_id'], [
+            key[1] for key in other_store.check_types['remote.ping']
+            .get_metric_by_name('average')._overrides])
+
+        store.clear_check_type_overrides('remote.ping')
+        self.assertIs(store.check_types['remote.ping'],
+                      other_store.check_types['remote.ping'])
+
+    def test_catalog_does_not_keep_clock_alive(self):
+        """
+        The check types shared by every :obj:`MaasStore` do not refer to any
+        store's clock, so a clock can be collected along with its stores,
+        even after a store has overridden a check type.
+        """
+        clock = Clock()
+        store = MaasStore(clock)
+        store.check_type_for_update('remote.ping')
+        clock_ref = weakref.ref(clock)
+        del clock, store
+        gc.collect()
+        self.assertIs(None, clock_ref())
+
+    def test_alarm_state_history_bounded(self):
+        """
+        A :obj:`MaasStore` only keeps the most recent alarm states, but
+        remembers the latest state of every alarm.
+        """
+        store = MaasStore(Clock())
+
+        def alarm_state(alarm_id, timestamp):
+            return AlarmState(alarm_id=alarm_id, alarm_label='', check_id='ch',
+                              entity_id='en', previous_state='OK', state='OK',
+                              status='', timestamp=timestamp)
+
+        store.add_alarm_state(alarm_state('al0', 0))
+        for timestamp in range(1, ALARM_STATE_HISTORY_LIMIT + 1):
+            store.add_alarm_state(alarm_state('al1', timestamp))
+
+        self.assertEqual(ALARM_STATE_HISTORY_LIMIT, len(store.alarm_states))
+        self.assertEqual(1, store.alarm_states[0].timestamp)
+        self.assertEqual(0, store.latest_alarm_state('en', 'al0').timestamp)
+        self.assertEqual(ALARM_STATE_HISTORY_LIMIT,
+                         store.latest_alarm_state('en', 'al1').timestamp)
+        self.assertIs(None, store.latest_alarm_state('en', 'al2'))
+        self.assertEqual(
+            [ALARM_STATE_HISTORY_LIMIT, 0],
+            sorted([state.timestamp for state in
+                    store.latest_alarm_states_for_entity('en')], reverse=True))
+        self.assertEqual(
+            [5, 6, 7],
+            [state.timestamp for state in store.alarm_states_between(5, 7)])
+        self.assertEqual([], store.alarm_states_between(0, 0))
+
+        for timestamp in range(ALARM_STATE_HISTORY_LIMIT + 1,
+                               2 * ALARM_STATE_HISTORY_LIMIT + 5):
+            store.add_alarm_state(alarm_state('al1', timestamp))
+        self.assertEqual(ALARM_STATE_HISTORY_LIMIT, len(store.alarm_states))
+        self.assertEqual(ALARM_STATE_HISTORY_LIMIT + 5,
+                         store.alarm_states[0].timestamp)
+        self.assertEqual(
+            [ALARM_STATE_HISTORY_LIMIT + 5, ALARM_STATE_HISTORY_LIMIT + 6],
+            [state.timestamp for state in store.alarm_states_between(
+                None, ALARM_STATE_HISTORY_LIMIT + 6)])
+
 
 def one_text_header(response, header_name):
     """
@@ -190,6 +382,7 @@ class MaasAPITests(SynchronousTestCase):
         """
         maas = MaasApi(["ORD"])
         helper = APIMockHelper(self, [maas, MaasControlApi(maas_api=maas)])
+        self.clock = helper.clock
         self.root = helper.root
         self.uri = helper.uri
         self.ctl_uri = helper.auth.get_service_endpoint("cloudMonitoringControl", "ORD")
@@ -299,6 +492,23 @@ class MaasAPITests(SynchronousTestCase):
         self.assertEquals(data['metadata']['count'], 2)
         self.assertEquals(data['values'][0]['app'], 'suppressions')
 
+        req = request(self, self.root, b"GET", self.uri +
+                      '/audits?reverse=true&marker=' + data['metadata']['next_marker'])
+        data = self.get_responsebody(self.successResultOf(req))
+        self.assertEquals(data['metadata']['count'], 4)
+        self.assertEquals(data['values'][-1]['app'], 'entities')
+
+    def test_list_audits_invalid_limit(self):
+        """
+        Listing the audit log with a negative or non-integer limit fails with
+        a 400.
+        """
+        for limit in ['-1', 'many']:
+            (resp, data) = self.successResultOf(json_request(
+                self, self.root, b"GET", self.uri + '/audits?limit=' + limit))
+            self.assertEquals(resp.code, 400)
+            self.assertEquals(data['type'], 'badRequest')
+
     def test_list_audits_marker_not_found(self):
         """
         If the marker is not found, the audit log returns results from the
@@ -1273,6 +1483,75 @@ class MaasAPITests(SynchronousTestCase):
         data = self.get_responsebody(resp)
         self.assertEquals(500, len(data['metrics'][0]['data']))
 
+        req = request(
+            self, self.root, b"POST",
+            self.uri + '/__experiments/multiplot' + qstring,
+            json.dumps({'metrics': metrics}).encode("utf-8")
+        )
+        self.assertEquals(data, self.get_responsebody(self.successResultOf(req)))
+
+    def test_multiplot_recorded_values(self):
+        """
+        Values recorded through the control API are returned by multiplot,
+        averaged over each of its points, instead of random data, until
+        they are cleared.
+        """
+        datapoints_uri = '{0}/entities/{1}/checks/{2}/metrics/average/datapoints'.format(
+            self.ctl_uri, self.entity_id, self.check_id)
+        resp = self.successResultOf(
+            request(self, self.root, b"POST", datapoints_uri,
+                    json.dumps({'monitoring_zones': ['mzord'],
+                                'datapoints': [[t, t // 10] for t in range(0, 100, 5)]}
+                               ).encode("utf-8")))
+        self.assertEquals(resp.code, 204)
+
+        multiplot_uri = '{0}/__experiments/multiplot?from=0&to=99&points=2'.format(self.uri)
+        multiplot_body = json.dumps({'metrics': [{'entity_id': self.entity_id,
+                                                  'check_id': self.check_id,
+                                                  'metric': 'mzord.average'}]}).encode("utf-8")
+        (resp, data) = self.successResultOf(
+            json_request(self, self.root, b"POST", multiplot_uri, multiplot_body))
+        self.assertEquals(resp.code, 200)
+        self.assertEquals(data['metrics'][0]['data'],
+                          [{'numPoints': 10, 'timestamp': 0, 'average': 2.0},
+                           {'numPoints': 10, 'timestamp': 99, 'average': 7.0}])
+
+        resp = self.successResultOf(
+            request(self, self.root, b"DELETE", datapoints_uri + '?monitoring_zone=mzord'))
+        self.assertEquals(resp.code, 204)
+        (resp, data) = self.successResultOf(
+            json_request(self, self.root, b"POST", multiplot_uri, multiplot_body))
+        self.assertEquals(2, len(data['metrics'][0]['data']))
+        self.assertEquals(4, data['metrics'][0]['data'][0]['numPoints'])
+
+    def test_record_invalid_values(self):
+        """
+        Recording values that are not numbers, or without any datapoints,
+        causes a 400 Bad Request response.
+        """
+        for body in ({'datapoints': [[1, 'x']]}, {}):
+            (resp, data) = self.successResultOf(
+                json_request(self, self.root, b"POST",
+                             '{0}/entities/{1}/checks/{2}/metrics/average/datapoints'.format(
+                                 self.ctl_uri, self.entity_id, self.check_id),
+                             json.dumps(body).encode("utf-8")))
+            self.assertEquals(resp.code, 400)
+            self.assertEquals(data['type'], 'badRequest')
+
+    def test_record_unknown_metric(self):
+        """
+        Recording or clearing values of a metric the check does not have
+        causes a 404 Not Found response.
+        """
+        uri = '{0}/entities/{1}/checks/{2}/metrics/nonexistent/datapoints'.format(
+            self.ctl_uri, self.entity_id, self.check_id)
+        for method, body in ((b"POST", {'datapoints': [[1, 2]]}), (b"DELETE", {})):
+            (resp, data) = self.successResultOf(
+                json_request(self, self.root, method, uri,
+                             json.dumps(body).encode("utf-8")))
+            self.assertEquals(resp.code, 404)
+            self.assertEquals(data['type'], 'notFoundError')
+
     def test_multiplot_agent_check(self):
         """
         get datapoints for graph resulting from an agent check rather than a
@@ -1831,6 +2110,38 @@ class MaasAPITests(SynchronousTestCase):
         self.assertEquals(should_be_critical['check_id'], self.check_id)
         self.assertEquals(should_be_critical['alarm_id'], self.alarm_id)
 
+    def test_change_log_time_window(self):
+        """
+        Only the alarm states with timestamps from ``from`` to ``to`` appear
+        on changelogs/alarms, with the time they were created.
+        """
+        for state in ('OK', 'WARNING', 'CRITICAL'):
+            self.clock.advance(10)
+            resp = self.successResultOf(
+                request(self, self.root, b"POST",
+                        '{0}/entities/{1}/alarms/{2}/states'.format(
+                            self.ctl_uri, self.entity_id, self.alarm_id),
+                        json.dumps({'state': state, 'status': state}).encode("utf-8")))
+            self.assertEquals(resp.code, 201)
+        (resp, data) = self.successResultOf(
+            json_request(self, self.root, b"GET",
+                         '{0}/changelogs/alarms?from=15000&to=30000'.format(self.uri)))
+        self.assertEquals(resp.code, 200)
+        self.assertEquals([(value['state'], value['timestamp']) for value in data['values']],
+                          [('WARNING', 20000), ('CRITICAL', 30000)])
+        self.assertEquals(data['values'][0]['previous_state'], 'OK')
+
+    def test_change_log_invalid_time_window(self):
+        """
+        A ``from`` or ``to`` that is not a number is rejected with a 400.
+        """
+        for query in ('?from=abc', '?to=abc'):
+            (resp, data) = self.successResultOf(
+                json_request(self, self.root, b"GET",
+                             '{0}/changelogs/alarms{1}'.format(self.uri, query)))
+            self.assertEquals(resp.code, 400)
+            self.assertEquals(data['type'], 'badRequest')
+
     def test_alarm_states_same_alarm_gets_previous_state(self):
         """
         When setting a new alarm state on the same entity and same alarm ID,
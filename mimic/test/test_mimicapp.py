@@ -0,0 +1,123 @@
+"""
+Tests for :obj:`mimic.rest.mimicapp`.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+from twisted.trial.unittest import SynchronousTestCase
+
+from mimic.rest.mimicapp import MimicApp
+from mimic.test.helpers import request_with_content
+
+
+class RoutedApp(object):
+    """
+    An app with routes whose first segments are both static and variable.
+    """
+    app = MimicApp()
+
+    @app.route("/servers", methods=["GET"])
+    def list_servers(self, request):
+        """
+        A static route.
+        """
+        return b"servers"
+
+    @app.route("/servers/<string:server_id>", methods=["GET"])
+    def get_server(self, request, server_id):
+        """
+        A static route with a variable second segment.
+        """
+        return "server " + server_id
+
+    @app.route("/<string:tenant_id>/servers/detail", methods=["GET"])
+    def tenant_servers(self, request, tenant_id):
+        """
+        A route with a variable first segment.
+        """
+        return "servers for " + tenant_id
+
+    @app.route("/", methods=["GET"])
+    def root(self, request):
+        """
+        The root route.
+        """
+        return b"root"
+
+
+class RouteDispatchTests(SynchronousTestCase):
+    """
+    Tests for dispatching requests with a
+    :obj:`mimic.rest.mimicapp.RouteDispatchMap`.
+    """
+    def get(self, path, method=b"GET", routed=None):
+        """
+        Make a request to a :obj:`RoutedApp`, and return the response code and
+        body.
+        """
+        resource = (routed or RoutedApp()).app.resource()
+        response, content = self.successResultOf(
+            request_with_content(self, resource, method, path))
+        return (response.code, content)
+
+    def test_static_and_variable_first_segments(self):
+        """
+        Paths are matched against both the routes that share their first
+        segment and the routes whose first segment is variable, in the same
+        order werkzeug would try them.
+        """
+        self.assertEqual((200, b"servers"), self.get("/servers"))
+        self.assertEqual((200, b"server abc"), self.get("/servers/abc/"))
+        self.assertEqual((200, b"server servers"),
+                         self.get("/servers/servers"))
+        self.assertEqual((200, b"servers for t1"),
+                         self.get("/t1/servers/detail"))
+        self.assertEqual((200, b"servers for servers"),
+                         self.get("/servers/servers/detail"))
+        self.assertEqual((200, b"root"), self.get("/"))
+
+    def test_not_found(self):
+        """
+        Paths that match no route, either because their first segment matches
+        nothing or because the rest of the path does not, are not found.
+        """
+        self.assertEqual(404, self.get("/nothing/here/at/all")[0])
+        self.assertEqual(404, self.get("/servers/abc/def")[0])
+
+    def test_adapter(self):
+        """
+        An adapter for the map matches paths against the candidate rules, and
+        builds URLs for the routes of any first segment.
+        """
+        adapter = RoutedApp.app.url_map.bind("localhost", path_info="/t1/servers/detail")
+        self.assertEqual(("tenant_servers", {"tenant_id": "t1"}), adapter.match())
+        self.assertEqual(("get_server", {"server_id": "abc"}),
+                         adapter.match("/servers/abc"))
+        self.assertEqual("/servers/abc", adapter.build("get_server", {"server_id": "abc"}))
+
+    def test_method_not_allowed(self):
+        """
+        Paths that only match routes for other methods are not allowed.
+        """
+        self.assertEqual(405, self.get("/servers", method=b"POST")[0])
+
+    def test_routes_added_after_dispatch(self):
+        """
+        Routes added after a request has been dispatched are matched by later
+        requests.
+        """
+        class MoreRoutes(object):
+            app = MimicApp()
+
+            @app.route("/first", methods=["GET"])
+            def first(self, request):
+                return b"first"
+
+        self.assertEqual((200, b"first"), self.get("/first", routed=MoreRoutes()))
+        self.assertEqual(404, self.get("/second", routed=MoreRoutes())[0])
+
+        @MoreRoutes.app.route("/second", methods=["GET"])
+        def second(self, request):
+            return b"second"
+
+        self.assertEqual((200, b"second"),
+                         self.get("/second", routed=MoreRoutes()))
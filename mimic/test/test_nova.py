@@ -3,6 +3,7 @@ Tests for :mod:`nova_api` and :mod:`nova_objects`.
 """
 from __future__ import absolute_import, division, unicode_literals
 
+import attr
 import json
 
 from six import text_type
@@ -13,6 +14,7 @@ from testtools.matchers import (
 
 import treq
 
+from twisted.internet.task import Clock
 from twisted.trial.unittest import SynchronousTestCase
 
 from mimic.canned_responses.nova import get_version_v2
@@ -2487,3 +2489,171 @@ class NovaServerTests(SynchronousTestCase):
                          [IPv4Address(address='10.180.1.1')])
         self.assertEqual(coll.servers[1].private_ips,
                          [IPv4Address(address='10.180.2.2')])
+
+
+class RegionalServerCollectionTests(SynchronousTestCase):
+    """
+    Tests for the server indexes kept by :obj:`RegionalServerCollection`.
+    """
+    def setUp(self):
+        """
+        Create an empty :obj:`RegionalServerCollection` with a fake clock.
+        """
+        self.clock = Clock()
+        self.coll = RegionalServerCollection(
+            tenant_id='abc123', region_name='ORD', clock=self.clock)
+        self.creation_json = {
+            'server': {'name': 'foo', 'flavorRef': 'bar', 'imageRef': 'baz'}}
+
+    def create(self):
+        """
+        Create a server in the collection.
+        """
+        return Server.from_creation_request_json(self.coll, self.creation_json)
+
+    def test_server_by_id(self):
+        """
+        :func:`RegionalServerCollection.server_by_id` finds servers by ID,
+        but not once they have been deleted.
+        """
+        servers = [self.create() for _ in range(3)]
+        for server in servers:
+            self.assertIs(server, self.coll.server_by_id(server.server_id))
+        servers[1].update_status(u"DELETED")
+        self.assertIsNone(self.coll.server_by_id(servers[1].server_id))
+        self.assertIsNone(self.coll.server_by_id("nope"))
+
+    def test_servers_modified_directly(self):
+        """
+        Servers a collection is created with are found by ID, and so are
+        servers put in :obj:`RegionalServerCollection.servers` directly, once
+        :obj:`RegionalServerCollection.reindex_servers` is called, even if
+        the list is the same length as before.
+        """
+        server = self.create()
+        other = RegionalServerCollection(
+            tenant_id='abc123', region_name='ORD', clock=self.clock,
+            servers=[server])
+        self.assertIs(server, other.server_by_id(server.server_id))
+
+        replacement = self.create()
+        other.servers[:] = [replacement]
+        other.reindex_servers()
+        self.assertIs(replacement, other.server_by_id(replacement.server_id))
+        self.assertIsNone(other.server_by_id(server.server_id))
+
+    def test_deleted_servers_compacted_after_retention(self):
+        """
+        Deleted servers are kept for ``deleted_retention`` seconds, and then
+        discarded from the collection.
+        """
+        self.coll.deleted_retention = 10
+        servers = [self.create() for _ in range(4)]
+        for server in servers[:3]:
+            server.update_status(u"DELETED")
+
+        self.clock.advance(5)
+        self.create()
+        self.assertEqual(5, len(self.coll.servers))
+
+        self.clock.advance(6)
+        survivor = self.create()
+        self.assertEqual([servers[3], self.coll.servers[1], survivor],
+                         self.coll.servers)
+        self.assertIs(servers[3], self.coll.server_by_id(servers[3].server_id))
+        self.assertIs(survivor, self.coll.server_by_id(survivor.server_id))
+
+    def test_no_compaction_without_retention(self):
+        """
+        If ``deleted_retention`` is ``None``, deleted servers are kept
+        forever.
+        """
+        self.coll.deleted_retention = None
+        server = self.create()
+        server.update_status(u"DELETED")
+        self.clock.advance(10 ** 9)
+        self.create()
+        self.assertEqual(2, len(self.coll.servers))
+        self.assertEqual(0, len(self.coll._tombstones))
+
+    def list_changed_since(self, since):
+        """
+        List the IDs of servers changed since the given number of seconds.
+        """
+        body = self.coll.request_list(
+            None, False, lambda url: url,
+            changes_since=seconds_to_timestamp(since))
+        return [server['id'] for server in json.loads(body)['servers']]
+
+    def test_changes_since_uses_update_times(self):
+        """
+        Listing servers with ``changes-since`` returns, in creation order,
+        only servers whose status or metadata has changed since the given
+        time, each once regardless of how many times it has changed.
+        """
+        servers = [self.create() for _ in range(4)]
+        self.clock.advance(5)
+        servers[2].set_metadata_item("a", "b")
+        servers[2].update_status(u"ERROR")
+        servers[0].set_metadata({"c": "d"})
+        self.clock.advance(5)
+        servers[1].update_status(u"DELETED")
+
+        self.assertEqual([servers[0].server_id, servers[1].server_id,
+                          servers[2].server_id],
+                         self.list_changed_since(5))
+        self.assertEqual([servers[1].server_id], self.list_changed_since(6))
+        self.assertEqual([], self.list_changed_since(11))
+
+    def test_update_time_index_stays_bounded(self):
+        """
+        Repeated updates to the same servers do not grow the update-time
+        index beyond twice the number of servers.
+        """
+        servers = [self.create() for _ in range(3)]
+        for i in range(20):
+            self.clock.advance(1)
+            servers[i % 3].set_metadata_item("i", text_type(i))
+        self.assertTrue(len(self.coll._update_times) <= 6)
+        self.assertEqual([servers[0].server_id, servers[1].server_id],
+                         self.list_changed_since(19))
+
+    def test_serialized_json_cache_not_compared(self):
+        """
+        Servers with the same state stay equal after one of them has cached
+        its serialization.
+        """
+        server = self.create()
+        other = Server(**{field.name.lstrip("_"): getattr(server, field.name)
+                          for field in attr.fields(Server)
+                          if field.name != "_json_cache"})
+        self.assertEqual(server, other)
+        server.serialized_json(True, lambda suffix: "http://mimic/" + suffix)
+        self.assertEqual(server, other)
+
+    def test_serialized_json_cached_until_changed(self):
+        """
+        :func:`Server.serialized_json` reuses its serialization until state
+        that appears in the JSON changes, whether through a setter or by
+        direct assignment.
+        """
+        server = self.create()
+
+        def url(suffix):
+            return "http://mimic/" + suffix
+
+        detail = server.serialized_json(True, url)
+        self.assertEqual(server.detail_json(url), json.loads(detail))
+        self.assertIs(detail, server.serialized_json(True, url))
+        self.assertEqual(server.brief_json(url),
+                         json.loads(server.serialized_json(False, url)))
+
+        server.set_metadata_item("a", "b")
+        self.assertEqual({"a": "b"},
+                         json.loads(server.serialized_json(True, url))
+                         ["metadata"])
+
+        server.flavor_ref = "other-flavor"
+        self.assertEqual("other-flavor",
+                         json.loads(server.serialized_json(True, url))
+                         ["flavor"]["id"])
@@ -4,12 +4,14 @@ import json
 import treq
 
 from twisted.trial.unittest import SynchronousTestCase
+from twisted.internet.defer import CancelledError
 from twisted.internet.task import Clock
+from twisted.web.test.requesthelper import DummyRequest
 
 from mimic.core import MimicCore
 from mimic.resource import MimicRoot
 from mimic.test.helpers import json_request, request
-from mimic.rest.queue_api import QueueApi
+from mimic.rest.queue_api import QueueApi, QueueApiRoutes
 
 
 class QueueAPITests(SynchronousTestCase):
@@ -24,7 +26,8 @@ class QueueAPITests(SynchronousTestCase):
         and create a queue
         """
         self.clock = Clock()
-        self.core = MimicCore(self.clock, [QueueApi()])
+        self.api = QueueApi()
+        self.core = MimicCore(self.clock, [self.api])
         self.root = MimicRoot(self.core).app.resource()
         self.response = request(
             self, self.root, b"POST", "/identity/v2.0/tokens",
@@ -165,3 +168,281 @@ class QueueAPITests(SynchronousTestCase):
                                                 self.uri, self.queue_name),
                                             headers={b'Client-ID': [b'client-2']}))
         self.assertEquals(resp.code, 204)
+
+    def post_messages(self, count, client_id=b'client-1', ttl=60):
+        """
+        Post ``count`` messages to the queue, whose bodies are numbered.
+
+        :return: the IDs of the messages.
+        """
+        (resp, data) = self.successResultOf(
+            json_request(self, self.root, b"POST",
+                         '{0}/queues/{1}/messages'.format(self.uri, self.queue_name),
+                         [{'ttl': ttl, 'body': {'n': n}} for n in range(count)],
+                         headers={b'Client-ID': [client_id]}))
+        self.assertEquals(resp.code, 201)
+        return [href.rsplit('/', 1)[1] for href in data['resources']]
+
+    def get_messages(self, query=''):
+        """
+        List messages in the queue as another client, with the given query
+        string.
+
+        :return: the response code and body.
+        """
+        resp = self.successResultOf(
+            request(self, self.root, b"GET",
+                    '{0}/queues/{1}/messages{2}'.format(self.uri, self.queue_name, query),
+                    headers={b'Client-ID': [b'client-2']}))
+        if resp.code != 200:
+            return resp.code, None
+        return resp.code, self.successResultOf(treq.json_content(resp))
+
+    def claim(self, query='', body=None):
+        """
+        Claim messages in the queue.
+
+        :return: the response, and its JSON body if it has one.
+        """
+        resp = self.successResultOf(
+            request(self, self.root, b"POST",
+                    '{0}/queues/{1}/claims{2}'.format(self.uri, self.queue_name, query),
+                    json.dumps(body or {'ttl': 30, 'grace': 30}).encode("utf-8")))
+        if resp.code != 201:
+            return resp, None
+        return resp, self.successResultOf(treq.json_content(resp))
+
+    def test_duplicate_queue(self):
+        """
+        Creating a queue that already exists returns 204, and the queue is
+        only listed once.
+        """
+        resp = self.successResultOf(
+            request(self, self.root, b"PUT", self.uri + '/queues/' + self.queue_name))
+        self.assertEqual(resp.code, 204)
+        (resp, data) = self.successResultOf(
+            json_request(self, self.root, b"GET", self.uri + '/queues'))
+        self.assertEqual([self.queue_name], [q['name'] for q in data['queues']])
+
+    def test_list_messages_pages(self):
+        """
+        Messages are listed oldest first, ``limit`` at a time, and each page
+        links to the next one.
+        """
+        self.post_messages(25)
+        code, data = self.get_messages()
+        self.assertEqual(list(range(10)), [m['body']['n'] for m in data['messages']])
+        seen = []
+        query = '?limit=20'
+        while True:
+            code, data = self.get_messages(query)
+            if code == 204:
+                break
+            seen.extend(m['body']['n'] for m in data['messages'])
+            [link] = data['links']
+            self.assertEqual('next', link['rel'])
+            query = '?' + link['href'].split('?', 1)[1]
+        self.assertEqual(list(range(25)), seen)
+
+    def test_list_messages_after_deletes(self):
+        """
+        Deleting messages from the middle of the queue does not disturb
+        paging over the messages that remain.
+        """
+        ids = self.post_messages(20)
+        for start in range(2, 20, 4):
+            resp = self.successResultOf(request(
+                self, self.root, b"DELETE",
+                '{0}/queues/{1}/messages?ids={2}'.format(
+                    self.uri, self.queue_name, ','.join(ids[start:start + 3]))))
+            self.assertEqual(204, resp.code)
+        code, data = self.get_messages('?limit=3')
+        self.assertEqual([0, 1, 5], [m['body']['n'] for m in data['messages']])
+        [link] = data['links']
+        code, data = self.get_messages('?' + link['href'].split('?', 1)[1])
+        self.assertEqual([9, 13, 17], [m['body']['n'] for m in data['messages']])
+
+    def test_list_messages_invalid_limit(self):
+        """
+        A limit that is not a number from 1 to 20 is rejected with a 400.
+        """
+        for query in ['?limit=0', '?limit=21', '?limit=x', '?marker=x']:
+            self.assertEqual(400, self.get_messages(query)[0])
+
+    def test_expiry_keeps_order(self):
+        """
+        Messages expire independently of the order they were posted in.
+        """
+        self.post_messages(1, ttl=120)
+        self.post_messages(1, ttl=60)
+        self.clock.advance(61)
+        code, data = self.get_messages()
+        self.assertEqual([120], [m['ttl'] for m in data['messages']])
+        self.clock.advance(60)
+        self.assertEqual(204, self.get_messages()[0])
+
+    def test_claim_and_delete(self):
+        """
+        Claimed messages are hidden from listings and other claims, and can
+        only be deleted with their claim's ID.
+        """
+        ids = self.post_messages(3)
+        resp, claimed = self.claim('?limit=2')
+        self.assertEqual(201, resp.code)
+        [location] = resp.headers.getRawHeaders(b'location')
+        claim_id = location.decode("ascii").rsplit('/', 1)[1]
+        self.assertEqual([0, 1], [m['body']['n'] for m in claimed])
+        self.assertEqual(
+            '/v1/queues/{0}/messages/{1}?claim_id={2}'.format(
+                self.queue_name, ids[0], claim_id),
+            claimed[0]['href'])
+
+        code, data = self.get_messages()
+        self.assertEqual([2], [m['body']['n'] for m in data['messages']])
+        code, data = self.get_messages('?include_claimed=true')
+        self.assertEqual(3, len(data['messages']))
+        self.assertEqual([2], [m['body']['n'] for m in self.claim()[1]])
+        self.assertEqual(204, self.claim()[0].code)
+
+        message_uri = '{0}/queues/{1}/messages/{2}'.format(
+            self.uri, self.queue_name, ids[0])
+        resp = self.successResultOf(request(self, self.root, b"DELETE", message_uri))
+        self.assertEqual(403, resp.code)
+        resp = self.successResultOf(request(
+            self, self.root, b"DELETE", message_uri + '?claim_id=' + claim_id))
+        self.assertEqual(204, resp.code)
+
+        (resp, data) = self.successResultOf(json_request(
+            self, self.root, b"GET", self.uri + location.decode("ascii")[3:]))
+        self.assertEqual(200, resp.code)
+        self.assertEqual([1], [m['body']['n'] for m in data['messages']])
+
+    def test_claim_release_and_expiry(self):
+        """
+        Messages become visible again when their claim is released or
+        expires, and live at least until the claim's grace period is over.
+        """
+        self.post_messages(2, ttl=60)
+        resp, _ = self.claim('?limit=1', {'ttl': 100, 'grace': 50})
+        claim_uri = self.uri + resp.headers.getRawHeaders(b'location')[0].decode("ascii")[3:]
+
+        resp = self.successResultOf(request(self, self.root, b"DELETE", claim_uri))
+        self.assertEqual(204, resp.code)
+        self.assertEqual(2, len(self.get_messages()[1]['messages']))
+
+        resp, _ = self.claim('?limit=1', {'ttl': 100, 'grace': 50})
+        claim_uri = self.uri + resp.headers.getRawHeaders(b'location')[0].decode("ascii")[3:]
+        resp = self.successResultOf(request(
+            self, self.root, b"PATCH", claim_uri,
+            json.dumps({'ttl': 200, 'grace': 50}).encode("utf-8")))
+        self.assertEqual(204, resp.code)
+
+        self.clock.advance(150)
+        self.assertEqual(204, self.get_messages()[0])
+        self.assertEqual(1, len(self.get_messages('?include_claimed=true')[1]['messages']))
+        self.clock.advance(51)
+        self.assertEqual(404, self.successResultOf(
+            request(self, self.root, b"GET", claim_uri)).code)
+        self.assertEqual(1, len(self.get_messages()[1]['messages']))
+        self.clock.advance(50)
+        self.assertEqual(204, self.get_messages()[0])
+
+    def test_invalid_claim(self):
+        """
+        A claim without a valid ttl is rejected with a 400, and claiming
+        messages in a queue that does not exist returns 404.
+        """
+        for body in [{'grace': 10}, {'ttl': 'x'}, {'ttl': -1}, {'ttl': True},
+                     {'ttl': 30, 'grace': False}]:
+            self.assertEqual(400, self.claim(body=body)[0].code)
+        resp = self.successResultOf(
+            request(self, self.root, b"POST",
+                    '{0}/queues/does-not-exist/claims'.format(self.uri),
+                    json.dumps({'ttl': 30}).encode("utf-8")))
+        self.assertEqual(404, resp.code)
+
+    def test_claim_long_ttl(self):
+        """
+        A ttl too big for a machine integer, as JSON numbers can be, is
+        accepted.
+        """
+        self.post_messages(1)
+        resp, data = self.claim(body={'ttl': 2 ** 64, 'grace': 30})
+        self.assertEqual(201, resp.code)
+
+    def list_with_wait(self, wait):
+        """
+        Call the route that lists messages directly, as client-2, since the
+        in-memory agent cannot wait for a response.
+
+        :return: the request, and the route's result.
+        """
+        uri_prefix = self.uri.rsplit('v1/', 1)[0]
+        routes = QueueApiRoutes(self.api, "ORD", self.core.sessions, uri_prefix)
+        dummy = DummyRequest([b""])
+        dummy.args = {b'wait': [wait]}
+        dummy.requestHeaders.setRawHeaders(b'client-id', [b'client-2'])
+        tenant_id = self.json_body['access']['token']['tenant']['id']
+        return dummy, routes.list_messages_for_queue(dummy, tenant_id, self.queue_name)
+
+    def test_wait_for_messages(self):
+        """
+        Listing messages with ``wait`` holds the response until a message
+        another client can see is posted.
+        """
+        dummy, d = self.list_with_wait(b'30')
+        self.assertNoResult(d)
+        self.post_messages(1, client_id=b'client-2')
+        self.assertNoResult(d)
+        self.clock.advance(10)
+        self.post_messages(1)
+        data = json.loads(self.successResultOf(d))
+        self.assertEqual(200, dummy.responseCode)
+        self.assertEqual([{'n': 0}], [m['body'] for m in data['messages']])
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_wait_times_out(self):
+        """
+        Listing messages with ``wait`` returns 204 once that many seconds
+        have passed without any messages being posted, and ``wait`` must be
+        a number of seconds up to a minute.
+        """
+        dummy, d = self.list_with_wait(b'5')
+        self.clock.advance(4)
+        self.assertNoResult(d)
+        self.clock.advance(1)
+        self.assertEqual('null', self.successResultOf(d))
+        self.assertEqual(204, dummy.responseCode)
+        for query in ['?wait=-1', '?wait=61', '?wait=x']:
+            self.assertEqual(400, self.get_messages(query)[0])
+
+    def test_wait_cancelled(self):
+        """
+        When a waiting request goes away, it stops waiting.
+        """
+        dummy, d = self.list_with_wait(b'5')
+        d.cancel()
+        self.failureResultOf(d, CancelledError)
+        self.assertEqual([], self.clock.getDelayedCalls())
+        self.post_messages(1)
+
+    def test_bulk_get_and_delete(self):
+        """
+        Messages can be got and deleted by listing their IDs in ``ids``,
+        ignoring IDs of messages that do not exist.
+        """
+        ids = self.post_messages(3)
+        query = '?ids={0},{1},missing'.format(ids[2], ids[0])
+        code, data = self.get_messages(query)
+        self.assertEqual(200, code)
+        self.assertEqual([2, 0], [m['body']['n'] for m in data])
+
+        resp = self.successResultOf(request(
+            self, self.root, b"DELETE",
+            '{0}/queues/{1}/messages{2}'.format(self.uri, self.queue_name, query)))
+        self.assertEqual(204, resp.code)
+        code, data = self.get_messages()
+        self.assertEqual([1], [m['body']['n'] for m in data['messages']])
+        self.assertEqual(204, self.get_messages(query)[0])
+        self.assertEqual(400, self.get_messages(
+            '?ids=' + ','.join(str(n) for n in range(21)))[0])
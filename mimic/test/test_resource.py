@@ -22,8 +22,10 @@ except ImportError:
 
 from mimic.canned_responses.mimic_presets import get_presets
 from mimic.core import MimicCore
-from mimic.resource import MimicRoot, get_site
+from mimic.resource import MimicRoot, RequestLog, get_site
+from mimic.rest.nova_api import NovaApi
 from mimic.test.dummy import make_example_internal_api
+from mimic.test.fixtures import APIMockHelper
 from mimic.test import helpers
 
 json_request = helpers.json_request
@@ -139,6 +141,53 @@ class ServiceResourceTests(SynchronousTestCase):
         self.assertEqual(200, response.code)
         self.assertEqual(b'response!', content)
 
+    def test_service_resource_is_reused_across_requests(self):
+        """
+        The plugin's resource is only built once for repeated requests to the
+        same service, region and base URI.
+        """
+        example = make_example_internal_api(self, b'response!')
+        calls = []
+        original = example.resource_for_region
+
+        def counting_resource_for_region(*args):
+            calls.append(args)
+            return original(*args)
+
+        example.resource_for_region = counting_resource_for_region
+        core = MimicCore(Clock(), [example])
+        root = MimicRoot(core).app.resource()
+        (region, service_id) = one_api(self, core)
+
+        for _ in range(3):
+            response = self.successResultOf(request(
+                self, root, b"GET",
+                "http://mybase/mimicking/{0}/{1}".format(service_id, region)
+            ))
+            self.assertEqual(200, response.code)
+        self.assertEqual(1, len(calls))
+
+    def test_invalidate_resources(self):
+        """
+        :func:`MimicRoot.invalidate_resources` forgets both the root's own
+        cached resources and the per-service resources cached by the core.
+        """
+        example = make_example_internal_api(self)
+        core = MimicCore(Clock(), [example])
+        mimic_root = MimicRoot(core)
+        (region, service_id) = one_api(self, core)
+
+        identity = mimic_root._cached_resource("identity", object)
+        self.assertIs(identity,
+                      mimic_root._cached_resource("identity", object))
+        service = core.service_with_region(region, service_id, "http://a/")
+
+        mimic_root.invalidate_resources()
+        self.assertIsNot(identity,
+                         mimic_root._cached_resource("identity", object))
+        self.assertIsNot(
+            service, core.service_with_region(region, service_id, "http://a/"))
+
 
 class RootAndPresetTests(SynchronousTestCase):
     """
@@ -235,21 +284,34 @@ class RequestTests(SynchronousTestCase):
     Tests for :obj:`mimic.resource.MimicRequest` and
     :obj:`mimic.resource.MimicRequest`, and :obj:`mimic.resource.get_site`.
     """
-    def make_request_to_site(self):
+    def make_request_to_site(self, request_log=None, response=b'response!',
+                             body=b""):
         """
         Make a request and return the response.
         """
-        core = MimicCore(Clock(), [make_example_internal_api(self, b'response!')])
-        root = MimicRoot(core).app.resource()
+        core = MimicCore(Clock(), [make_example_internal_api(self, response)])
+        root = MimicRoot(core, request_log=request_log).app.resource()
 
         # get the region and service id registered for the example API
         (region, service_id) = one_api(self, core)
         url = "/mimicking/{0}/{1}".format(service_id, region)
         response = self.successResultOf(request(
-            self, root, b"GET", url, headers={b"one": [b"two"]}
+            self, root, b"GET", url, headers={b"one": [b"two"]}, body=body
         ))
         return (response, url)
 
+    def log_requests(self, **kwargs):
+        """
+        Turn on verbose logging for requests made by :obj:`helpers.request`,
+        to a :obj:`RequestLog` that is written out when the returned clock is
+        advanced.
+        """
+        clock = Clock()
+        request_log = RequestLog(clock, **kwargs)
+        self.patch(helpers, 'get_site',
+                   partial(get_site, logging=True, request_log=request_log))
+        return clock, request_log
+
     def test_default_content_type(self):
         """
         The default content type of all Mimic responses is application/json.
@@ -263,12 +325,14 @@ class RequestTests(SynchronousTestCase):
         If verbose logging is turned on, the full request and response is
         logged.
         """
-        self.patch(helpers, 'get_site', partial(get_site, logging=True))
+        clock, _ = self.log_requests()
         logged_events = []
         addObserver(logged_events.append)
         self.addCleanup(removeObserver, logged_events.append)
 
         response, url = self.make_request_to_site()
+        self.assertEqual([], logged_events)
+        clock.advance(0)
 
         self.assertEqual(2, len(logged_events))
         self.assertTrue(all([not event['isError'] for event in logged_events]))
@@ -292,3 +356,194 @@ class RequestTests(SynchronousTestCase):
         self.assertEqual(url, response_match.group('url'))
         headers = json.loads(response_match.group('headers'))
         self.assertEqual(['application/json'], headers.get('Content-Type'))
+
+    def test_verbose_logging_non_ascii(self):
+        """
+        Request and response bodies that are not ASCII are formatted into the
+        log messages.
+        """
+        clock, _ = self.log_requests()
+        logged_events = []
+        addObserver(logged_events.append)
+        self.addCleanup(removeObserver, logged_events.append)
+
+        self.make_request_to_site(body="r\u00e9quest".encode("utf-8"),
+                                  response="r\u00e9sponse".encode("utf-8"))
+        clock.advance(0)
+
+        messages = [get_log_message(event) for event in logged_events]
+        self.assertIn("\nr\u00e9quest\n", messages[0])
+        self.assertIn("\nr\u00e9sponse\n", messages[1])
+
+    def test_verbose_logging_truncates_bodies(self):
+        """
+        Only the first ``max_body_bytes`` of the request and response bodies
+        are kept by the :obj:`RequestLog`.
+        """
+        _, request_log = self.log_requests(max_body_bytes=4)
+        self.make_request_to_site(body=b"request body")
+        [entry] = request_log.recent()
+        self.assertEqual(
+            (b"requ", True, b"resp", True),
+            (entry.request_body.content, entry.request_body.truncated,
+             entry.response_body.content, entry.response_body.truncated))
+        self.assertEqual("resp... (truncated)",
+                         entry.json()["response"]["body"])
+
+    def test_request_log_is_bounded(self):
+        """
+        The :obj:`RequestLog` only remembers the most recent ``max_entries``
+        requests, and all of the queued requests are written to the log in a
+        single batch.
+        """
+        clock, request_log = self.log_requests(max_entries=2)
+        logged_events = []
+        addObserver(logged_events.append)
+        self.addCleanup(removeObserver, logged_events.append)
+
+        for response in [b'one', b'two', b'three']:
+            self.make_request_to_site(response=response)
+        self.assertEqual(1, len(clock.getDelayedCalls()))
+        self.assertEqual(
+            [b'two', b'three'],
+            [entry.response_body.content for entry in request_log.recent()])
+        self.assertEqual(
+            [b'three'],
+            [entry.response_body.content
+             for entry in request_log.recent(limit=1)])
+
+        clock.advance(0)
+        self.assertEqual(6, len(logged_events))
+        self.assertEqual([], clock.getDelayedCalls())
+
+    def test_recent_requests(self):
+        """
+        ``GET /mimic/v1.1/requests`` lists the most recent requests and
+        responses recorded by the :obj:`RequestLog`.
+        """
+        _, request_log = self.log_requests()
+        _, url = self.make_request_to_site(request_log=request_log)
+        root = MimicRoot(MimicCore(Clock(), []),
+                         request_log=request_log).app.resource()
+        response, content = self.successResultOf(json_request(
+            self, root, b"GET", "/mimic/v1.1/requests?limit=1"))
+        self.assertEqual(200, response.code)
+        [entry] = content["requests"]
+        self.assertEqual(
+            ("GET", url, 200, "response!"),
+            (entry["method"], entry["url"], entry["response"]["code"],
+             entry["response"]["body"]))
+        self.assertEqual(["two"], entry["request"]["headers"]["One"])
+
+    def test_recent_requests_invalid_limit(self):
+        """
+        ``GET /mimic/v1.1/requests`` responds with a 400 if ``limit`` is not
+        a non-negative integer.
+        """
+        _, request_log = self.log_requests()
+        root = MimicRoot(MimicCore(Clock(), []),
+                         request_log=request_log).app.resource()
+        for query in ("?limit=abc", "?limit=-1"):
+            response, content = self.successResultOf(json_request(
+                self, root, b"GET", "/mimic/v1.1/requests" + query))
+            self.assertEqual(400, response.code)
+            self.assertEqual(400, content["badRequest"]["code"])
+
+    def test_recent_requests_not_logged(self):
+        """
+        ``GET /mimic/v1.1/requests`` responds with a 404 if requests are not
+        being logged.
+        """
+        root = MimicRoot(MimicCore(Clock(), [])).app.resource()
+        response = self.successResultOf(request(
+            self, root, b"GET", "/mimic/v1.1/requests"))
+        self.assertEqual(404, response.code)
+
+
+class SnapshotTests(SynchronousTestCase):
+    """
+    Tests for ``/mimic/v1.1/snapshot`` and ``/mimic/v1.1/restore``, handled by
+    :func:`MimicRoot.take_snapshot` and :func:`MimicRoot.restore_snapshot`.
+    """
+    def setUp(self):
+        """
+        Create a Nova server to be captured in snapshots.
+        """
+        self.helper = APIMockHelper(self, [NovaApi(["ORD"])])
+        self.root = self.helper.root
+        (response, body) = self.successResultOf(json_request(
+            self, self.root, b"POST", self.helper.uri + '/servers',
+            {"server": {"name": "snapshotted", "imageRef": "image",
+                        "flavorRef": "flavor"}}))
+        self.assertEqual(202, response.code)
+        self.server_uri = "{0}/servers/{1}".format(
+            self.helper.uri, body["server"]["id"])
+
+    def get_server_code(self):
+        """
+        Get the response code for a GET of the server.
+        """
+        return self.successResultOf(
+            request(self, self.root, b"GET", self.server_uri)).code
+
+    def test_restore_snapshot(self):
+        """
+        Restoring a snapshot brings back the state at the time it was taken,
+        and the same snapshot can be restored more than once.
+        """
+        self.assertEqual(200, self.get_server_code())
+        (response, body) = self.successResultOf(json_request(
+            self, self.root, b"POST", "/mimic/v1.1/snapshot",
+            {"name": "warm"}))
+        self.assertEqual(201, response.code)
+        self.assertEqual({"snapshot": "warm"}, body)
+
+        for _ in range(2):
+            self.successResultOf(
+                request(self, self.root, b"DELETE", self.server_uri))
+            self.assertEqual(404, self.get_server_code())
+
+            (response, body) = self.successResultOf(json_request(
+                self, self.root, b"POST", "/mimic/v1.1/restore",
+                {"name": "warm"}))
+            self.assertEqual(200, response.code)
+            self.assertEqual({"restored": "warm"}, body)
+            self.assertEqual(200, self.get_server_code())
+
+    def test_default_snapshot_name(self):
+        """
+        A snapshot taken without a request body is named ``"default"``, and
+        a restore without a request body restores it.
+        """
+        (response, body) = self.successResultOf(json_request(
+            self, self.root, b"POST", "/mimic/v1.1/snapshot"))
+        self.assertEqual({"snapshot": "default"}, body)
+        self.successResultOf(
+            request(self, self.root, b"DELETE", self.server_uri))
+
+        (response, body) = self.successResultOf(json_request(
+            self, self.root, b"POST", "/mimic/v1.1/restore"))
+        self.assertEqual(200, response.code)
+        self.assertEqual(200, self.get_server_code())
+
+    def test_restore_unknown_snapshot(self):
+        """
+        Restoring a snapshot that was never taken responds with a 404.
+        """
+        (response, body) = self.successResultOf(json_request(
+            self, self.root, b"POST", "/mimic/v1.1/restore",
+            {"name": "missing"}))
+        self.assertEqual(404, response.code)
+        self.assertEqual(404, body["itemNotFound"]["code"])
+
+    def test_invalid_snapshot_name(self):
+        """
+        Taking or restoring a snapshot with a body that is not a JSON object
+        with a string name responds with a 400.
+        """
+        for path in ("/mimic/v1.1/snapshot", "/mimic/v1.1/restore"):
+            for content in (b"{", b"[]", b'{"name": 5}'):
+                (response, body) = self.successResultOf(json_request(
+                    self, self.root, b"POST", path, content))
+                self.assertEqual(400, response.code)
+                self.assertEqual(400, body["badRequest"]["code"])
@@ -1,6 +1,7 @@
 from __future__ import absolute_import, division, unicode_literals
 
 import six
+from copy import deepcopy
 from datetime import datetime
 import re
 
@@ -274,3 +275,99 @@ class SessionCreationTests(SynchronousTestCase):
         session_by_username_password = sessions.session_for_username_password(
             "user1", "pass", "tenant1337")
         self.assertIs(session_by_token, session_by_username_password)
+
+
+class SessionEvictionTests(SynchronousTestCase):
+    """
+    Tests for evicting sessions from :class:`SessionStore`.
+    """
+
+    def assert_forgotten(self, sessions, session):
+        """
+        The given session can no longer be found by any of its keys.
+        """
+        self.assertRaises(KeyError, sessions.existing_session_for_token,
+                          session.token)
+        self.assertNotIn(session.user_id, sessions._userid_to_session)
+        self.assertIsNot(
+            session, sessions.session_for_tenant_id(session.tenant_id))
+        self.assertIsNot(
+            session,
+            sessions.session_for_username_password(session.username, "pw"))
+
+    def test_sessions_kept_by_default(self):
+        """
+        By default, sessions are kept after they expire.
+        """
+        clock = Clock()
+        sessions = SessionStore(clock)
+        session = sessions.session_for_username_password("user", "pw")
+        clock.advance(86400 * 7)
+        self.assertIs(session, sessions.session_for_token(session.token))
+        self.assertEqual(0, sessions.expired_count)
+
+    def test_expired_sessions_evicted(self):
+        """
+        If ``expire_sessions`` is set, a session is removed from every index
+        once the clock passes its expiration time.
+        """
+        clock = Clock()
+        sessions = SessionStore(clock, expire_sessions=True)
+        session = sessions.session_for_username_password("user", "pw")
+        clock.advance(86399)
+        self.assertIs(session, sessions.existing_session_for_token(
+            session.token))
+
+        clock.advance(1)
+        self.assert_forgotten(sessions, session)
+        self.assertEqual(1, sessions.expired_count)
+
+    def test_impersonation_extends_expiration(self):
+        """
+        A session whose expiration is extended by impersonation is only
+        evicted at its new expiration time, and then its impersonation
+        tokens are forgotten too.
+        """
+        clock = Clock()
+        sessions = SessionStore(clock, expire_sessions=True)
+        session = sessions.session_for_impersonation(
+            "pretender", 86400 * 2, impersonated_token="imp")
+        clock.advance(86400 * 2 - 1)
+        self.assertIs(session, sessions.existing_session_for_token("imp"))
+
+        clock.advance(1)
+        self.assertRaises(KeyError, sessions.existing_session_for_token, "imp")
+        self.assert_forgotten(sessions, session)
+
+    def test_least_recently_used_evicted(self):
+        """
+        If ``max_sessions`` is set, creating a session beyond that many
+        evicts the least recently used session.
+        """
+        sessions = SessionStore(Clock(), max_sessions=2)
+        a = sessions.session_for_username_password("a", "pw")
+        b = sessions.session_for_username_password("b", "pw")
+        sessions.session_for_token(a.token)
+        c = sessions.session_for_username_password("c", "pw")
+
+        self.assertEqual(1, sessions.capacity_evicted_count)
+        self.assertIs(a, sessions.existing_session_for_token(a.token))
+        self.assertIs(c, sessions.existing_session_for_token(c.token))
+        self.assert_forgotten(sessions, b)
+
+    def test_deepcopy_keeps_eviction_order(self):
+        """
+        A deep copy of a :class:`SessionStore` evicts its own copies of the
+        sessions in the same order as the original would.
+        """
+        clock = Clock()
+        sessions = SessionStore(clock, max_sessions=2)
+        a = sessions.session_for_username_password("a", "pw")
+        sessions.session_for_username_password("b", "pw")
+        sessions.session_for_token(a.token)
+
+        copied = deepcopy(sessions, {id(clock): clock})
+        copied.session_for_username_password("c", "pw")
+        self.assertIsNot(a, copied.existing_session_for_token(a.token))
+        self.assertEqual(["c", "a"], [session.username for session in
+                                      copied._sessions_by_use.values()])
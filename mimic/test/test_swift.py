@@ -1,19 +1,31 @@
 from __future__ import absolute_import, division, unicode_literals
 
+import os
+
+from copy import deepcopy
+from hashlib import md5
+from io import BytesIO
 from json import loads, dumps
 
 import ddt
 
 from twisted.trial.unittest import SynchronousTestCase
 from twisted.internet.task import Clock
+from twisted.web.http_headers import Headers
+from twisted.web.iweb import UNKNOWN_LENGTH
 
 import treq
 
+from mimic.model.swift_objects import InlineData, ObjectStore, SpilledData
 from mimic.rest.swift_api import SwiftMock
 from mimic.resource import MimicRoot
 from mimic.core import MimicCore
-from mimic.rest.swift_api import normal_tenant_id_to_crazy_mosso_id
-from mimic.test.helpers import request
+from mimic.rest.swift_api import (
+    normal_tenant_id_to_crazy_mosso_id, parse_ranges
+)
+from mimic.test.helpers import (
+    RequestTraversalAgent, SynchronousProducer, request
+)
 
 
 class SwiftTestBase(SynchronousTestCase):
@@ -21,11 +33,11 @@ class SwiftTestBase(SynchronousTestCase):
     Common functionality for testing the Swift API.
     """
 
-    def createSwiftService(self, rackspace_flavor=True):
+    def createSwiftService(self, rackspace_flavor=True, object_store=None):
         """
         Set up to create the requests
         """
-        self.swift_mock = SwiftMock(rackspace_flavor)
+        self.swift_mock = SwiftMock(rackspace_flavor, object_store)
         self.core = MimicCore(Clock(), [self.swift_mock])
         self.root = MimicRoot(self.core).app.resource()
         self.response = request(
@@ -67,6 +79,7 @@ class SwiftTestBase(SynchronousTestCase):
         self.object_uri = self.uri + b"/" + self.object_path
         self.object_data = b'some bytes'
         self.object_size = len(self.object_data)
+        self.object_etag = md5(self.object_data).hexdigest().encode("ascii")
 
     def head_account(self, expected_result=204, with_body=True):
         """
@@ -510,6 +523,43 @@ class SwiftContainerTests(SwiftTestBase):
             "{0}".format(self.object_size).encode("utf-8")
         )
 
+    def list_names(self, query):
+        """
+        GET the container with a query string, and return the names (or
+        subdirs) listed.
+        """
+        _, contents = self.get_container(container_path=self.uri + query)
+        return [entry.get("name", entry.get("subdir")) for entry in contents]
+
+    def test_get_container_listing_queries(self):
+        """
+        Container listings are sorted by name and support the ``prefix``,
+        ``marker``, ``end_marker``, ``limit`` and ``delimiter`` queries.
+        """
+        self.put_container()
+        names = [b"b", b"a/2", b"c/1/x", b"a/1", b"c/2", b"d"]
+        for name in names:
+            self.put_object(object_path=self.uri + b"/" + name)
+
+        self.assertEqual(["a/1", "a/2", "b", "c/1/x", "c/2", "d"],
+                         self.list_names(b""))
+        self.assertEqual(["c/1/x", "c/2"], self.list_names(b"?prefix=c/"))
+        self.assertEqual(["b", "c/1/x"],
+                         self.list_names(b"?marker=a/2&limit=2"))
+        self.assertEqual(["a/2", "b"],
+                         self.list_names(b"?marker=a/1&end_marker=c"))
+        self.assertEqual(["a/", "b", "c/", "d"],
+                         self.list_names(b"?delimiter=/"))
+        self.assertEqual(["c/1/", "c/2"],
+                         self.list_names(b"?prefix=c/&delimiter=/"))
+        self.assertEqual(["a/", "b"],
+                         self.list_names(b"?delimiter=/&limit=2"))
+        self.get_container(container_path=self.uri + b"?limit=-1",
+                           expected_result=412, with_body=False)
+
+        self.delete_object(object_path=self.uri + b"/a/1")
+        self.assertEqual(["a/2", "b"], self.list_names(b"?limit=2"))
+
     def test_head_container(self):
         """
         HEAD a container.
@@ -691,7 +741,7 @@ class SwiftObjectTests(SwiftTestBase):
         property_values = {
             b"content-type": [b"application/test-value"],
             b"content-encoding": [b"ascii"],
-            b"etag": [b"etag_in_123456"],
+            b"etag": [self.object_etag],
             b"x-object-manifest": [b"{object/1}"],
             b"x-object-meta-name": [b"2bd4"]
         }
@@ -705,7 +755,6 @@ class SwiftObjectTests(SwiftTestBase):
         header_keys = (
             b"content-type",
             b"content-encoding",
-            b"etag",
             b"x-object-manifest",
             b"x-object-meta-name"
         )
@@ -713,8 +762,14 @@ class SwiftObjectTests(SwiftTestBase):
             self.assertEqual(
                 object_response.headers.getRawHeaders(header_key),
                 property_values[header_key])
+        # The object is a manifest, so its ETag is that of its (no) segments.
+        self.assertEqual(
+            object_response.headers.getRawHeaders(b"etag"),
+            [b'"' + md5(b"").hexdigest().encode("ascii") + b'"'])
 
-        self.assertEqual(object_content, self.object_data)
+        # The object is a manifest for segments in a container that does not
+        # exist, so its content is empty.
+        self.assertEqual(object_content, b"")
 
     def test_get_object_without_properties(self):
         """
@@ -733,13 +788,14 @@ class SwiftObjectTests(SwiftTestBase):
 
         header_keys = (
             b"content-encoding",
-            b"etag",
             b"x-object-manifest",
             b"x-object-meta-name"
         )
         for header_key in header_keys:
             self.assertIsNone(
                 object_response.headers.getRawHeaders(header_key))
+        self.assertEqual(object_response.headers.getRawHeaders(b"etag"),
+                         [self.object_etag])
 
         self.assertEqual(object_content, self.object_data)
 
@@ -841,6 +897,29 @@ class SwiftObjectTests(SwiftTestBase):
         object_response, object_body = self.get_object()
         self.assertEquals(object_body, new_data)
 
+    def test_replace_and_delete_object_counts(self):
+        """
+        Replacing and deleting objects keeps the object and byte counts of
+        the account and the container up to date.
+        """
+        self.put_object(body=b"12345")
+        self.put_object(object_path=self.uri + b"/other", body=b"123")
+        self.put_object(body=b"1234567")
+
+        def counts():
+            account, _ = self.head_account()
+            container, _ = self.head_container()
+            return [
+                account.headers.getRawHeaders(b"x-account-object-count"),
+                account.headers.getRawHeaders(b"x-account-bytes-used"),
+                container.headers.getRawHeaders(b"x-container-object-count"),
+                container.headers.getRawHeaders(b"x-container-bytes-used"),
+            ]
+
+        self.assertEqual([[b"2"], [b"10"], [b"2"], [b"10"]], counts())
+        self.delete_object(object_path=self.uri + b"/other")
+        self.assertEqual([[b"1"], [b"7"], [b"1"], [b"7"]], counts())
+
     def test_put_object_non_existent_container(self):
         """
         PUT object - attempt to put an object to a non-existent container.
@@ -858,7 +937,7 @@ class SwiftObjectTests(SwiftTestBase):
         property_values = {
             b"content-type": [b"application/test-value"],
             b"content-encoding": [b"ascii"],
-            b"etag": [b"etag_in_123456"],
+            b"etag": [self.object_etag],
             b"x-object-manifest": [b"{object/1}"],
             b"x-object-meta-name": [b"2bd4"]
         }
@@ -872,7 +951,6 @@ class SwiftObjectTests(SwiftTestBase):
         header_keys = (
             b"content-type",
             b"content-encoding",
-            b"etag",
             b"x-object-manifest",
             b"x-object-meta-name"
         )
@@ -880,6 +958,10 @@ class SwiftObjectTests(SwiftTestBase):
             self.assertEqual(
                 object_response.headers.getRawHeaders(header_key),
                 property_values[header_key])
+        # The object is a manifest, so its ETag is that of its (no) segments.
+        self.assertEqual(
+            object_response.headers.getRawHeaders(b"etag"),
+            [b'"' + md5(b"").hexdigest().encode("ascii") + b'"'])
 
     def test_put_object_without_properties(self):
         """
@@ -898,13 +980,14 @@ class SwiftObjectTests(SwiftTestBase):
 
         header_keys = (
             b"content-encoding",
-            b"etag",
             b"x-object-manifest",
             b"x-object-meta-name"
         )
         for header_key in header_keys:
             self.assertIsNone(
                 object_response.headers.getRawHeaders(header_key))
+        self.assertEqual(object_response.headers.getRawHeaders(b"etag"),
+                         [self.object_etag])
 
     def test_head_object(self):
         """
@@ -968,7 +1051,7 @@ class SwiftObjectTests(SwiftTestBase):
         property_values = {
             b"content-type": [b"application/test-value"],
             b"content-encoding": [b"ascii"],
-            b"etag": [b"etag_in_123456"],
+            b"etag": [self.object_etag],
             b"x-object-manifest": [b"{object/1}"],
             b"x-object-meta-name": [b"2bd4"]
         }
@@ -982,7 +1065,6 @@ class SwiftObjectTests(SwiftTestBase):
         header_keys = (
             b"content-type",
             b"content-encoding",
-            b"etag",
             b"x-object-manifest",
             b"x-object-meta-name"
         )
@@ -990,6 +1072,10 @@ class SwiftObjectTests(SwiftTestBase):
             self.assertEqual(
                 head_response.headers.getRawHeaders(header_key),
                 property_values[header_key])
+        # The object is a manifest, so its ETag is that of its (no) segments.
+        self.assertEqual(
+            head_response.headers.getRawHeaders(b"etag"),
+            [b'"' + md5(b"").hexdigest().encode("ascii") + b'"'])
 
         self.assertEqual(head_contents, b'')
 
@@ -1009,12 +1095,13 @@ class SwiftObjectTests(SwiftTestBase):
             [b"application/octet-stream"])
         non_existent_headers = (
             b"content-encoding",
-            b"etag",
             b"x-object-manifest",
             b"x-object-meta-name"
         )
         for header_key in non_existent_headers:
             self.assertIsNone(head_response.headers.getRawHeaders(header_key))
+        self.assertEqual(head_response.headers.getRawHeaders(b"etag"),
+                         [self.object_etag])
 
         self.assertEqual(head_contents, b'')
 
@@ -1076,3 +1163,465 @@ class SwiftObjectTests(SwiftTestBase):
         """
         # remove the object
         self.delete_object(expected_result=404)
+
+
+class ObjectStoreTests(SynchronousTestCase):
+    """
+    Tests for :obj:`mimic.model.swift_objects.ObjectStore`.
+    """
+    def setUp(self):
+        """
+        Create a store which keeps objects of up to 4 bytes in memory, up to
+        10 bytes in total.
+        """
+        self.directory = self.mktemp()
+        os.mkdir(self.directory)
+        self.store = ObjectStore(self.directory, inline_limit=4,
+                                 memory_budget=10)
+
+    def test_small_objects_inline(self):
+        """
+        Objects no larger than the inline limit are kept in memory, until
+        the memory budget runs out.
+        """
+        stored = [self.store.store(BytesIO(b"abcd")) for _ in range(3)]
+        self.assertEqual([InlineData, InlineData, SpilledData],
+                         [type(data) for data in stored])
+        self.assertEqual(8, self.store.inline_bytes)
+        self.assertEqual([b"abcd"] * 3, [data.read() for data in stored])
+
+        self.store.release(stored[0])
+        self.assertEqual(4, self.store.inline_bytes)
+        self.assertIsInstance(self.store.store(BytesIO(b"abcd")), InlineData)
+
+    def test_large_objects_spilled(self):
+        """
+        Objects larger than the inline limit are written to a file named
+        after their content, which is shared by objects with the same content
+        and removed when the last of them is released.
+        """
+        first = self.store.store(BytesIO(b"0123456789"))
+        second = self.store.store(BytesIO(b"0123456789"))
+        other = self.store.store(BytesIO(b"9876543210"))
+        self.assertIs(first, second)
+        self.assertEqual((10, b"0123456789"), (first.length, first.read()))
+        self.assertEqual(2, len(os.listdir(self.directory)))
+
+        self.store.release(first)
+        self.assertTrue(os.path.exists(first.path))
+        self.store.release(second)
+        self.assertFalse(os.path.exists(first.path))
+        self.assertEqual([os.path.basename(other.path)],
+                         os.listdir(self.directory))
+
+    def test_deepcopy_retains(self):
+        """
+        Copying stored content, as when Mimic's state is snapshotted, shares
+        the content and the store, and keeps the content until the copy is
+        released too.
+        """
+        data = self.store.store(BytesIO(b"0123456789"))
+        copied = deepcopy([self.store, data])
+        self.assertIs(self.store, copied[0])
+        self.assertIs(data, copied[1])
+        self.store.release(data)
+        self.assertEqual(b"0123456789", copied[1].read())
+        self.store.release(copied[1])
+        self.assertFalse(os.path.exists(data.path))
+
+    def test_deepcopy_inline_counted_once(self):
+        """
+        Copies of content kept in memory share it, so it only counts once
+        against the memory budget, until the last reference is released.
+        """
+        data = self.store.store(BytesIO(b"abcd"))
+        copies = [deepcopy(data) for _ in range(3)]
+        self.assertEqual(4, self.store.inline_bytes)
+        self.assertIsInstance(self.store.store(BytesIO(b"efgh")), InlineData)
+        for copied in copies:
+            self.store.release(copied)
+        self.assertEqual(8, self.store.inline_bytes)
+        self.store.release(data)
+        self.assertEqual(4, self.store.inline_bytes)
+
+
+class SwiftLargeObjectTests(SwiftTestBase):
+    """
+    Tests for objects whose contents are written to disk.
+    """
+    def createSwiftService(self, rackspace_flavor=True, object_store=None):
+        """
+        Use an object store which writes any object larger than 4 bytes to
+        disk.
+        """
+        self.directory = self.mktemp()
+        os.mkdir(self.directory)
+        super(SwiftLargeObjectTests, self).createSwiftService(
+            rackspace_flavor, ObjectStore(self.directory, inline_limit=4))
+
+    def setUp(self):
+        """
+        Create a container.
+        """
+        super(SwiftLargeObjectTests, self).setUp()
+        self.put_container()
+
+    def test_get_large_object(self):
+        """
+        A large object is streamed back with its full length.
+        """
+        body = b"x" * (200 * 1024 + 3)
+        self.put_object(body=body)
+        self.assertEqual(1, len(os.listdir(self.directory)))
+
+        object_response, object_content = self.get_object()
+        self.assertEqual(body, object_content)
+        self.assertEqual(len(body), object_response.length)
+
+        container_response, container_contents = self.get_container()
+        self.assertEqual(len(body), container_contents[0]["bytes"])
+
+    def test_replace_and_delete_large_object(self):
+        """
+        Replacing or deleting a large object removes its old contents from
+        disk.
+        """
+        self.put_object(body=b"first body")
+        self.put_object(body=b"second body")
+        self.assertEqual(1, len(os.listdir(self.directory)))
+        self.assertEqual(b"second body", self.get_object()[1])
+
+        self.delete_object()
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_replaced_snapshot_released(self):
+        """
+        Taking a snapshot under the name of an earlier one gives back the
+        contents held by the earlier one, so a large object deleted in
+        between is removed from disk.
+        """
+        self.put_object(body=b"snapshotted body")
+        for _ in range(2):
+            self.successResultOf(request(
+                self, self.root, b"POST", b"/mimic/v1.1/snapshot"))
+        self.delete_object()
+        self.assertEqual(1, len(os.listdir(self.directory)))
+
+        self.successResultOf(request(
+            self, self.root, b"POST", b"/mimic/v1.1/snapshot"))
+        self.assertEqual([], os.listdir(self.directory))
+
+
+class ParseRangesTests(SynchronousTestCase):
+    """
+    Tests for :obj:`mimic.rest.swift_api.parse_ranges`.
+    """
+    def test_ranges(self):
+        """
+        Ranges are given as the offset and length of each satisfiable range,
+        clamped to the length of the content.
+        """
+        self.assertEqual([(0, 4)], parse_ranges("bytes=0-3", 10))
+        self.assertEqual([(6, 4)], parse_ranges("bytes=6-", 10))
+        self.assertEqual([(7, 3)], parse_ranges("bytes=-3", 10))
+        self.assertEqual([(0, 10)], parse_ranges("bytes=-30", 10))
+        self.assertEqual([(8, 2)], parse_ranges("bytes=8-30", 10))
+        self.assertEqual([(0, 1), (5, 2)],
+                         parse_ranges("bytes=0-0, 5-6, 20-30", 10))
+
+    def test_unsatisfiable(self):
+        """
+        If no range can be satisfied, the result is empty.
+        """
+        self.assertEqual([], parse_ranges("bytes=10-20", 10))
+        self.assertEqual([], parse_ranges("bytes=-0", 10))
+
+    def test_invalid(self):
+        """
+        Headers which are not valid byte ranges are ignored.
+        """
+        for header in ["items=0-1", "bytes=1", "bytes=a-b", "bytes=5-2"]:
+            self.assertIs(None, parse_ranges(header, 10))
+
+
+class UnknownLengthProducer(SynchronousProducer):
+    """
+    A :obj:`SynchronousProducer` which does not tell the agent its length, so
+    that the body is uploaded with chunked transfer-encoding.
+    """
+    def __init__(self, body):
+        """
+        Produce the given body with an unknown length.
+        """
+        SynchronousProducer.__init__(self, body)
+        self.length = UNKNOWN_LENGTH
+
+
+class SwiftRangeAndManifestTests(SwiftTestBase):
+    """
+    Tests for ranged downloads, chunked uploads and manifest objects.
+    """
+    def setUp(self):
+        """
+        Create a container with an object in it.
+        """
+        super(SwiftRangeAndManifestTests, self).setUp()
+        self.put_container()
+        self.put_object(body=b"0123456789",
+                        headers={b"content-type": [b"text/plain"]})
+
+    def get_range(self, range_header, object_uri=None):
+        """
+        GET a range of an object.
+        """
+        response = self.successResultOf(request(
+            self, self.root, b"GET", object_uri or self.object_uri,
+            headers={b"range": [range_header]}))
+        return response, self.successResultOf(treq.content(response))
+
+    def test_single_range(self):
+        """
+        A single range is returned with a 206 response and a Content-Range
+        header.
+        """
+        response, content = self.get_range(b"bytes=2-5")
+        self.assertEqual((206, b"2345"), (response.code, content))
+        self.assertEqual([b"bytes 2-5/10"],
+                         response.headers.getRawHeaders(b"content-range"))
+        self.assertEqual(b"789", self.get_range(b"bytes=-3")[1])
+
+    def test_multiple_ranges(self):
+        """
+        Multiple ranges are returned as a multipart/byteranges response.
+        """
+        response, content = self.get_range(b"bytes=0-1,8-")
+        self.assertEqual(206, response.code)
+        [content_type] = response.headers.getRawHeaders(b"content-type")
+        prefix = b"multipart/byteranges; boundary="
+        self.assertTrue(content_type.startswith(prefix))
+        boundary = content_type[len(prefix):]
+        self.assertEqual(
+            b"--" + boundary + b"\r\n"
+            b"Content-Type: text/plain\r\n"
+            b"Content-Range: bytes 0-1/10\r\n\r\n"
+            b"01\r\n"
+            b"--" + boundary + b"\r\n"
+            b"Content-Type: text/plain\r\n"
+            b"Content-Range: bytes 8-9/10\r\n\r\n"
+            b"89\r\n"
+            b"--" + boundary + b"--\r\n",
+            content)
+
+    def test_unsatisfiable_and_invalid_ranges(self):
+        """
+        A range beyond the end of the object gets a 416 response, and an
+        invalid range header is ignored.
+        """
+        response, _ = self.get_range(b"bytes=10-")
+        self.assertEqual(416, response.code)
+        self.assertEqual([b"bytes */10"],
+                         response.headers.getRawHeaders(b"content-range"))
+        self.assertEqual(b"0123456789", self.get_range(b"bytes=5-2")[1])
+
+    def test_chunked_upload(self):
+        """
+        An object can be uploaded with chunked transfer-encoding.
+        """
+        response = self.successResultOf(
+            RequestTraversalAgent(self, self.root).request(
+                b"PUT", self.object_uri, Headers({}),
+                UnknownLengthProducer(b"chunked body")))
+        self.assertEqual(201, response.code)
+        self.assertEqual(b"chunked body", self.get_object()[1])
+
+    def test_dynamic_large_object(self):
+        """
+        The content of an object with an X-Object-Manifest header is the
+        concatenation of the objects in the given container whose names start
+        with the given prefix, in order of their names, and ranges can span
+        those segments.
+        """
+        for name, body in [(b"seg/2", b"cd"), (b"seg/1", b"ab"),
+                           (b"seg/3", b"ef"), (b"other", b"xx")]:
+            self.put_object(object_path=self.uri + b"/" + name, body=body)
+        manifest_uri = self.uri + b"/manifest"
+        self.put_object(object_path=manifest_uri, body=b"",
+                        headers={b"x-object-manifest": [b"testcontainer/seg/"]})
+
+        response, content = self.get_object(object_path=manifest_uri)
+        self.assertEqual(b"abcdef", content)
+        self.assertEqual(6, response.length)
+        self.assertEqual(b"bcde",
+                         self.get_range(b"bytes=1-4", manifest_uri)[1])
+
+    def test_static_large_object(self):
+        """
+        An object uploaded with ``multipart-manifest=put`` is the
+        concatenation of the segments listed in its manifest, in the order
+        they are listed, and the manifest itself can be retrieved with
+        ``multipart-manifest=get``.
+        """
+        for name, body in [(b"seg1", b"ab"), (b"seg2", b"cd")]:
+            self.put_object(object_path=self.uri + b"/" + name, body=body)
+        manifest_uri = self.uri + b"/manifest"
+        self.put_object(
+            object_path=manifest_uri + b"?multipart-manifest=put",
+            body=dumps([{"path": "/testcontainer/seg2", "size_bytes": 2},
+                        {"path": "testcontainer/seg1"}]).encode("utf-8"))
+
+        self.assertEqual(b"cdab", self.get_object(object_path=manifest_uri)[1])
+        self.assertEqual(b"da", self.get_range(b"bytes=1-2", manifest_uri)[1])
+        self.assertEqual(
+            [{"name": "/testcontainer/seg2"}, {"name": "/testcontainer/seg1"}],
+            loads(self.get_object(
+                object_path=manifest_uri + b"?multipart-manifest=get")[1]
+                .decode("utf-8")))
+
+        self.delete_object(object_path=self.uri + b"/seg1")
+        self.get_object(object_path=manifest_uri, expected_result=409)
+
+    def test_static_large_object_invalid_manifest(self):
+        """
+        A static large object manifest which lists a missing segment, a
+        segment of the wrong size, or a segment whose path is not a string, is
+        rejected.
+        """
+        manifest_uri = self.uri + b"/manifest?multipart-manifest=put"
+        for manifest in [[{"path": "/testcontainer/missing"}],
+                         [{"path": 5}],
+                         [{"path": ["/testcontainer/testobject"]}],
+                         [{"path": "/testcontainer/testobject",
+                           "size_bytes": 3}],
+                         {"not": "a list"}]:
+            self.put_object(object_path=manifest_uri, expected_result=400,
+                            body=dumps(manifest).encode("utf-8"))
+
+
+class SwiftConditionalRequestTests(SwiftTestBase):
+    """
+    Tests for ETags, last-modified times and conditional requests.
+    """
+    def setUp(self):
+        """
+        Create a container with an object in it, uploaded 100 seconds after
+        the epoch.
+        """
+        super(SwiftConditionalRequestTests, self).setUp()
+        self.put_container()
+        self.core.sessions.clock.advance(100)
+        self.put_object()
+
+    def conditional(self, method, headers):
+        """
+        Make a conditional request for the object.
+
+        :return: the response code and body.
+        """
+        response = self.successResultOf(request(
+            self, self.root, method, self.object_uri, headers=headers))
+        return (response.code, self.successResultOf(treq.content(response)))
+
+    def test_etag_and_last_modified(self):
+        """
+        Objects have the MD5 digest of their content as their ETag, which is
+        also returned when they are uploaded, and the time they were uploaded
+        as their last-modified time.
+        """
+        response = self.successResultOf(request(
+            self, self.root, b"PUT", self.object_uri, body=self.object_data,
+            headers={b"etag": [b'"' + self.object_etag + b'"']}))
+        self.assertEqual(201, response.code)
+        self.assertEqual([self.object_etag],
+                         response.headers.getRawHeaders(b"etag"))
+        response, _ = self.head_object()
+        self.assertEqual([b"Thu, 01 Jan 1970 00:01:40 GMT"],
+                         response.headers.getRawHeaders(b"last-modified"))
+
+    def test_etag_mismatch(self):
+        """
+        An upload whose ETag header does not match the MD5 digest of its
+        content is rejected, and does not replace the existing object.
+        """
+        self.put_object(body=b"other bytes", expected_result=422,
+                        headers={b"etag": [self.object_etag]})
+        self.assertEqual(self.object_data, self.get_object()[1])
+
+    def test_large_object_etag(self):
+        """
+        The ETag of an object too large to keep in memory is computed while
+        it is written out.
+        """
+        body = b"x" * (self.swift_mock.object_store.inline_limit + 1)
+        self.put_object(
+            body=body, headers={b"etag": [md5(body).hexdigest().encode(
+                "ascii")]})
+        self.assertEqual(body, self.get_object()[1])
+
+    def test_if_match(self):
+        """
+        A request with an If-Match header that lists none of the object's
+        ETag or ``*`` fails with a 412.
+        """
+        for method in [b"GET", b"HEAD"]:
+            self.assertEqual(
+                (412, b""),
+                self.conditional(method, {b"if-match": [b'"abc", W/"def"']}))
+        self.assertEqual(
+            (200, self.object_data),
+            self.conditional(b"GET", {b"if-match": [b'"abc", ' +
+                                                    self.object_etag]}))
+        self.assertEqual(200, self.conditional(
+            b"GET", {b"if-match": [b"*"]})[0])
+
+    def test_if_none_match(self):
+        """
+        A request with an If-None-Match header that lists the object's ETag
+        or ``*`` gets a 304 without the object's content.
+        """
+        for value in [b'W/"' + self.object_etag + b'"', b"*"]:
+            for method in [b"GET", b"HEAD"]:
+                self.assertEqual(
+                    (304, b""),
+                    self.conditional(method, {b"if-none-match": [value]}))
+        self.assertEqual(
+            (200, self.object_data),
+            self.conditional(b"GET", {b"if-none-match": [b'"abc"']}))
+
+    def test_if_modified_since(self):
+        """
+        A request with an If-Modified-Since header at or after the object's
+        last-modified time gets a 304, and an invalid date is ignored.
+        """
+        self.assertEqual((304, b""), self.conditional(
+            b"GET",
+            {b"if-modified-since": [b"Thu, 01 Jan 1970 00:01:40 GMT"]}))
+        self.assertEqual((200, self.object_data), self.conditional(
+            b"GET",
+            {b"if-modified-since": [b"Thu, 01 Jan 1970 00:01:39 GMT"]}))
+        self.assertEqual((200, self.object_data), self.conditional(
+            b"GET", {b"if-modified-since": [b"yesterday"]}))
+        self.assertEqual(200, self.conditional(b"GET", {
+            b"if-modified-since": [b"Thu, 01 Jan 1970 00:01:40 GMT"],
+            b"if-none-match": [b'"abc"']})[0])
+
+    def test_if_unmodified_since(self):
+        """
+        A request with an If-Unmodified-Since header before the object's
+        last-modified time fails with a 412.
+        """
+        self.assertEqual((412, b""), self.conditional(
+            b"HEAD",
+            {b"if-unmodified-since": [b"Thu, 01 Jan 1970 00:01:39 GMT"]}))
+        self.assertEqual((200, self.object_data), self.conditional(
+            b"GET",
+            {b"if-unmodified-since": [b"Thu, 01 Jan 1970 00:01:40 GMT"]}))
+
+    def test_blank_date_headers_ignored(self):
+        """
+        A blank If-Modified-Since or If-Unmodified-Since header is ignored,
+        like an invalid date.
+        """
+        for name in [b"if-modified-since", b"if-unmodified-since"]:
+            for value in [b"", b" "]:
+                self.assertEqual((200, self.object_data),
+                                 self.conditional(b"GET", {name: [value]}))
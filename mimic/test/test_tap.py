@@ -146,6 +146,31 @@ class TapTests(SynchronousTestCase):
         from twisted.internet import reactor as real_reactor
         self.assertIdentical(CheckClock.clock, real_reactor)
 
+    def test_session_options(self):
+        """
+        The C{--expire-sessions} and C{--max-sessions} options configure the
+        eviction of sessions from the core's session store.
+        """
+        class CheckCore(MimicCore):
+            @classmethod
+            def fromPlugins(cls, clock):
+                CheckCore.core = super(CheckCore, cls).fromPlugins(clock)
+                return CheckCore.core
+        from mimic import tap
+        self.patch(tap, "MimicCore", CheckCore)
+
+        o = Options()
+        o.parseOptions([])
+        makeService(o)
+        self.assertFalse(CheckCore.core.sessions.expire_sessions)
+        self.assertIsNone(CheckCore.core.sessions.max_sessions)
+
+        o = Options()
+        o.parseOptions(["--expire-sessions", "--max-sessions", "100"])
+        makeService(o)
+        self.assertTrue(CheckCore.core.sessions.expire_sessions)
+        self.assertEqual(100, CheckCore.core.sessions.max_sessions)
+
     def test_verbose_logging(self):
         """
         The C{--verbose} option causes the default request factory on the site
@@ -154,6 +179,16 @@ class TapTests(SynchronousTestCase):
         site = self.get_site(["--listen", "fake:", "--verbose"])
         self.assertEqual(site.displayTracebacks, False)
         self.assertEqual(site.requestFactory, MimicLoggingRequest)
+        self.assertEqual(4096, site.request_log.max_body_bytes)
+
+    def test_log_body_limit(self):
+        """
+        The C{--log-body-limit} option limits how much of each request and
+        response body is logged in verbose mode.
+        """
+        site = self.get_site(["--listen", "fake:", "--verbose",
+                              "--log-body-limit", "10"])
+        self.assertEqual(10, site.request_log.max_body_bytes)
 
     def test_plugin(self):
         """
@@ -218,3 +218,29 @@ def one_of_validator(*items):
             raise TypeError("{0} must be one of {1}".format(
                 attribute.name, items))
     return validate
+
+
+_DISCARD_CALLBACKS = "mimic.discard_callbacks"
+
+
+def on_discard(memo, callback):
+    """
+    Arrange for ``callback`` to be called when the copy being made with the
+    :obj:`copy.deepcopy` memo ``memo`` is discarded, for objects whose copies
+    hold on to something that has to be given back, such as stored content.
+
+    :param dict memo: the memo passed to ``__deepcopy__``.
+    :param callback: a no-argument callable.
+    """
+    memo.setdefault(_DISCARD_CALLBACKS, []).append(callback)
+
+
+def discard_callbacks(memo):
+    """
+    Get the callbacks registered with :obj:`on_discard` while making a copy
+    with the :obj:`copy.deepcopy` memo ``memo``.
+
+    :return: a list of no-argument callables, to call once the copy is
+        discarded.
+    """
+    return memo.get(_DISCARD_CALLBACKS, [])